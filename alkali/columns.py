@@ -0,0 +1,349 @@
+"""
+optional NumPy column store for :class:`alkali.query.Query`
+
+a model declared with ``Meta.vectorize = True`` keeps one NumPy array per
+``IntField``, ``FloatField``, ``BoolField`` and ``DateTimeField``. a
+:class:`alkali.query.Query` then answers comparison filters on those
+fields with a vectorized mask, and ``Sum``, ``Min``, ``Max`` and ``Avg``
+with a vectorized reduction, instead of checking one instance at a time.
+
+::
+
+    class Reading( Model ):
+        class Meta:
+            vectorize = True
+
+        id    = fields.IntField(primary_key=True)
+        value = fields.FloatField()
+
+    Reading.objects.filter(value__gt=0.5).aggregate(Avg('value'))
+
+the arrays describe a snapshot of the manager, they're built the first
+time a column is needed and thrown away when the manager changes. any
+filter or aggregate that can't be vectorized (other field types,
+properties, un-comparable query values, ``None`` in an ordered
+comparison, etc) falls back to the normal per instance code, so the
+results are the same either way. float sums may differ in the last digits
+since NumPy adds in a different order.
+
+NumPy is not required by alkali, without it ``Meta.vectorize`` is ignored.
+"""
+
+import datetime as dt
+import numbers
+import operator
+
+try:
+    import numpy
+except ImportError: # pragma: no cover
+    numpy = None
+
+from .fields import IntField, FloatField, BoolField, DateTimeField
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# DateTimeFields are stored as microseconds since the epoch
+EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+MICROSECOND = dt.timedelta(microseconds=1)
+
+# largest magnitude of an int64 sum
+INT64_MAX = 2 ** 63 - 1
+
+COMPARISONS = {
+        'eq': operator.eq,
+        'ne': operator.ne,
+        'gt': operator.gt,
+        'ge': operator.ge,
+        'lt': operator.lt,
+        'le': operator.le,
+        }
+
+
+def available():
+    """
+    :rtype: ``bool``, True if NumPy can be imported
+    """
+    return numpy is not None
+
+
+class Column:
+    """
+    the values of one field for every instance in a :class:`ColumnStore`
+
+    ``None`` can't be stored in a NumPy number array so those values are
+    stored as 0 and flagged in ``nulls``.
+    """
+    # field type: (numpy dtype, kind)
+    field_types = {
+            IntField:      ('int64', 'int'),
+            FloatField:    ('float64', 'float'),
+            BoolField:     ('bool', 'bool'),
+            DateTimeField: ('int64', 'datetime'),
+            }
+
+    def __init__(self, field, values):
+        """
+        :param Field field: a field of one of the ``field_types``
+        :param values: the raw field values in store order
+        :raises OverflowError: if an int doesn't fit in an int64
+        """
+        dtype, self.kind = self.field_types[type(field)]
+        self.field = field
+
+        nulls = [value is None for value in values]
+
+        if any(nulls):
+            self.nulls = numpy.array(nulls, dtype=bool)
+            values = [0 if value is None else value for value in values]
+        else:
+            self.nulls = None
+
+        if self.kind == 'datetime':
+            values = [value and (value - EPOCH) // MICROSECOND for value in values]
+
+        self.values = numpy.array(values, dtype=dtype)
+
+        # bound on the magnitude of any value, guards int sums from overflow
+        if self.kind in ('int', 'bool') and len(self.values):
+            self.bound = max(abs(int(self.values.min())), abs(int(self.values.max())))
+        else:
+            self.bound = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def scalar(self, value):
+        """
+        convert a query value into one that compares like the field values
+
+        :raises TypeError: if the value doesn't compare like a field value
+        """
+        if self.kind == 'datetime':
+            if not isinstance(value, dt.datetime) or value.tzinfo is None:
+                raise TypeError("not a timezone aware datetime: {!r}".format(value))
+
+            return (value - EPOCH) // MICROSECOND
+
+        if not isinstance(value, numbers.Real):
+            raise TypeError("not a number: {!r}".format(value))
+
+        if self.kind == 'int' and isinstance(value, int) and abs(value) > INT64_MAX:
+            raise TypeError("too large for int64: {!r}".format(value))
+
+        return value
+
+    def compare(self, oper, value, positions=None):
+        """
+        :param str oper: a :func:`alkali.query.Query.filter` lookup
+        :param value: the query value
+        :param positions: ``numpy`` array of positions to compare, ``None``
+            for all
+        :rtype: ``numpy`` bool array (one per position), or ``None`` if
+            the lookup can't be vectorized
+        """
+        values = self.values
+        nulls = self.nulls
+
+        if positions is not None:
+            values = values[positions]
+
+            if nulls is not None:
+                nulls = nulls[positions]
+                nulls = nulls if nulls.any() else None
+
+        try:
+            if oper in ('eq', 'ne'):
+                mask = COMPARISONS[oper](values, self.scalar(value))
+            elif oper in COMPARISONS or oper == 'range':
+                if nulls is not None:
+                    return None # None isn't orderable, let the scan raise
+
+                if oper == 'range':
+                    lower, upper = value
+                    mask = (values >= self.scalar(lower)) & (values <= self.scalar(upper))
+                else:
+                    mask = COMPARISONS[oper](values, self.scalar(value))
+            elif oper == 'in':
+                if isinstance(value, str):
+                    return None # substring search
+
+                mask = numpy.isin(values, [self.scalar(v) for v in value])
+            elif oper == 'isnull':
+                if nulls is None:
+                    return numpy.full(len(values), not value, dtype=bool)
+
+                return nulls.copy() if value else ~nulls
+            else:
+                return None
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+        if nulls is not None:
+            if oper == 'ne':
+                mask |= nulls
+            else:
+                mask &= ~nulls
+
+        return mask
+
+    def reduce(self, reduction, positions=None):
+        """
+        :param str reduction: ``sum``, ``avg``, ``min`` or ``max``
+        :param positions: ``numpy`` array of positions to reduce, ``None``
+            for all
+        :returns: the sum or average, or the position of the min/max.
+            ``NotImplemented`` if it can't be vectorized
+        """
+        values = self.values if positions is None else self.values[positions]
+        n = len(values)
+
+        if not n or self.nulls is not None:
+            return NotImplemented
+
+        if reduction in ('min', 'max'):
+            if self.kind == 'float' and numpy.isnan(values).any():
+                return NotImplemented # min/max of nan depends on the order
+
+            i = int(values.argmin() if reduction == 'min' else values.argmax())
+            return i if positions is None else int(positions[i])
+
+        if self.kind == 'datetime':
+            return NotImplemented
+
+        if self.kind == 'float':
+            total = float(values.sum())
+        elif self.bound * n <= INT64_MAX:
+            total = int(values.sum())
+        else:
+            return NotImplemented
+
+        if reduction == 'sum':
+            return total
+        elif reduction == 'avg':
+            return total / n
+
+        return NotImplemented
+
+
+class ColumnStore:
+    """
+    arrays for every vectorizable field of a manager's instances, in
+    primary key order. columns are built on first use.
+
+    this is an internal class, see :func:`alkali.manager.Manager._columns`
+    """
+
+    def __init__(self, manager):
+        """
+        :param Manager manager:
+        """
+        self.version = manager._version
+        self.fields = manager.model_class.Meta.fields
+        self.pks = list(manager._pk_index.keys)
+
+        self._source = manager._instances
+        self._columns = {}
+        self._positions = None
+
+    def __len__(self):
+        return len(self.pks)
+
+    def column(self, name):
+        """
+        :param str name: field name
+        :rtype: :class:`Column` or ``None`` if the field can't be vectorized
+        """
+        try:
+            return self._columns[name]
+        except KeyError:
+            pass
+
+        field = self.fields.get(name)
+        column = None
+
+        if type(field) in Column.field_types:
+            source = self._source
+            raw = field.raw
+            values = [raw(source[pk]) for pk in self.pks]
+
+            try:
+                column = Column(field, values)
+            except (OverflowError, TypeError, ValueError) as e:
+                logger.debug( "can't vectorize %s: %s", name, e )
+
+        self._columns[name] = column
+        return column
+
+    def positions(self, pks):
+        """
+        :param pks: primary keys in the store
+        :rtype: ``numpy`` array of the pks positions, ``None`` if ``pks``
+            is every pk in order
+        """
+        if pks == self.pks:
+            return None
+
+        if self._positions is None:
+            self._positions = {pk: i for i, pk in enumerate(self.pks)}
+
+        positions = self._positions
+        return numpy.fromiter( (positions[pk] for pk in pks), dtype=numpy.intp, count=len(pks) )
+
+    def filter(self, pks, conditions):
+        """
+        apply every condition that can be vectorized
+
+        :param pks: candidate primary keys
+        :param conditions: ``list`` of ``(field, oper, value)``
+        :rtype: ``tuple`` of the matching pks (in the given order) and the
+            conditions that still have to be checked per instance
+
+        when ``pks`` is a subset (eg. narrowed by an index) only the
+        candidates' positions are compared, not the whole column
+        """
+        positions = self.positions(pks)
+        mask = None
+        rest = []
+
+        for field, oper, value in conditions:
+            column = self.column(field)
+            matches = column.compare(oper, value, positions) if column is not None else None
+
+            if matches is None:
+                rest.append( (field, oper, value) )
+            elif mask is None:
+                mask = matches
+            else:
+                mask &= matches
+
+        if mask is None:
+            return pks, rest
+
+        if positions is None:
+            all_pks = self.pks
+            return [all_pks[i] for i in numpy.flatnonzero(mask).tolist()], rest
+
+        return [pk for pk, ok in zip(pks, mask.tolist()) if ok], rest
+
+    def aggregate(self, reduction, field, pks):
+        """
+        :param str reduction: ``sum``, ``avg``, ``min`` or ``max``
+        :param str field: field name
+        :param pks: the primary keys to aggregate
+        :returns: the aggregate, ``NotImplemented`` if it can't be vectorized
+        """
+        column = self.column(field)
+
+        if column is None:
+            return NotImplemented
+
+        positions = self.positions(pks)
+        result = column.reduce(reduction, positions)
+
+        if result is NotImplemented or reduction not in ('min', 'max'):
+            return result
+
+        # return the actual field value, not the number we stored
+        return self.fields[field].raw( self._source[self.pks[result]] )
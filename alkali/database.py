@@ -23,11 +23,16 @@
 """
 
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import contextlib
 import types
 import inspect
+import sys
 import os
 
 from .storage import Storage, JSONStorage
+from .fields import ForeignKey
+from .utils import gc_paused
 
 import logging
 logger = logging.getLogger(__name__)
@@ -47,6 +52,16 @@ class Database:
     :ivar _save_on_exit:
         automatically save all models before Database object is destroyed. call
         :func:`Database.store` explicitly if ``_save_on_exit`` is false.
+
+    :ivar _read_only:
+        model queries return read-only views instead of copies
+
+    :ivar _workers:
+        number of threads that load and store models, defaults to 1, one
+        model at a time in the calling thread. with more than one the
+        storages' ``read()``/``write()`` and the ``pre_save``, ``post_save``,
+        ``creation`` etc signal receivers run on worker threads. ``None``
+        uses the ``ThreadPoolExecutor`` default
     """
 
     def __init__( self, models=[], **kw ):
@@ -56,6 +71,10 @@ class Database:
             * root_dir: default save path directory
             * save_on_exit: save all models to disk on exit
             * storage: default storage class for all models
+            * read_only: queries return read-only views of the model
+              instances instead of copies, see :func:`alkali.manager.Manager.read_only`
+            * workers: number of threads for :func:`Database.load` and
+              :func:`Database.store`, defaults to 1
         """
 
         logger.debug( "Database: creating database" )
@@ -65,6 +84,8 @@ class Database:
 
         self._storage_type = kw.pop('storage', JSONStorage)
         self._save_on_exit = kw.pop('save_on_exit', False)
+        self._read_only = kw.pop('read_only', False)
+        self._workers = kw.pop('workers', 1)
 
         self._root_dir = kw.pop('root_dir', '.')
         self._root_dir = os.path.expanduser(self._root_dir)
@@ -78,8 +99,13 @@ class Database:
             self._models[model.__name__.lower()] = model
             self.set_storage(model)
 
+            if self._read_only:
+                model.objects.read_only = True
+
     def __del__(self):
         if self._save_on_exit:
+            # we may be collected at interpreter exit, no new threads then
+            self._workers = 1
             self.store()
 
     @property
@@ -179,6 +205,106 @@ class Database:
 
         return None
 
+    @contextlib.contextmanager
+    def _batch(self):
+        """
+        helper context manager that starts a batch on each of our
+        storages, see :func:`alkali.storage.Storage.batch`
+        """
+        with contextlib.ExitStack() as stack:
+            seen = set()
+
+            for storage in self._storage.values():
+                batch = getattr(storage, 'batch', None)
+
+                if batch is not None and id(storage) not in seen:
+                    seen.add( id(storage) )
+                    stack.enter_context( batch() )
+
+            yield
+
+    def _schedule(self, foreign):
+        """
+        helper function that orders our models for :func:`Database._run`.
+        models sharing a storage instance go one at a time since they
+        share its file.
+
+        :param bool foreign: a model also waits for the models its
+            ``ForeignKey`` fields reference, a cycle is broken at the
+            model that comes first in ``models``
+        :rtype: ``OrderedDict`` of model to the ``set`` of models it waits
+            for, in the order they can run
+        """
+        models = list(self.models)
+        depends = {model: set() for model in models}
+
+        if foreign:
+            for model in models:
+                for field in model.Meta.fields.values():
+                    if isinstance(field, ForeignKey) and field.foreign_model in depends \
+                    and field.foreign_model is not model:
+                        depends[model].add(field.foreign_model)
+
+        order = []
+        done = set()
+
+        while models:
+            ready = [model for model in models if depends[model] <= done]
+            model = ready[0] if ready else models[0]
+
+            models.remove(model)
+            order.append(model)
+            done.add(model)
+
+        schedule = OrderedDict()
+        last = {} # storage: previous model
+
+        for model in order:
+            waits = {dep for dep in depends[model] if dep in schedule}
+            storage = self._storage.get(model)
+
+            if storage is not None:
+                if id(storage) in last:
+                    waits.add( last[id(storage)] )
+
+                last[id(storage)] = model
+
+            schedule[model] = waits
+
+        return schedule
+
+    def _run(self, func, schedule):
+        """
+        helper function that calls ``func(model)`` for every model in a
+        thread pool, each model once the models it waits for are done.
+        the first exception is raised after the running models finish.
+        models run one at a time once the interpreter is shutting down.
+
+        :param schedule: see :func:`Database._schedule`
+        """
+        if self._workers == 1 or len(schedule) < 2 or sys.is_finalizing():
+            for model in schedule:
+                func(model)
+            return
+
+        with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='alkali') as pool:
+            pending = OrderedDict(schedule)
+            running = {}
+            done = set()
+
+            while pending or running:
+                for model, waits in list(pending.items()):
+                    if waits <= done:
+                        del pending[model]
+                        running[pool.submit(func, model)] = model
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in finished:
+                    model = running.pop(future)
+                    future.result()
+                    done.add(model)
+
     def store(self, force=False):
         """
         persistantly store all model data
@@ -186,24 +312,34 @@ class Database:
         :param bool force: force store even if :class:`alkali.manager.Manager`
             thinks data is clean
         """
-        for model in self.models:
+        def store(model):
             logger.debug( "Database: storing model: %s", model.__name__ )
 
             storage = self.get_storage(model)
             model.objects.store(storage, force=force)
 
+        with self._batch():
+            self._run(store, self._schedule(foreign=False))
+
         return True
 
-    def load(self):
+    def load(self, trusted=None, pause_gc=False, snapshot=False):
         """
         load all model data from disk
 
-        :param IStorage storage: override model storage class
+        :param bool trusted: see :func:`alkali.manager.Manager.load`
+        :param bool pause_gc: turn off the cyclic garbage collector while
+            loading all the models
+        :param bool snapshot: load unchanged storage files from a binary
+            snapshot, see :mod:`alkali.snapshot`
         """
         logger.debug( "Database: loading models" )
 
-        for model in self.models:
+        def load(model):
             logger.debug( "Database: loading model: %s", model.__name__ )
 
             storage = self.get_storage(model)
-            model.objects.load(storage)
+            model.objects.load(storage, trusted=trusted, snapshot=snapshot)
+
+        with gc_paused() if pause_gc else contextlib.nullcontext(), self._batch():
+            self._run(load, self._schedule(foreign=True))
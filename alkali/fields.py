@@ -35,7 +35,7 @@ class Field:
         :type field_type: str/int/float/etc
         :param kw:
             * primary_key: is this field a primary key of parent model
-            * indexed:     is this field indexed (not implemented yet)
+            * indexed:     is this field indexed, see :mod:`alkali.index`
         """
         self._order = next(Field._counter) # DO NOT TOUCH, deleted in MetaModel
 
@@ -57,15 +57,22 @@ class Field:
 
         assert len(kw) == 0, "unhandeled kwargs: {}".format(str(kw))
 
+        # slot that holds our value in a Meta.compact model, set by MetaModel
+        self._slot = None
+
     def __get__(self, model, owner):
         """
         Field is a descriptor `python.org <https://docs.python.org/2/howto/descriptor.html>`_.
 
         return the value stored in model's __dict__ (stored via __set__ below)
+        or in its slot if the model is ``Meta.compact``
         """
         if model is None:
             return self
 
+        if self._slot is not None:
+            return self._slot.__get__(model)
+
         return model.__dict__[self._name]
 
     def __set__(self, model, value):
@@ -80,6 +87,26 @@ class Field:
         value = self.cast(value)
         model.set_field(self, value)
 
+    def raw(self, model):
+        """
+        return the value as it is stored in model, without any lookup.
+        for a :class:`ForeignKey` this is the foreign primary key.
+        """
+        if self._slot is not None:
+            return self._slot.__get__(model)
+
+        return model.__dict__[self._name]
+
+    def set_raw(self, model, value):
+        """
+        store an already cast value in model, bypasses
+        :func:`alkali.model.Model.set_field`
+        """
+        if self._slot is not None:
+            self._slot.__set__(model, value)
+        else:
+            model.__dict__[self._name] = value
+
     def __repr__(self):
         # name is set via MetaModel during Model creation
         name = getattr(self, 'name', '')
@@ -247,6 +274,7 @@ class DateTimeField(Field):
 class SetField(Field):
 
     def __init__(self, **kw):
+        assert not kw.get('indexed'), "SetField values aren't hashable, can't be indexed"
         super().__init__(set, **kw)
 
 
@@ -315,8 +343,7 @@ class ForeignKey(Field):
         if model is None:
             return self
 
-        fk_value = model.__dict__[self._name]
-        return self.lookup(fk_value)
+        return self.lookup( self.raw(model) )
 
     # don't require a __set__ because Model.set_field() calls our cast() method
 
@@ -358,6 +385,16 @@ class ForeignKey(Field):
 
         return self.pk_field.dumps(value.pk)
 
+    def dumps_pk(self, value):
+        """
+        like ``dumps`` but given the stored primary key, saves looking
+        up the foreign instance
+        """
+        if value is None:
+            raise RuntimeError("ForeignKey value is not a Model")
+
+        return self.pk_field.dumps(value)
+
     # def loads() is not required because the Storage loader is probably
     # reading json strings and then using the Model.__init__() to feed
     # it key-value pairs. ie: we don't know that it's a ForeignKey on disk.
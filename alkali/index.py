@@ -0,0 +1,432 @@
+"""
+secondary indexes for :class:`alkali.manager.Manager`
+
+an index maps a field value to the primary keys of the model instances
+that hold that value. indexes are created for any field declared with
+``indexed=True`` and kept up to date by the ``Manager``, a
+:class:`alkali.query.Query` then uses them to avoid scanning every
+instance.
+
+::
+
+    class MyModel( Model ):
+        id     = fields.IntField(primary_key=True)
+        status = fields.StringField(indexed=True)
+
+    MyModel.objects.filter(status='active') # no full scan
+
+numeric, string and datetime fields get a :class:`SortedIndex`, a hash
+index that also answers the comparison lookups ``gt``, ``ge``, ``lt``,
+``le`` and ``range``.
+"""
+
+from bisect import bisect_left, bisect_right
+
+from .fields import ForeignKey, IntField, FloatField, StringField, DateTimeField
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class NoMatch(Exception):
+    """
+    raised when a query value can never match a value in the index
+    """
+    pass
+
+
+class Index:
+    """
+    base class for all index types
+
+    indexes hold the *raw* field value, the one stored in the model
+    instance, see :func:`alkali.fields.Field.raw`. for a
+    :class:`alkali.fields.ForeignKey` that is the primary key of the
+    foreign instance.
+    """
+
+    def __init__(self, field):
+        """
+        :param Field field: the field we're indexing
+        """
+        self.field = field
+        self.clear()
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.field.name)
+
+    def __len__(self):
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+    def add(self, pk, value):
+        raise NotImplementedError()
+
+    def remove(self, pk, value):
+        raise NotImplementedError()
+
+    def build(self, items):
+        """
+        replace the contents of the index, faster than calling ``add``
+        for every instance
+
+        :param items: iterable of ``(pk, value)``
+        """
+        self.clear()
+
+        for pk, value in items:
+            self.add(pk, value)
+
+    def lookup(self, value):
+        raise NotImplementedError()
+
+    def lookup_many(self, values):
+        """
+        :param values: iterable of query values
+        :rtype: ``set`` of primary keys that match any of ``values``
+        """
+        pks = set()
+
+        for value in values:
+            pks.update(self.lookup(value))
+
+        return pks
+
+    def key(self, value):
+        """
+        convert a query value into the raw value that we index on
+
+        :raises NoMatch: if value can't ever compare equal to a field value
+        """
+        if isinstance(self.field, ForeignKey):
+            # Model.__eq__ requires the same type, a raw pk never matches
+            if value is None:
+                return None
+
+            if not isinstance(value, self.field.foreign_model):
+                raise NoMatch()
+
+            return value.pk
+
+        return value
+
+
+class HashIndex(Index):
+    """
+    a ``dict`` of field value to a ``set`` of primary keys, used for
+    equality lookups: ``eq``, ``in`` and ``isnull``
+    """
+
+    def __len__(self):
+        return len(self._values)
+
+    def clear(self):
+        self._values = {}
+
+    def add(self, pk, value):
+        try:
+            self._values[value].add(pk)
+        except KeyError:
+            self._values[value] = {pk}
+
+    def remove(self, pk, value):
+        pks = self._values.get(value)
+
+        if pks is None:
+            return
+
+        pks.discard(pk)
+
+        if not pks:
+            del self._values[value]
+
+    @property
+    def values(self):
+        """
+        **property**: all the distinct values in the index
+        """
+        return self._values.keys()
+
+    def lookup(self, value):
+        """
+        :param value: the query value
+        :rtype: ``set`` of primary keys, possibly empty
+        """
+        try:
+            return self._values.get(self.key(value), set())
+        except NoMatch:
+            return set()
+
+
+class SortedIndex(HashIndex):
+    """
+    a :class:`HashIndex` for the equality lookups plus the field values
+    kept in sorted order along with a parallel list of their primary
+    keys. comparison lookups are a binary search on the values. equal
+    values are in primary key order, so an instance is found with a
+    binary search too.
+
+    adding or removing an instance only updates the hash, the sorted
+    values catch up on the next comparison lookup.
+
+    ``None`` and NaN can't be ordered, they're kept to the side. ``None``
+    is only ever returned by an ``isnull`` lookup and NaN, which doesn't
+    equal anything, never is.
+    """
+    # field types whose values can be ordered
+    field_types = (IntField, FloatField, StringField, DateTimeField)
+
+    # fewer pending changes than this are inserted one at a time,
+    # more are sorted in with one pass
+    merge_size = 256
+
+    def __len__(self):
+        return len(self._keys) + len(self._added) - len(self._removed) \
+                + len(self._values.get(None, ())) + len(self._nans)
+
+    def clear(self):
+        super().clear()
+        self._keys = []
+        self._pks = []
+        self._nans = set()
+        self._added = set()   # pending (value, pk) entries
+        self._removed = set()
+
+    def _position(self, pk, value, find):
+        """
+        helper function that bisects for ``(value, pk)``
+
+        :param find: ``bisect_left`` or ``bisect_right``
+        """
+        keys = self._keys
+        lo = bisect_left(keys, value)
+        hi = bisect_right(keys, value, lo)
+        return find(self._pks, pk, lo, hi), hi
+
+    def add(self, pk, value):
+        if value is not None and value != value: # NaN
+            self._nans.add(pk)
+            return
+
+        if pk in self._values.get(value, ()):
+            return
+
+        super().add(pk, value)
+
+        if value is not None:
+            entry = (value, pk)
+
+            if entry in self._removed:
+                self._removed.discard(entry)
+            else:
+                self._added.add(entry)
+
+    def remove(self, pk, value):
+        if value is not None and value != value:
+            self._nans.discard(pk)
+            return
+
+        if pk not in self._values.get(value, ()):
+            return
+
+        super().remove(pk, value)
+
+        if value is not None:
+            entry = (value, pk)
+
+            if entry in self._added:
+                self._added.discard(entry)
+            else:
+                self._removed.add(entry)
+
+    def _sync(self):
+        """
+        helper function that applies the pending changes to the sorted
+        values
+        """
+        added, removed = self._added, self._removed
+
+        if not added and not removed:
+            return
+
+        keys, pks = self._keys, self._pks
+
+        if len(added) + len(removed) < self.merge_size:
+            for value, pk in removed:
+                i, _ = self._position(pk, value, bisect_left)
+                del keys[i]
+                del pks[i]
+
+            for value, pk in added:
+                i, _ = self._position(pk, value, bisect_right)
+                keys.insert(i, value)
+                pks.insert(i, pk)
+        else:
+            pairs = [e for e in zip(keys, pks) if e not in removed] if removed else list(zip(keys, pks))
+
+            # a sorted run plus the new entries, sort() merges them
+            pairs.extend( sorted(added) )
+            pairs.sort()
+
+            self._keys = [value for value, _ in pairs]
+            self._pks = [pk for _, pk in pairs]
+
+        self._added = set()
+        self._removed = set()
+
+    def build(self, items):
+        self.clear()
+        values = self._values
+        pairs = []
+
+        for pk, value in items:
+            if value is None:
+                pass
+            elif value != value:
+                self._nans.add(pk)
+                continue
+            else:
+                pairs.append( (value, pk) )
+
+            try:
+                values[value].add(pk)
+            except KeyError:
+                values[value] = {pk}
+
+        # one sort instead of an insert per value
+        pairs.sort()
+
+        self._keys = [value for value, _ in pairs]
+        self._pks = [pk for _, pk in pairs]
+
+    @property
+    def values(self):
+        """
+        **property**: all the distinct values in the index, in order
+        """
+        self._sync()
+        return list(dict.fromkeys(self._keys))
+
+    def bounds(self, oper, value):
+        """
+        binary search for the positions that satisfy a comparison
+
+        :param str oper: ``gt``, ``ge``, ``lt``, ``le`` or ``range``
+        :param value: the query value, a ``(lower, upper)`` pair for ``range``
+        :rtype: ``tuple`` of ``(lo, hi)`` positions, see :func:`SortedIndex.slice`
+        """
+        self._sync()
+        keys = self._keys
+
+        if oper == 'gt':
+            return bisect_right(keys, value), len(keys)
+        elif oper == 'ge':
+            return bisect_left(keys, value), len(keys)
+        elif oper == 'lt':
+            return 0, bisect_left(keys, value)
+        elif oper == 'le':
+            return 0, bisect_right(keys, value)
+        elif oper == 'range':
+            lower, upper = value
+            return bisect_left(keys, lower), bisect_right(keys, upper)
+
+        raise ValueError("not a comparison: {}".format(oper))
+
+    def range(self, *conditions):
+        """
+        primary keys whose value satisfies every condition
+
+        :param conditions: ``(oper, value)`` pairs, see :func:`SortedIndex.bounds`
+        :rtype: ``list`` of primary keys in value order
+        """
+        self._sync()
+        lo, hi = 0, len(self._keys)
+
+        for oper, value in conditions:
+            # nothing compares to NaN
+            if any(v != v for v in (value if oper == 'range' else (value,))):
+                return []
+
+            _lo, _hi = self.bounds(oper, value)
+            lo, hi = max(lo, _lo), min(hi, _hi)
+
+        return self.slice(lo, hi)
+
+    def slice(self, lo, hi):
+        """
+        :rtype: ``list`` of primary keys between the given positions
+        """
+        if lo >= hi:
+            return []
+
+        return self._pks[lo:hi]
+
+
+class PrimaryKeyIndex(SortedIndex):
+    """
+    a :class:`SortedIndex` where the value is the primary key, so only
+    one list is needed and no hash. compound primary keys are ordered as
+    tuples.
+
+    the ``Manager`` uses this to keep its instances in pk order.
+    """
+
+    def __init__(self, field=None):
+        super().__init__(field)
+
+    def __repr__(self):
+        return "<{}: pk>".format(self.__class__.__name__)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def clear(self):
+        self._keys = self._pks = []
+
+    def _sync(self):
+        pass # always in order
+
+    def add(self, pk, value=None):
+        self._keys.insert(bisect_right(self._keys, pk), pk)
+
+    def remove(self, pk, value=None):
+        i = bisect_left(self._keys, pk)
+
+        if i < len(self._keys) and self._keys[i] == pk:
+            del self._keys[i]
+
+    def build(self, items):
+        self._keys = self._pks = sorted(pk for pk, _ in items)
+
+    def lookup(self, value):
+        i = bisect_left(self._keys, value)
+
+        if i < len(self._keys) and self._keys[i] == value:
+            return {value}
+
+        return set()
+
+    @property
+    def keys(self):
+        """
+        **property**: the primary keys in order, do not modify
+        """
+        return self._keys
+
+    def key(self, value):
+        return value
+
+
+def make_index(field):
+    """
+    return the best index type for the given field
+
+    :param Field field:
+    :rtype: :class:`Index`
+    """
+    if isinstance(field, SortedIndex.field_types):
+        return SortedIndex(field)
+
+    return HashIndex(field)
@@ -1,13 +1,28 @@
+import os
 import inspect
+import contextlib
+import collections
+from concurrent.futures import ProcessPoolExecutor
 import copy
-
-from .query import Query
+import weakref
+
+from .query import Query, _view
+from .index import make_index, PrimaryKeyIndex
+from .columns import ColumnStore
+from .utils import gc_paused
+from .snapshot import Snapshot
+from . import columns
 from . import fields
 from . import signals
 
 import logging
 logger = logging.getLogger(__name__)
 
+# the kinds of change, see Manager.changes
+INSERTED = 'inserted'
+UPDATED  = 'updated'
+DELETED  = 'deleted'
+
 
 class Manager:
     """
@@ -25,6 +40,48 @@ class Manager:
         self._instances = {}
         self._dirty = False
 
+        # pk: INSERTED, UPDATED or DELETED since the last load/store and
+        # the stored instance of every deleted pk, see changes
+        self._changes = {}
+        self._removed = {}
+
+        # weakref to the storage we were last loaded from/stored to, only
+        # it can be given just our changes, see store()
+        self._synced = None
+
+        # bumped on every change to _instances, lets a Query know if
+        # the indexes still describe its snapshot of our instances
+        self._version = 0
+
+        # queries that are reading _instances, see _detach()
+        self._readers = weakref.WeakSet()
+
+        self._indexes = {
+                name: make_index(field)
+                for name, field in model_class.Meta.fields.items()
+                if field.indexed
+                }
+
+        # our primary keys in order, saves sorting on every Query/store
+        # and answers pk range lookups
+        pk_fields = model_class.Meta.pk_fields.values()
+        self._pk_index = PrimaryKeyIndex(pk_fields[0] if len(pk_fields) == 1 else None)
+
+        # don't maintain indexes during a load, see _reindex()
+        self._deferred = False
+
+        # numpy arrays of our instances, see _columns()
+        self._vectorize = model_class.Meta.vectorize
+
+        if self._vectorize and not columns.available():
+            logger.warning( "%s: Meta.vectorize requires numpy, ignored", model_class.__name__ )
+            self._vectorize = False
+
+        self._column_store = None
+
+        # hand out our (frozen) instances instead of copies, see read_only
+        self._read_only = False
+
         self.clear()
 
     def __repr__(self):
@@ -58,23 +115,51 @@ class Manager:
         """
         return "{}Manager".format(self.model_class.__name__)
 
+    @property
+    def read_only(self):
+        """
+        **property**: if True then ``get()``, ``instances`` and our queries
+        return read-only views of our instances instead of copies
+
+        a view is the stored instance itself so it is cheap but changing
+        it raises ``RuntimeError``, ``copy.copy()`` it first. see
+        :func:`alkali.query.Query.frozen`
+        """
+        return self._read_only
+
+    @read_only.setter
+    def read_only(self, value):
+        self._read_only = bool(value)
+
     @property
     def pks(self):
         """
-        **property**: return all primary keys
+        **property**: return all primary keys, in order
 
         :rtype: ``list``
         """
-        return list(self._instances.keys())
+        return list(self._pk_index.keys)
 
     @property
     def instances(self):
         """
-        **property**: return all model instances
+        **property**: return all model instances, in primary key order
 
         :rtype: ``list``
         """
-        return [copy.copy(obj) for obj in self._instances.values()]
+        if self._read_only:
+            return [_view(obj) for obj in self._ordered()]
+
+        return [copy.copy(obj) for obj in self._ordered()]
+
+    @property
+    def indexes(self):
+        """
+        **property**: return the indexes for fields declared with ``indexed=True``
+
+        :rtype: ``dict`` of field name to :class:`alkali.index.Index`
+        """
+        return self._indexes
 
     @property
     def dirty(self):
@@ -86,11 +171,65 @@ class Manager:
         if self._dirty:
             return True
 
+    @property
+    def changes(self):
+        """
+        **property**: the primary keys inserted, updated and deleted since
+        the last ``load()`` or ``store()``
+
+        a pk that was inserted and then deleted isn't listed, one that was
+        deleted and then saved again is updated
+
+        :rtype: ``dict`` of ``inserted``, ``updated`` and ``deleted`` to a
+            ``set`` of primary keys
+        """
+        changes = {INSERTED: set(), UPDATED: set(), DELETED: set()}
+
+        for pk, change in self._changes.items():
+            changes[change].add(pk)
+
+        return changes
+
+    def _track(self, pk, change, old=None):
+        """
+        helper function that records a change to pk, see changes
+
+        :param str change: ``INSERTED``, ``UPDATED`` or ``DELETED``
+        :param Model old: the stored instance when deleting
+        """
+        changes = self._changes
+        prev = changes.get(pk)
+
+        if change == DELETED:
+            if prev == INSERTED:
+                del changes[pk]
+                return
+
+            self._removed[pk] = old
+        elif prev == INSERTED:
+            return
+        elif prev == DELETED:
+            del self._removed[pk]
+            change = UPDATED
+
+        changes[pk] = change
+
+    def _synced_with(self, storage):
+        """
+        forget our changes, we now hold exactly what's in storage
+        """
+        self._changes = {}
+        self._removed = {}
+        self._synced = weakref.ref(storage) if storage is not None else None
+
     @staticmethod
     def sorter(elements, reverse=False ):
         """
         yield model instances in primary key order
 
+        **note**: a ``Manager`` keeps its instances in order, see
+        :func:`Manager._ordered`, this sorts any dict of instances
+
         :param Manager.instances elements: our instances
         :param kw:
             * reverse: return in reverse order
@@ -99,6 +238,78 @@ class Manager:
         for key in sorted(elements.keys(), reverse=reverse):
             yield elements[key]
 
+    def _ordered(self, reverse=False):
+        """
+        yield our model instances in primary key order without sorting
+
+        :param bool reverse: return in reverse order
+        :rtype: ``generator``
+        """
+        keys = self._pk_index.keys
+        instances = self._instances
+
+        for key in (reversed(keys) if reverse else keys):
+            yield instances[key]
+
+    def _detach(self):
+        """
+        copy-on-write, called before _instances changes. any Query still
+        reading _instances keeps the old dict and we get a new one.
+        """
+        if self._readers:
+            self._instances = dict(self._instances)
+            self._readers = weakref.WeakSet()
+
+    def _indexed(self, version):
+        """
+        are our indexes valid for a Query created at the given version
+        """
+        return version == self._version and not self._deferred
+
+    def _columns(self, version):
+        """
+        the :class:`alkali.columns.ColumnStore` for a Query created at the
+        given version, rebuilt if we've changed since it was built
+
+        :rtype: ``ColumnStore`` or ``None`` if not ``Meta.vectorize`` or
+            the Query is out of date
+        """
+        if not self._vectorize or not self._indexed(version):
+            return None
+
+        store = self._column_store
+
+        if store is None or store.version != self._version:
+            store = self._column_store = ColumnStore(self)
+
+        return store
+
+    def _reindex(self):
+        "rebuild all our indexes from _instances"
+        self._pk_index.build( (pk, pk) for pk in self._instances )
+
+        for index in self._indexes.values():
+            raw = index.field.raw
+            index.build( (pk, raw(elem)) for pk, elem in self._instances.items() )
+
+    def _index(self, instance):
+        "add a stored instance to all our indexes"
+        if not self._indexes:
+            return
+
+        pk = instance.pk
+        for index in self._indexes.values():
+            index.add(pk, index.field.raw(instance))
+
+    def _unindex(self, instance):
+        "remove a stored instance from all our indexes"
+        if not self._indexes:
+            return
+
+        pk = instance.pk
+        for index in self._indexes.values():
+            index.remove(pk, index.field.raw(instance))
+
     def save(self, instance, dirty=True, copy_instance=True):
         """
         Copy instance into our collection. We make a copy so that caller
@@ -114,11 +325,29 @@ class Manager:
         assert instance.pk is not None, \
                 "{}.save(): instance '{}' has None for pk".format(self._name, instance)
 
+        self._detach()
+
+        if not self._deferred:
+            old = self._instances.get(instance.pk)
+
+            if old is not None:
+                self._unindex(old)
+            else:
+                self._pk_index.add(instance.pk)
+
+            if dirty:
+                self._track(instance.pk, UPDATED if old is not None else INSERTED)
+
         if copy_instance:
             instance = self._instances[instance.pk] = copy.copy(instance)
         else:
             self._instances[instance.pk] = instance
 
+        if not self._deferred:
+            self._index(instance)
+
+        self._version += 1
+
         # THINK may be mistake to send the actual object out via the signal but probably
         # what any reciever actually wants
         signals.post_save.send( self.model_class, instance=instance )
@@ -139,7 +368,18 @@ class Manager:
         logger.debug( "%s: clearing all models", self._name )
 
         self._dirty = len(self) > 0
+
+        for pk, old in self._instances.items():
+            self._track(pk, DELETED, old)
+
         self._instances = {}
+        self._readers = weakref.WeakSet()
+        self._version += 1
+
+        for index in self._indexes.values():
+            index.clear()
+
+        self._pk_index.clear()
 
     def delete(self, instance):
         """
@@ -152,8 +392,16 @@ class Manager:
 
         signals.pre_delete.send(self.model_class, instance=instance)
 
+        self._detach()
+
         try:
-            del self._instances[ instance.pk ]
+            old = self._instances.pop( instance.pk )
+            self._unindex(old)
+
+            self._pk_index.remove(instance.pk)
+            self._track(instance.pk, DELETED, old)
+
+            self._version += 1
             self._dirty = True
 
             signals.post_delete.send(self.model_class, instance=instance)
@@ -179,12 +427,25 @@ class Manager:
         elem = self.model_class(pk=instance)
         self.save(elem, dirty=False, copy_instance=False)
 
+    def cb_bulk_create_foreign(self, sender, instances):
+        """
+        called when many foreign parents were loaded at once, see
+        :func:`Manager.cb_create_foreign`
+        """
+        for instance in instances:
+            self.cb_create_foreign(sender, instance)
+
     def store(self, storage, force=False):
         """
         save all our instances to storage
 
+        a storage with ``delta`` support that we were last loaded from or
+        stored to is only given our changes, see
+        :func:`alkali.storage.Storage.write_delta`
+
         :param Storage storage: an instance
-        :param bool force: force save even if we're not dirty
+        :param bool force: force save even if we're not dirty, always
+            writes all our instances
         """
         if not storage:
             logger.debug("%s: no storage instance for storing, exiting", self._name)
@@ -199,8 +460,9 @@ class Manager:
             logger.debug( "%s: has dirty records, saving", self._name )
             logger.debug( "%s: storing models via storage class: %s", self._name, storage._name )
 
-            gen = Manager.sorter(self._instances)
-            storage.write(self.model_class, gen)
+            if not self._store_delta(storage, force):
+                gen = self._ordered()
+                storage.write(self.model_class, gen)
 
             logger.debug( "%s: finished storing %d records", self._name, len(self) )
             signals.post_store.send(self.model_class)
@@ -208,12 +470,48 @@ class Manager:
             logger.debug( "%s: has no dirty records, not saving", self._name )
 
         self._dirty = False
+        self._synced_with(storage)
+
+    def _store_delta(self, storage, force):
+        """
+        helper function that gives storage just our changes if it can
+        take them
+
+        :rtype: ``bool``, False if a full write is needed
+        """
+        if force or not getattr(storage, 'delta', False):
+            return False
+
+        if self._synced is None or self._synced() is not storage:
+            return False
 
-    def load(self, storage):
+        changes = self._changes
+        instances = self._instances
+
+        upserts = [instances[pk] for pk, change in changes.items() if change != DELETED]
+
+        deletes = list(self._removed.values())
+
+        logger.debug( "%s: storing %d changes", self._name, len(upserts) + len(deletes) )
+        return storage.write_delta(self.model_class, upserts, deletes)
+
+    def load(self, storage, trusted=None, pause_gc=False, processes=None, snapshot=False):
         """
         load all our instances from storage
 
         :param Storage storage: an instance
+        :param bool trusted: skip the foreign key validation and the
+            per instance ``pre_save``/``post_save`` signals, send one
+            :data:`alkali.signals.bulk_save` instead. records have all
+            the fields, missing ones are ``None`` and not the default.
+            defaults to ``storage.trusted``
+        :param bool pause_gc: turn off the cyclic garbage collector while
+            loading, see :func:`alkali.utils.gc_paused`
+        :param int processes: parse the storage in this many processes
+            if it can be split, see :func:`alkali.storage.FileStorage.split`
+        :param bool snapshot: read the instances from a binary snapshot of
+            storage if it's up to date, otherwise write one after
+            loading, see :mod:`alkali.snapshot`
         :raises KeyError: if there are duplicate primary keys
 
         """
@@ -221,6 +519,74 @@ class Manager:
             logger.debug("%s: no storage instance for loading, exiting", self._name)
             return
 
+        assert not inspect.isclass(storage), "storage is not an instance"
+        logger.debug( "%s: loading models via storage class: %s", self._name, storage._name )
+
+        if trusted is None:
+            trusted = getattr(storage, 'trusted', False)
+
+        signals.pre_load.send(self.model_class)
+
+        self.clear()
+
+        snap = Snapshot(storage, self.model_class) if snapshot else None
+        rows = snap.read() if snap else None
+
+        with gc_paused() if pause_gc else contextlib.nullcontext():
+            if rows is not None:
+                logger.debug( "%s: loading from snapshot: %s", self._name, snap.filename )
+                elems = map(self.model_class._restore, rows)
+
+                restored = getattr(storage, 'restored', None)
+
+                if restored:
+                    restored(self.model_class)
+            else:
+                elems = self._read(storage, processes)
+
+            if trusted:
+                self._bulk_load(elems)
+            else:
+                self._load(elems)
+
+        # records dropped by _load() aren't tracked, they need a full write
+        self._synced_with(storage if not self._dirty else None)
+
+        if snap and rows is None and not self._dirty:
+            snap.write( self._ordered() )
+
+        logger.debug( "%s: finished loading %d records", self._name, len(self) )
+        signals.post_load.send(self.model_class)
+
+    def _read(self, storage, processes):
+        """
+        helper generator that yields what storage reads, parsed in a
+        process pool if it can be split and there's more than one cpu.
+        the parts are yielded in order, each part's records are let go
+        once they've been yielded.
+        """
+        split = getattr(storage, 'split', None)
+        tasks = None
+
+        if processes and split and (os.cpu_count() or 1) > 1:
+            tasks = split(self.model_class, processes * 4)
+
+        if not tasks:
+            yield from storage.read( self.model_class )
+            return
+
+        logger.debug( "%s: parsing %d parts in %d processes", self._name, len(tasks), processes )
+
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = collections.deque( pool.submit(func, *args) for func, args in tasks )
+
+            while futures:
+                yield from futures.popleft().result()
+
+    def _load(self, elems):
+        """
+        helper function that validates and saves each instance from storage
+        """
         def validate_fk_fields(fk_fields, elem):
             for fk_field_name in fk_fields:
                 try:
@@ -228,48 +594,78 @@ class Manager:
                 except KeyError: # THINK
                     # get elem's pk value, need to do it in this convoluted way since
                     # elem.pk might try to lookup the very thing that is missing
-                    field_name = elem.Meta.pk_fields.keys()[0]
-                    pk_value = elem.__dict__[field_name]
+                    pk_value = elem.Meta.pk_fields.values()[0].raw(elem)
                     logger.warning( "%s.%s: foreign instance missing: %s",
-                           self.model_class.__name__, elem.__dict__[fk_field_name], pk_value)
+                           self.model_class.__name__, elem.Meta.fields[fk_field_name].raw(elem), pk_value)
 
                     # THINK/TODO we need to delete ourselves
                     return False
 
             return True
 
-        assert not inspect.isclass(storage), "storage is not an instance"
-        logger.debug( "%s: loading models via storage class: %s", self._name, storage._name )
+        dirty = False
+        fk_fields = self.model_class.Meta.field_filter(fields.ForeignKey)
 
-        signals.pre_load.send(self.model_class)
+        # build the indexes once at the end instead of an insert per instance
+        self._deferred = True
 
-        self.clear()
+        try:
+            for elem in elems:
+                if isinstance(elem, dict):
+                    elem = self.model_class( **elem )
 
-        dirty = False
-        fk_fields = self.model_class.Meta.field_filter(fields.ForeignKey)
+                if not validate_fk_fields(fk_fields, elem):
+                    logger.debug("failed to validate_fk_fields")
+                    dirty = True
+                    continue
+
+                if elem.pk in self._instances: # THINK
+                    raise KeyError( '%s: pk collision detected during load: %s'
+                            % (self.model_class.__name__, str(elem.pk)) )
+
+                if elem.pk is None:
+                    raise self.model_class.EmptyPrimaryKey()
+
+                self.save(elem, dirty=False, copy_instance=False)
+        finally:
+            self._deferred = False
+            self._reindex()
+
+        self._dirty = dirty
 
-        for elem in storage.read( self.model_class ):
+    def _bulk_load(self, elems):
+        """
+        helper function that builds all the instances from a trusted
+        storage and then adds them to us in one go. the storage wrote
+        every field, so there are no defaults to fill in and only values
+        that aren't of the field type are cast
+        """
+        model_class = self.model_class
+        restore = model_class._restore_dict
+        instances = {}
+
+        for elem in elems:
             if isinstance(elem, dict):
-                elem = self.model_class( **elem )
+                elem = restore(elem)
 
-            if not validate_fk_fields(fk_fields, elem):
-                logger.debug("failed to validate_fk_fields")
-                dirty = True
-                continue
+            pk = elem.pk
 
-            if elem.pk in self._instances: # THINK
-                raise KeyError( '%s: pk collision detected during load: %s'
-                        % (self.model_class.__name__, str(elem.pk)) )
+            if pk is None:
+                raise model_class.EmptyPrimaryKey()
 
-            if elem.pk is None:
-                raise self.model_class.EmptyPrimaryKey()
+            if pk in instances:
+                raise KeyError( '%s: pk collision detected during load: %s'
+                        % (model_class.__name__, str(pk)) )
 
-            self.save(elem, dirty=False, copy_instance=False)
+            instances[pk] = elem
 
-        self._dirty = dirty
+        self._detach()
+        self._instances = instances
+        self._version += 1
+        self._reindex()
+        self._dirty = False
 
-        logger.debug( "%s: finished loading %d records", self._name, len(self) )
-        signals.post_load.send(self.model_class)
+        signals.bulk_save.send(model_class, instances=list(self._ordered()))
 
     def get(self, *pk, **kw):
         """
@@ -298,7 +694,8 @@ class Manager:
         # NOTE without this, direct access ForeignKeys are 100x slower
         if len(pk) == 1:
             pk = self.model_class.Meta.pk_fields.values()[0].cast(pk[0])
-            return copy.copy( self._instances[pk] )
+            instance = self._instances[pk]
+            return _view(instance) if self._read_only else copy.copy(instance)
 
         results = Query(self).filter(**kw)
 
@@ -15,8 +15,9 @@ class memoized_property:
         self.__del = fdel
         self.__doc__ = doc
 
+        # not ___name, slot names with leading __ get mangled
         if fget is not None:
-            self._attr_name = '___' + fget.__name__
+            self._attr_name = '_memo_' + fget.__name__
 
     def __get__(self, inst, type=None):
         if inst is None:
@@ -29,8 +30,9 @@ class memoized_property:
 
         result = self.__get(inst)
 
+        # not setattr, read-only model instances still cache
         if result is not None:
-            setattr(inst, self._attr_name, result)
+            object.__setattr__(inst, self._attr_name, result)
 
         return result
 
@@ -1,7 +1,7 @@
 from collections import OrderedDict
 
 from .relmanager import RelManager
-from .fields import Field, ForeignKey, OneToOneField
+from .fields import Field, IntField, ForeignKey, OneToOneField
 from .utils import tznow
 from . import signals
 
@@ -59,7 +59,7 @@ class MetaModel(type):
         # new_class is an instance of 'name' (aka Model) whose type is MetaModel
         # print "new_class", type(new_class), new_class
         # new_class <class 'alkali.metamodel.MetaModel'> <class 'redb.metamodel.MyModel'>
-        new_class = super_new(meta_class, name, bases, {})
+        new_class = super_new(meta_class, name, bases, meta_class._slots(attrs))
         new_class._add_meta( attrs )
         new_class._add_fields()
         new_class._add_manager()
@@ -71,10 +71,32 @@ class MetaModel(type):
         for name, attr in attrs.items():
             setattr(new_class, name, attr)
 
+        new_class._add_constructor()
+        new_class._add_serializer()
+        new_class._add_restorer()
+
         signals.model_creation.send(meta_class, model=new_class)
 
         return new_class
 
+    @staticmethod
+    def _slots( attrs ):
+        """
+        a ``Meta.compact`` model stores its field values in slots instead
+        of a per instance ``__dict__``, which saves a lot of memory when
+        there are many instances. they then can't hold any attributes
+        other than their fields (so no ``Query.annotate``).
+
+        :rtype: class attrs with ``__slots__`` or an empty ``dict``
+        """
+        if not getattr(attrs.get('Meta'), 'compact', False):
+            return {}
+
+        names = [k for k, v in attrs.items() if isinstance(v, Field)]
+
+        # see Model._frozen, Model.pk
+        return {'__slots__': tuple(names) + ('_dirty', '_frozen', '_memo_pk')}
+
     def _add_manager( new_class ):
         from .manager import Manager
         setattr( new_class, 'objects', Manager(new_class) )
@@ -106,6 +128,10 @@ class MetaModel(type):
                     new_class.objects.cb_create_foreign,
                     sender=field.foreign_model)
 
+                signals.bulk_save.connect(
+                    new_class.objects.cb_bulk_create_foreign,
+                    sender=field.foreign_model)
+
     def _add_exceptions( new_class ):
         from .model import ObjectDoesNotExist
 
@@ -146,6 +172,16 @@ class MetaModel(type):
         if not hasattr(meta, 'storage'):
             meta.storage = None
 
+        if not hasattr(meta, 'vectorize'):
+            meta.vectorize = False
+
+        if not hasattr(meta, 'compact'):
+            meta.compact = False
+
+        # the slot descriptors, before the fields replace them on the class
+        meta.slots = [new_class.__dict__[name] for name in getattr(new_class, '__slots__', ())] \
+                if meta.compact else []
+
         if not hasattr(meta, 'ordering'):
             meta.ordering = _get_field_order(attrs)
 
@@ -215,6 +251,10 @@ class MetaModel(type):
             fget = lambda self, name=name: self.Meta.fields[name]
             setattr( new_class, name + '__field', property(fget=fget) )
 
+            # Meta.compact: the field reads/writes the slot of the same name
+            if meta.compact:
+                field._slot = new_class.__dict__[name]
+
             # set the Field descriptor object on the model class
             # which makes it accessable on the model instance
             #
@@ -223,36 +263,281 @@ class MetaModel(type):
             # getattr is called on the model instance
             setattr( new_class, name, field )
 
-    # creates a new instance of derived model, this is called each
-    # time a Model instance is created
-    def __call__(cls, *args, **kw):
-        obj = cls.__new__(cls, *args)
+    def _add_constructor( new_class ):
+        """
+        generate ``_construct(args, kw)``, the function that
+        :func:`MetaModel.__call__` uses to make an instance of this model.
+        like ``dataclasses`` it is specialized to our fields: the loop over
+        the fields is unrolled and only the defaults, casts and auto
+        fields that apply are left.
+        """
+        from .model import Model
+
+        meta = new_class.Meta
+        names = {
+                'cls': new_class,
+                'new': new_class.__new__,
+                'MISSING': MISSING,
+                'tznow': tznow,
+                'creation': signals.creation,
+                'pk_kwarg': _pk_kwarg,
+                }
+
+        lines = [
+                "def _construct(args, kw):",
+                "    obj = new(cls, *args)",
+                "    if 'pk' in kw:",
+                "        pk_kwarg(cls, kw)",
+                "    pop = kw.pop",
+                ]
+
+        if not meta.compact:
+            lines.append( "    d = obj.__dict__" )
+
+        for i, (name, field) in enumerate(meta.fields.items()):
+            names['f%d' % i] = field
+
+            # put field values (int,str,etc) into model instance
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                lines.append( "    v = pop({!r}, MISSING)".format(name) )
+                lines.append( "    if v is MISSING: v = tznow().isoformat()" )
+            elif type(field).default_value is Field.default_value \
+            or (isinstance(field, IntField) and not field.auto_increment):
+                lines.append( "    v = pop({!r}, None)".format(name) )
+            else:
+                # THINK: this somewhat duplicates Field.__set__ code
+                lines.append( "    v = pop({!r}, f{}.default_value)".format(name, i) )
+
+            # most casts do nothing for None
+            try:
+                skip_none = field.cast(None) is None
+            except Exception:
+                skip_none = False
+
+            guard = "    if v is not None: " if skip_none else "    "
+
+            if type(field).cast is Field.cast and field.field_type in IMMUTABLE_TYPES:
+                # int(v) of an int is v
+                names['t%d' % i] = field.field_type
+                lines.append( "    if {}type(v) is not t{}: v = t{}(v)".format(
+                    "v is not None and " if skip_none else "", i, i) )
+            elif type(field).cast is Field.cast:
+                names['t%d' % i] = field.field_type
+                lines.append( guard + "v = t{}(v)".format(i) )
+            else:
+                names['c%d' % i] = field.cast
+                lines.append( guard + "v = c{}(v)".format(i) )
+
+            # store the actual value in the model's __dict__ (or slot), used by Field.__get__
+            if meta.compact:
+                names['s%d' % i] = field._slot.__set__
+                lines.append( "    s{}(obj, v)".format(i) )
+            else:
+                lines.append( "    d[{!r}] = v".format(name) )
+
+        if meta.compact:
+            names['set_dirty'] = new_class.__dict__['_dirty'].__set__
+            names['set_frozen'] = new_class.__dict__['_frozen'].__set__
+            lines.append( "    set_frozen(obj, False)" )
+            lines.append( "    set_dirty(obj, False)" )
+        else:
+            lines.append( "    d['_dirty'] = False" )
+
+        # Model.__init__ inline, unless the model has its own
+        if new_class.__init__ is Model.__init__:
+            lines += [
+                "    for name, value in kw.items():",
+                "        setattr(obj, name, value)",
+                "    if creation.receivers:",
+                "        creation.send(cls, instance=obj)",
+                ]
+        else:
+            lines.append( "    obj.__init__(*args, **kw)" )
+
+        lines.append( "    return obj" )
+
+        exec( "\n".join(lines), names )
+        new_class._construct = staticmethod( names['_construct'] )
+
+    def _add_serializer( new_class ):
+        """
+        generate ``_serialize(obj)`` and ``_serialize_row(obj)``, they
+        return the json consumable field values of an instance as a
+        ``dict`` or as a ``tuple`` in ``Meta.fields`` order. see
+        :func:`alkali.model.Model.dict`
+
+        ``dumps`` is only called for fields that have one, a
+        ``ForeignKey`` dumps the stored primary key, see
+        :func:`alkali.fields.ForeignKey.dumps_pk`
+        """
+        meta = new_class.Meta
+        names = {}
+        values = []
 
-        if 'pk' in kw:
-            assert len(cls.Meta.pk_fields) == 1, "can't currently set compound primary key via kwargs"
+        for i, (name, field) in enumerate(meta.fields.items()):
+            if meta.compact:
+                names['g%d' % i] = field._slot.__get__
+                value = "g{}(obj)".format(i)
+            else:
+                value = "d[{!r}]".format(name)
+
+            if isinstance(field, ForeignKey):
+                names['f%d' % i] = field.dumps_pk
+                value = "f{}({})".format(i, value)
+            elif type(field).dumps is not Field.dumps:
+                names['f%d' % i] = field.dumps
+                value = "f{}({})".format(i, value)
+
+            values.append( (name, value) )
+
+        head = "    d = obj.__dict__\n" if not meta.compact else ""
+        items = ", ".join( "{!r}: {}".format(name, value) for name, value in values )
+        row = "".join( "{}, ".format(value) for _, value in values )
 
-            field_name = cls.Meta.pk_fields.keys()[0]
-            assert field_name not in kw, "can't pass in 'pk' and actual pk field name"
+        exec( "def _serialize(obj):\n{}    return {{{}}}".format(head, items), names )
+        exec( "def _serialize_row(obj):\n{}    return ({})".format(head, row), names )
 
-            value = kw.pop('pk')
-            kw[field_name] = value
+        new_class._serialize = staticmethod( names['_serialize'] )
+        new_class._serialize_row = staticmethod( names['_serialize_row'] )
+
+    def _add_restorer( new_class ):
+        """
+        generate ``_raw_row(obj)`` and ``_restore(row)``, they convert an
+        instance to the ``tuple`` of its raw (already cast) field values in
+        ``Meta.fields`` order and back. ``_restore`` skips the defaults and
+        casts of ``_construct``, see :mod:`alkali.snapshot`
+
+        also generate ``_restore_dict(record)``, the same for a ``dict`` of
+        field values from a trusted storage. a value is only cast if it
+        isn't of the field type already, see :func:`alkali.manager.Manager.load`
+        """
+        from .model import Model
 
-        # put field values (int,str,etc) into model instance
-        for name, field in cls.Meta.fields.items():
-            if getattr(field, 'auto_now', False):
-                value = kw.pop(name, tznow().isoformat())
-            elif getattr(field, 'auto_now_add', False):
-                value = kw.pop(name, tznow().isoformat())
+        meta = new_class.Meta
+        names = {
+                'cls': new_class,
+                'new': new_class.__new__,
+                'creation': signals.creation,
+                }
+
+        values = []
+        targets = []
+
+        for i, name in enumerate(meta.fields.keys()):
+            if meta.compact:
+                names['g%d' % i] = meta.fields[name]._slot.__get__
+                names['s%d' % i] = meta.fields[name]._slot.__set__
+                values.append( "g{}(obj)".format(i) )
+                targets.append( "v{}".format(i) )
             else:
-                # THINK: this somewhat duplicates Field.__set__ code
-                value = kw.pop(name, field.default_value)
+                values.append( "d[{!r}]".format(name) )
+                targets.append( "d[{!r}]".format(name) )
+
+        head = "    d = obj.__dict__\n" if not meta.compact else ""
+        row = "".join( "{}, ".format(value) for value in values )
+
+        exec( "def _raw_row(obj):\n{}    return ({})".format(head, row), names )
+
+        lines = [
+                "def _restore(row):",
+                "    obj = new(cls)",
+                ]
+
+        if not meta.compact:
+            lines.append( "    d = obj.__dict__" )
+
+        if targets:
+            lines.append( "    {}, = row".format(", ".join(targets)) )
+
+        # cache Model.pk, unless it has to look up a foreign instance
+        positions = [i for i, name in enumerate(meta.fields.keys()) if name in meta.pk_fields]
+
+        if positions and not any( isinstance(field, ForeignKey) for field in meta.pk_fields.values() ):
+            if len(positions) == 1:
+                pk = "v{}".format(positions[0])
+            else:
+                pk = "({})".format( "".join("v{}, ".format(i) for i in positions) )
+
+            if meta.compact:
+                names['set_pk'] = new_class.__dict__['_memo_pk'].__set__
+                memo = "set_pk(obj, pk)"
+            else:
+                memo = "d['_memo_pk'] = pk"
+
+            memo = [ "    pk = {}".format(pk), "    if pk is not None: {}".format(memo) ]
+        else:
+            memo = []
+
+        if meta.compact:
+            names['set_dirty'] = new_class.__dict__['_dirty'].__set__
+            names['set_frozen'] = new_class.__dict__['_frozen'].__set__
+            tail = [ "    set_frozen(obj, False)", "    set_dirty(obj, False)" ]
+        else:
+            tail = [ "    d['_dirty'] = False" ]
+
+        # same as _construct once all the fields are set
+        if new_class.__init__ is Model.__init__:
+            tail += [
+                "    if creation.receivers:",
+                "        creation.send(cls, instance=obj)",
+                ]
+        else:
+            tail.append( "    obj.__init__()" )
+
+        tail.append( "    return obj" )
+
+        if meta.compact:
+            lines += ["    s{0}(obj, v{0})".format(i) for i in range(len(targets))]
+        elif memo:
+            lines += ["    v{0} = row[{0}]".format(i) for i in positions]
+
+        exec( "\n".join(lines + memo + tail), names )
+
+        lines = [
+                "def _restore_dict(record):",
+                "    obj = new(cls)",
+                "    get = record.get",
+                ]
+
+        if not meta.compact:
+            lines.append( "    d = obj.__dict__" )
+
+        for i, (name, field) in enumerate(meta.fields.items()):
+            raw = field.pk_field if isinstance(field, ForeignKey) else field
+            names['t%d' % i] = raw.field_type
+            names['c%d' % i] = field.cast
+
+            lines.append( "    v{} = get({!r})".format(i, name) )
+            lines.append( "    if v{0} is not None and type(v{0}) is not t{0}: v{0} = c{0}(v{0})".format(i) )
+
+            if meta.compact:
+                lines.append( "    s{0}(obj, v{0})".format(i) )
+            else:
+                lines.append( "    d[{!r}] = v{}".format(name, i) )
+
+        exec( "\n".join(lines + memo + tail), names )
+
+        new_class._raw_row = staticmethod( names['_raw_row'] )
+        new_class._restore = staticmethod( names['_restore'] )
+        new_class._restore_dict = staticmethod( names['_restore_dict'] )
+
+    # creates a new instance of derived model, this is called each
+    # time a Model instance is created
+    def __call__(cls, *args, **kw):
+        return cls._construct(args, kw)
+
+
+# no keyword argument given, None is a valid value
+MISSING = object()
 
-            value = field.cast(value)
+# field types where casting a value of that exact type returns it
+IMMUTABLE_TYPES = (int, float, str, bool)
 
-            # store the actual value in the model's __dict__, used by Field.__get__
-            obj.__dict__[name] = value
+def _pk_kwarg(cls, kw):
+    "replace a 'pk' keyword argument with the primary key field name"
+    assert len(cls.Meta.pk_fields) == 1, "can't currently set compound primary key via kwargs"
 
-        obj._dirty = False
-        obj.__init__(*args, **kw)
+    field_name = cls.Meta.pk_fields.keys()[0]
+    assert field_name not in kw, "can't pass in 'pk' and actual pk field name"
 
-        return obj
+    kw[field_name] = kw.pop('pk')
@@ -32,6 +32,12 @@ class Model(metaclass=MetaModel):
     see :mod:`alkali.database` for some example code
     """
 
+    # Meta.compact models add slots, everyone else gets a __dict__
+    __slots__ = ()
+
+    # True once handed out as a read-only view, see frozen
+    _frozen = False
+
     def __init__(self, *args, **kw):
         # MetaModel.__call__ has put fields in self,
         # put any other keywords into self
@@ -45,9 +51,71 @@ class Model(metaclass=MetaModel):
     # called via copy.copy() module, when getting from manager
     def __copy__(self):
         new = type(self)()
-        new.__dict__.update(self.__dict__)
+        slots = self.Meta.slots
+
+        # copies are always writable
+        if slots:
+            for slot in slots:
+                try:
+                    slot.__set__(new, slot.__get__(self))
+                except AttributeError: # not set
+                    pass
+
+            object.__setattr__(new, '_frozen', False)
+        else:
+            new.__dict__.update(self.__dict__)
+            new.__dict__.pop('_frozen', None)
+
         return new
 
+    # called via pickle and copy.deepcopy(), a compact model's slots are
+    # shadowed by its fields so they can't go through setattr()
+    def __getstate__(self):
+        slots = self.Meta.slots
+
+        if slots:
+            state = {}
+
+            for slot in slots:
+                try:
+                    state[slot.__name__] = slot.__get__(self)
+                except AttributeError: # not set
+                    pass
+        else:
+            state = dict(self.__dict__)
+
+        # copies are always writable
+        state.pop('_frozen', None)
+        return state
+
+    def __setstate__(self, state):
+        slots = self.Meta.slots
+
+        if slots:
+            for slot in slots:
+                if slot.__name__ in state:
+                    slot.__set__(self, state[slot.__name__])
+
+            object.__setattr__(self, '_frozen', False)
+        else:
+            self.__dict__.update(state)
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            self._raise_frozen(name)
+
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name):
+        if self._frozen:
+            self._raise_frozen(name)
+
+        super().__delattr__(name)
+
+    def _raise_frozen(self, name):
+        raise RuntimeError( "{}: {} is read-only, change a copy.copy() of it instead: {}".format(
+            self.__class__.__name__, self.pk, name) )
+
     def __repr__(self):
         return "<{}: {}>".format(self.__class__.__name__, self.pk)
 
@@ -70,6 +138,9 @@ class Model(metaclass=MetaModel):
         :param value: the already-cast value to store
         :type value: ``Field.field_type``
         """
+        if self._frozen:
+            self._raise_frozen(field.name)
+
         # if we're setting a field value and that value is different
         # than current value, mark self as modified
 
@@ -81,17 +152,25 @@ class Model(metaclass=MetaModel):
                 _vals = (self.__class__.__name__, self.pk, value)
                 raise RuntimeError( "{}: trying to change set pk value: {} to {}".format(*_vals) )
 
-        self.__dict__[field.name] = value # actually set the value
+        field.set_raw(self, value) # actually set the value
 
         if curr_val != value:
-            self.__dict__['_dirty'] = True
+            object.__setattr__(self, '_dirty', True)
             signals.field_update.send(self.__class__, field=field.name, old_val=curr_val, new_val=value)
 
         # call any auto fields on this model
-        if self.__dict__['_dirty']:
+        if self._dirty:
             for name, field_class in self.Meta.fields.items():
                 if getattr(field_class, 'auto_now', False):
-                    self.__dict__[name] = tznow()
+                    field_class.set_raw(self, tznow())
+
+    @property
+    def frozen(self):
+        """
+        **property**: return True if we're a read-only view of the
+        instance stored in our manager, see :func:`alkali.query.Query.frozen`
+        """
+        return self._frozen
 
     @property
     def dirty(self):
@@ -151,8 +230,7 @@ class Model(metaclass=MetaModel):
 
         :rtype: ``OrderedDict``
         """
-        return OrderedDict( [(name, field.dumps(getattr(self, name)))
-                for name, field in self.Meta.fields.items() ])
+        return OrderedDict( self._serialize(self) )
 
     @property
     def json(self):
@@ -170,6 +248,9 @@ class Model(metaclass=MetaModel):
 
         it's up to our ``Manager`` to persistently save us
         """
+        if self.frozen:
+            self._raise_frozen('save')
+
         self.__class__.objects.save(self)
         self._dirty = False
         return self
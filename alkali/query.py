@@ -25,24 +25,85 @@
 
 import types
 import operator
+import heapq
+import math
 import collections
 import copy
 import re
 
+from .index import SortedIndex
+from . import fields
+
 import logging
 logger = logging.getLogger(__name__)
 
+# lookups that can be answered by a SortedIndex
+RANGE_OPERS = ('gt', 'ge', 'lt', 'le', 'range')
+
+# marker in Query._orderings
+REVERSE = object()
+
+# use a top-k heap instead of sorting when we need less than 1/TOPK_RATIO
+# of the results, eg. order_by('-score').limit(10)
+TOPK_RATIO = 4
+
+
+# start state of Max/Min, None is a valid field value
+_empty = object()
+
 
 class Aggregate:
     """
     A reducing function that returns a single value
+
+    aggregates are also computed as a stream so that several of them (or
+    several groups, see :func:`ValuesQuery.annotate`) can share one pass
+    over the instances::
+
+        state = agg.start()
+        for value in values:
+            state = agg.step(state, value)
+        result = agg.finish(state)
+
+    an aggregate that overrides ``__call__(query)`` still works with
+    :func:`Query.aggregate`, it gets the query and makes its own pass
+    over it
     """
+    # name of the equivalent numpy reduction, see alkali.columns
+    reduction = None
+
     def __init__(self, field):
         """
         :param field str:
         """
         self.field = field
 
+    def __call__(self, query):
+        """
+        :param Query query:
+        :returns: the aggregate over the instances in query
+        """
+        return query.aggregate(value=self)['value']
+
+    def start(self):
+        """
+        :returns: the initial state
+        """
+        return None
+
+    def step(self, state, value):
+        """
+        :returns: the new state after seeing value
+        """
+        raise NotImplementedError(
+                "{} must implement step() or __call__()".format(self.__class__.__name__) )
+
+    def finish(self, state):
+        """
+        :returns: the aggregate result from the final state
+        """
+        return state
+
 class Count(Aggregate):
     """
     number of objects in query
@@ -50,26 +111,212 @@ class Count(Aggregate):
     def __call__(self, query):
         return len( query )
 
+    def start(self):
+        return 0
+
+    def step(self, state, value):
+        return state + 1
+
 class Sum(Aggregate):
     """
     sum of given field (numeric field required)
     """
-    def __call__(self, query):
-        return sum( query.values_list(self.field, flat=True) )
+    reduction = 'sum'
+
+    def start(self):
+        return 0
+
+    def step(self, state, value):
+        return state + value
 
 class Max(Aggregate):
     """
-    largest field (numeric field required)
+    largest field (numeric field required), ``ValueError`` if empty
     """
-    def __call__(self, query):
-        return max( query.values_list(self.field, flat=True) )
+    reduction = 'max'
+
+    def start(self):
+        return _empty
+
+    def step(self, state, value):
+        return value if state is _empty or value > state else state
+
+    def finish(self, state):
+        if state is _empty:
+            raise ValueError("Max() of an empty query")
+        return state
 
 class Min(Aggregate):
     """
-    smallest field (numeric field required)
+    smallest field (numeric field required), ``ValueError`` if empty
     """
-    def __call__(self, query):
-        return min( query.values_list(self.field, flat=True) )
+    reduction = 'min'
+
+    def start(self):
+        return _empty
+
+    def step(self, state, value):
+        return value if state is _empty or value < state else state
+
+    def finish(self, state):
+        if state is _empty:
+            raise ValueError("Min() of an empty query")
+        return state
+
+
+class Avg(Aggregate):
+    """
+    mean of given field (numeric field required), ``None`` if empty
+    """
+    reduction = 'avg'
+
+    def start(self):
+        return (0, 0)
+
+    def step(self, state, value):
+        return (state[0] + 1, state[1] + value)
+
+    def finish(self, state):
+        n, total = state
+        return total / n if n else None
+
+class Variance(Aggregate):
+    """
+    variance of given field (numeric field required), ``None`` if there
+    are too few values
+
+    computed with Welford's online algorithm, one pass and numerically
+    stable
+    """
+    def __init__(self, field, sample=False):
+        """
+        :param field str:
+        :param sample bool: sample variance (divide by ``n-1``) instead of
+            population variance (divide by ``n``)
+        """
+        super().__init__(field)
+        self.sample = sample
+
+    def start(self):
+        # count, mean, sum of squares of differences from the mean
+        return (0, 0.0, 0.0)
+
+    def step(self, state, value):
+        n, mean, m2 = state
+        n += 1
+        delta = value - mean
+        mean += delta / n
+        m2 += delta * (value - mean)
+        return (n, mean, m2)
+
+    def finish(self, state):
+        n, _, m2 = state
+        n -= 1 if self.sample else 0
+
+        if n <= 0:
+            return None
+
+        return m2 / n
+
+class StdDev(Variance):
+    """
+    standard deviation of given field, see :class:`Variance`
+    """
+    def finish(self, state):
+        variance = super().finish(state)
+        return None if variance is None else math.sqrt(variance)
+
+class CountDistinct(Aggregate):
+    """
+    number of distinct values of given field, values must be hashable
+    """
+    def start(self):
+        return set()
+
+    def step(self, state, value):
+        state.add(value)
+        return state
+
+    def finish(self, state):
+        return len(state)
+
+
+class ValuesQuery(list):
+    """
+    returned by :func:`Query.values`, a ``list`` of dicts
+
+    :func:`ValuesQuery.annotate` turns it into a SQL style ``GROUP BY``
+    """
+
+    def __init__(self, query, fields):
+        """
+        :param Query query: the query, it is evaluated now
+        :param fields: field names
+        """
+        source = query._source
+
+        self.fields = fields
+        self._instances = [source[pk] for pk in query._evaluate()]
+
+        getters = [operator.attrgetter(field) for field in fields]
+
+        super().__init__(
+            collections.OrderedDict( zip(fields, [g(row) for g in getters]) )
+            for row in self._instances
+            )
+
+    def annotate(self, **aggregates):
+        """
+        group instances by our fields and compute the aggregates for each
+        group, all in a single pass over the instances
+
+        :param kw: ``key_name=Aggregate``
+        :rtype: ``list`` of ``OrderedDict``, one per distinct combination
+            of our field values in order of first appearance
+
+        ::
+
+            Sale.objects.values('region').annotate(total=Sum('amount'), n=Count('id'))
+            # [ OrderedDict([('region', 'east'), ('total', 120), ('n', 3)]),
+            #   OrderedDict([('region', 'west'), ('total', 45), ('n', 2)]) ]
+        """
+        for agg in aggregates.values():
+            assert isinstance(agg, Aggregate), "annotate() requires Aggregate values"
+            assert type(agg).step is not Aggregate.step, "annotate() requires Aggregate.step()"
+
+        names = list(aggregates.keys())
+        aggs = list(aggregates.values())
+        fields = self.fields
+
+        key_getter = operator.attrgetter(*fields)
+        single = len(fields) == 1
+        getters = [operator.attrgetter(agg.field) for agg in aggs]
+        steps = list(zip(range(len(aggs)), [agg.step for agg in aggs], getters))
+
+        groups = collections.OrderedDict()
+
+        for row in self._instances:
+            key = key_getter(row)
+
+            if single:
+                key = (key,)
+
+            try:
+                states = groups[key]
+            except KeyError:
+                states = groups[key] = [agg.start() for agg in aggs]
+
+            for i, step, getter in steps:
+                states[i] = step(states[i], getter(row))
+
+        results = []
+
+        for key, states in groups.items():
+            d = collections.OrderedDict( zip(fields, key) )
+            d.update( zip(names, [agg.finish(state) for agg, state in zip(aggs, states)]) )
+            results.append(d)
+
+        return results
 
 
 # def copy_instances(func):
@@ -77,6 +324,15 @@ class Min(Aggregate):
 #        return map( copy.copy, func(*args, **kw) )
 #    return wrapper
 
+def _view(instance):
+    """
+    a read-only view of a manager's instance is the instance itself,
+    frozen. a save() stores a new copy so it stays frozen, see
+    :func:`Query.frozen`
+    """
+    object.__setattr__(instance, '_frozen', True)
+    return instance
+
 def as_list(func):
     def wrapper(*args, **kw):
         ret = func(*args, **kw)
@@ -95,6 +351,10 @@ class Query:
     the Django docs at https://docs.djangoproject.com/en/1.10/topics/db/queries/
     will be fairly relevant to alkali, except for anything related to
     foreign or many2many fields.
+
+    queries are lazy, ``filter`` and ``order_by`` are only recorded and
+    applied the first time the query is iterated, indexed, counted or
+    aggregated.
     """
 
     def __init__( self, manager):
@@ -106,32 +366,39 @@ class Query:
         """
         self.manager = manager
 
-        # THINK: Query should work on the keys of manager instances,
-        # this might save a copy or two, then only dereferencing a query
-        # should return a copy. If we ever get multiple indexes then
-        # that might also dramatically speed up queries
+        # a Query works on the primary keys of our manager's instances
+        # and only dereferences them when the query is evaluated (iterated,
+        # indexed, counted, aggregated, etc). the manager copies its
+        # dict before changing it if a Query is still reading it, so
+        # this is a snapshot of the manager at Query creation time.
+        self._source = manager._instances
+        self._version = manager._version
+        manager._readers.add(self)
 
-        # THINK: I tried really hard to make Query._instances an
-        # manager._instances.itervalues() but this is fraught with
-        # peril. You have to convert to a list to get it's length, you
-        # have to convert to a list to get __getitem__, and if you
-        # iterate over it once then it's "empty" if you need to do so
-        # again. I'm afraid that for now each Query object needs to get
-        # a copy of the Manager values. Note, you still need to copy the
-        # individual elements as they leave the Query.
-        self._instances = list(manager._instances.values())
-        self.order_by('pk')
+        self._pks = None     # None means all of _source, in pk order
+        self._filters = []   # pending list of (field, [(oper, value),...])
+        self._orderings = [] # pending list of order_by() field tuples
 
+        # copy.copy() or return read-only views of instances
+        self._view = _view if manager._read_only else copy.copy
 
     def __len__(self):
-        return len(self._instances)
+        return len(self._evaluate())
 
     def __iter__(self):
-        for elem in self._instances:
-            yield copy.copy(elem)
+        source = self._source
+        view = self._view
+        for pk in self._evaluate():
+            yield view(source[pk])
 
     def __getitem__(self, i):
-        return copy.copy(self._instances[i])
+        pks = self._evaluate( limit=self._limit(i) )
+        view = self._view
+
+        if isinstance(i, slice):
+            return [view(self._source[pk]) for pk in pks[i]]
+
+        return view(self._source[pks[i]])
 
     def __str__(self):
         return "<Query: {}>".format(", ".join([str(q) for q in self]))
@@ -171,6 +438,27 @@ class Query:
     def all(self):
         return self
 
+    def frozen(self):
+        """
+        return read-only views of the manager's instances instead of
+        copies, saves creating a model instance per instance returned
+
+        :rtype: Query
+
+        ::
+
+            for m in MyModel.objects.frozen().filter(size__gt=10):
+                print(m.size)       # fine
+                m.size = 0          # raises RuntimeError
+
+            m = copy.copy(m)        # a writable copy
+
+        see :func:`alkali.manager.Manager.read_only` to make every query
+        of a model read-only
+        """
+        self._view = _view
+        return self
+
     def filter(self, **kw):
         """
         :param kw: ``field_name__op=value``, note: ``field_name`` can be a ``property``
@@ -189,7 +477,16 @@ class Query:
 
             # 'foo' is in field/property myset
             MyModel.objects.filter( myset__rin='foo' )
+
+            # inclusive on both ends
+            MyModel.objects.filter( date__range=(start, end) )
+
+        fields declared with ``indexed=True`` (and the primary key) are
+        looked up in an index instead of checking every model instance,
+        see :mod:`alkali.index`
         """
+        conditions = collections.OrderedDict()
+
         for field, query in kw.items():
             try:
                 field, oper = field.split('__')
@@ -198,14 +495,209 @@ class Query:
                 field = field
                 oper = 'eq'
 
-            self._instances = self._filter(field, oper, query, self._instances)
+            conditions.setdefault(field, []).append( (oper, query) )
 
+        self._filters.extend( conditions.items() )
         return self
 
-    @as_list
-    def _filter(self, field, oper, value, instances):
+    def _rows(self):
+        """
+        helper generator that yields our (uncopied) model instances
+
+        **warning**: these are the manager's instances, do not change them
+        """
+        source = self._source
+        for pk in self._evaluate():
+            yield source[pk]
+
+    def _all_pks(self):
+        """
+        :rtype: ``list`` of every pk in our snapshot, in order
+        """
+        # our manager keeps its pks in order, copy them if still valid
+        if self.manager._indexed(self._version):
+            return list(self.manager._pk_index.keys)
+
+        return sorted(self._source)
+
+    @staticmethod
+    def _limit(i):
+        """
+        how many of our first pks are needed for ``self[i]``, None if all
+        """
+        if isinstance(i, slice):
+            if i.stop is None or i.stop < 0 or (i.start or 0) < 0 or (i.step or 1) < 0:
+                return None
+            return i.stop
+
+        return i + 1 if i >= 0 else None
+
+    def _evaluate(self, limit=None):
+        """
+        apply any pending filters and orderings
+
+        all filters that can't be answered by an index are checked in a
+        single pass over the candidate instances.
+
+        if only the first ``limit`` pks are required then the last ordering
+        is a heap based top-k selection instead of a full sort. it stays
+        pending so the full order is still available later.
+
+        :param int limit: only the first ``limit`` pks are required
+        :rtype: ``list`` of our primary keys in order, at least ``limit``
+            long if we have that many
+        """
+        if not self._filters and not self._orderings and self._pks is not None:
+            return self._pks
+
+        source = self._source
+        pks = self._pks
+        found = None # pks matching every index lookup
+        tests = []   # (field, oper, value) that have to be checked per instance
+
+        for field, conds in self._filters:
+            matches = self._lookup(field, conds)
+
+            if matches is None:
+                tests.extend( (field, oper, value) for oper, value in conds )
+            elif found is None:
+                found = set(matches)
+            else:
+                found.intersection_update(matches)
+
+        self._filters = []
+
+        if found is not None:
+            pks = [pk for pk in pks if pk in found] if pks is not None else sorted(found)
+        elif pks is None:
+            pks = self._all_pks()
+
+        if tests:
+            columns = self.manager._columns(self._version)
+
+            if columns is not None:
+                pks, tests = columns.filter(pks, tests)
+
+        if tests:
+            tests = [ (field, self._operator(oper, value), value) for field, oper, value in tests ]
+
+            def match(elem):
+                for field, oper, value in tests:
+                    if not oper(getattr(elem, field), value):
+                        return False
+                return True
+
+            pks = [pk for pk in pks if match(source[pk])]
+
+        orderings = self._orderings
+
+        if limit is not None and orderings and orderings[-1] is not REVERSE \
+        and limit * TOPK_RATIO < len(pks):
+            for fields in orderings[:-1]:
+                pks = self._sort(pks, fields)
+
+            self._orderings = orderings[-1:]
+            self._pks = pks
+            return self._top(pks, orderings[-1], limit)
+
+        for fields in orderings:
+            pks = self._sort(pks, fields)
+
+        self._orderings = []
+        self._pks = pks
+        return pks
+
+    def _is_pk(self, field):
         """
-        helper function that does the actual work of filtering out instances
+        is field the primary key, our manager's dict is then a hash index
+        """
+        if field == 'pk':
+            return True
+
+        pk_fields = self.model_class.Meta.pk_fields
+
+        # comparing ForeignKey fields compares model instances, not pks
+        return len(pk_fields) == 1 and field in pk_fields \
+                and not isinstance(pk_fields[field], fields.ForeignKey)
+
+    def _sorted_index(self, field):
+        """
+        :rtype: the :class:`alkali.index.SortedIndex` for field or ``None``
+        """
+        if self._is_pk(field):
+            return self.manager._pk_index
+
+        index = self.manager._indexes.get(field)
+
+        if isinstance(index, SortedIndex):
+            return index
+
+        return None
+
+    def _lookup(self, field, conditions):
+        """
+        helper function that tries to answer a filter from an index
+
+        :param conditions: list of ``(oper, value)`` for the given field
+        :rtype: collection of matching primary keys or ``None`` if no index applies
+        """
+        # indexes describe the manager now, not the manager we copied
+        if not self.manager._indexed(self._version):
+            return None
+
+        if all(oper in RANGE_OPERS for oper, _ in conditions):
+            index = self._sorted_index(field)
+
+            if index is None:
+                return None
+
+            try:
+                return index.range(*conditions)
+            except TypeError: # not comparable, let _filter raise
+                return None
+
+        if len(conditions) != 1:
+            return None
+
+        oper, value = conditions[0]
+
+        if oper == 'in' and isinstance(value, str):
+            return None # substring search
+
+        if self._is_pk(field):
+            if oper == 'eq':
+                values = [value]
+            elif oper == 'in' and len(self.model_class.Meta.pk_fields) == 1:
+                values = value
+            else:
+                return None
+
+            try:
+                return {pk for pk in values if pk in self._source}
+            except TypeError: # unhashable
+                return None
+
+        index = self.manager._indexes.get(field)
+
+        if index is None:
+            return None
+
+        try:
+            if oper == 'eq':
+                return index.lookup(value)
+            elif oper == 'in':
+                return index.lookup_many(value)
+            elif oper == 'isnull' and value:
+                return index.lookup(None)
+        except TypeError: # unhashable
+            pass
+
+        return None
+
+    def _operator(self, oper, value):
+        """
+        helper function that returns the function that does the actual
+        work of filtering out instances, ``oper(field_value, value)``
         """
 
         def in_(coll, val):
@@ -228,53 +720,146 @@ class Query:
         def regexi(coll, val):
             return re.search(val, coll, re.UNICODE | re.IGNORECASE)
 
+        def isnull(coll, val):
+            return (coll is None) == bool(val)
+
+        def range_(coll, val):
+            lower, upper = val
+            return lower <= coll <= upper
+
         if oper == 'in':
             assert isinstance(value, collections.abc.Iterable)
             oper = in_
         elif oper == 'rin':
-            assert isinstance(field, collections.abc.Iterable)
             oper = rin_
         elif oper == 're':
             oper = regex
         elif oper == 'rei':
             oper = regexi
+        elif oper == 'isnull':
+            oper = isnull
+        elif oper == 'range':
+            oper = range_
         else:
             oper = getattr(operator, oper)
 
         # TODO: exact, iexact, (i)contains == rin, (i)startswith, (i)endswith,
-        # range (for dates), date (return datetime as date), year/month/day,
+        # date (return datetime as date), year/month/day,
         # hour/minute/second, week_day (sun=1, sat=7)
 
-        return filter( lambda e: oper(getattr(e, field), value), instances)
+        return oper
 
     def order_by(self, *fields):
         """
-        change order of self.instances
+        change order of our instances
 
         :param str fields: field names, prefixed with optional '-' to
             indicate reverse order
         :rtype: Query
 
-        **warning**: because this isn't a real database and we don't have
-        grouping, passing in multiple fields will very possibly sort
-        on the last field only. python sorting is stable however, so a
-        multiple field sort may work as intended.
+        the first field is the primary sort, later fields break ties.
+        ascending and descending fields can be mixed.
+
+        ::
+
+            MyModel.objects.order_by('-score', 'name')
         """
-        def _order_by( field ):
-            "return reversed, field_name"
-            if field.startswith('-'):
-                return True, field[1:]
-            else:
-                return False, field
+        self._orderings.append(fields)
+        return self
 
-        if fields == ('pk',):
-            fields = self.model_class.Meta.pk_fields.keys()
+    @staticmethod
+    def _sort_fields(fields):
+        """
+        helper function that splits order_by fields into names and
+        directions
 
-        for field in fields:
-            reverse, field = _order_by( field )
-            key = operator.attrgetter(field)
-            self._instances = sorted(self._instances, key=key, reverse=reverse)
+        :rtype: ``list`` of ``(name, reverse)``
+        """
+        return [ (field[1:], True) if field.startswith('-') else (field, False)
+                for field in fields ]
+
+    def _sort_keys(self, pks, names):
+        """
+        helper function that fetches the values of the names fields for
+        every pk, plain fields are read from an instance's ``__dict__`` or
+        slots instead of going through the Field descriptor
+
+        :rtype: ``list`` of value ``list``, one per name, parallel to pks
+        """
+        meta = self.model_class.Meta
+        found = [meta.fields.get(name) for name in names]
+        elems = list(map(self._source.__getitem__, pks))
+
+        if not all(field is not None and not isinstance(field, fields.ForeignKey) for field in found):
+            getters = [operator.attrgetter(name) for name in names]
+        elif meta.compact:
+            getters = [field._slot.__get__ for field in found]
+        else:
+            getters = [operator.itemgetter(name) for name in names]
+            elems = list(map(vars, elems))
+
+        return [list(map(getter, elems)) for getter in getters]
+
+    def _sort(self, pks, fields):
+        """
+        helper function that does the actual work of order_by
+
+        positions are sorted once per field, last field first, each sort
+        is stable so earlier fields come out as the primary order. this
+        is the same for any mix of directions.
+
+        :rtype: ``list`` of pks
+        """
+        if fields is REVERSE:
+            return pks[::-1]
+
+        order = self._sort_fields(fields)
+        names = [name for name, _ in order]
+
+        # pks are their own sort key, compound pks sort as tuples
+        if names == ['pk']:
+            return sorted(pks, reverse=order[0][1])
+
+        positions = list(range(len(pks)))
+
+        for keys, (_, reverse) in zip(reversed(self._sort_keys(pks, names)), reversed(order)):
+            positions.sort(key=keys.__getitem__, reverse=reverse)
+
+        return list(map(pks.__getitem__, positions))
+
+    def _top(self, pks, fields, n):
+        """
+        helper function that returns the first n pks as ordered by fields
+        without sorting all of them, same result as ``_sort(pks, fields)[:n]``
+
+        :rtype: ``list`` of pks
+        """
+        order = self._sort_fields(fields)
+        directions = {reverse for _, reverse in order}
+
+        # a heap needs a single key, mixed directions are sorted
+        if len(directions) > 1:
+            return self._sort(pks, fields)[:n]
+
+        select = heapq.nlargest if directions.pop() else heapq.nsmallest
+        names = [name for name, _ in order]
 
+        if names == ['pk']:
+            return select(n, pks)
+
+        keys = self._sort_keys(pks, names)
+        keys = keys[0] if len(keys) == 1 else list(zip(*keys))
+        positions = select(n, range(len(pks)), key=keys.__getitem__)
+
+        return list(map(pks.__getitem__, positions))
+
+    def reverse(self):
+        """
+        reverse the current order of our instances
+
+        :rtype: Query
+        """
+        self._orderings.append(REVERSE)
         return self
 
     def group_by(self, field):
@@ -290,16 +875,36 @@ class Query:
 
             { 's1': <Query MyModel(1), MyModel(3)>
               's2': <Query MyModel(2)> }
+
+        groups are made from the instances currently in this query, in
+        one pass, and keep this query's order
         """
-        def _filter(value):
-            # need to start with a fresh query object to work with all objects
-            return Query(self.manager).filter(**{field: value})
+        buckets = collections.OrderedDict()
+        getter = operator.attrgetter(field)
+        source = self._source
 
-        values = self.distinct(field)[0]
-        groups = { value: _filter(value) for value in values }
-        return groups
+        for pk in self._evaluate():
+            value = getter(source[pk])
+
+            try:
+                buckets[value].append(pk)
+            except KeyError:
+                buckets[value] = [pk]
+
+        return { value: self._derive(pks) for value, pks in buckets.items() }
+
+    def _derive(self, pks):
+        """
+        helper function that returns a new Query on our snapshot that
+        holds only the given pks, in the given order
+        """
+        query = Query(self.manager)
+        query._source = self._source
+        query._version = self._version
+        query._pks = pks
+        query._view = self._view
+        return query
 
-    @as_list
     def limit(self, n):
         """
         return first(+) or last(-) n elements
@@ -312,11 +917,11 @@ class Query:
         :rtype: ``list``
         """
         if n > 0:
-            return map(copy.copy, self._instances[:n])
+            return self[:n]
         elif n < 0:
-            return map(copy.copy, self._instances[n:])
+            return self[n:]
         else: # n == 0, return all instead of [] because why not?
-            return map(copy.copy, self._instances)
+            return self[:]
 
     def first(self):
         """
@@ -328,27 +933,25 @@ class Query:
         except IndexError:
             raise self.model_class.DoesNotExist()
 
-    @as_list
     def values(self, *fields):
         """
         returns list of dicts, each sub-list contains (field_name, field_value)
 
-        :rtype: list of OrderedDict
+        :rtype: :class:`ValuesQuery`, list of OrderedDict
 
         ::
 
             MyModel.objects.values('int_type','str_type')
             # [ OrderedDict([('int_type', 10), ('str_type', u'hi')]),
             #   OrderedDict([('int_type', 11), ('str_type', u'hi')]) ]
+
+            # group by, see ValuesQuery.annotate
+            MyModel.objects.values('str_type').annotate(total=Sum('int_type'))
         """
         if not fields:
             fields = self.field_names
 
-        def _mk_dict( obj, fields ):
-            vals = [ (field, getattr(obj, field)) for field in fields ]
-            return collections.OrderedDict(vals)
-
-        return map(lambda obj: _mk_dict(obj, fields), self._instances)
+        return ValuesQuery(self, list(fields))
 
     def values_list(self, *fields, **kw):
         """
@@ -371,12 +974,12 @@ class Query:
         if flat:
             return [
                 getattr(e, field) for field in fields
-                for e in self._instances
+                for e in self._rows()
                 ]
         else:
             return [
                 [getattr(e, field) for field in fields]
-                for e in self._instances
+                for e in self._rows()
                 ]
 
     def exists(self):
@@ -395,7 +998,8 @@ class Query:
         The returned dictionary has key ``<field_name>__<agg function>`` unless
         keyword is given.
 
-        :param Aggregate args: ``Count`` ``Sum`` ``Max`` ``Min``
+        :param Aggregate args: ``Count`` ``Sum`` ``Max`` ``Min`` ``Avg``
+            ``Variance`` ``StdDev`` ``CountDistinct``
         :param kw: ``key_value=Aggregate``, note: ``field_name`` can be a ``property``
         :rtype: ``dict``
 
@@ -405,15 +1009,51 @@ class Query:
             # { 'the_count': 12, 'size__sum': 24957 }
         """
 
-        ret = {}
+        aggs = collections.OrderedDict()
 
         for agg in args:
             key = '{}__{}'.format(agg.field, agg.__class__.__name__.lower())
-            ret[key] = agg(self)
+            aggs[key] = agg
+
+        aggs.update(kw)
+
+        for agg in aggs.values():
+            assert isinstance(agg, Aggregate), "aggregate() requires Aggregate values"
+
+        ret = {}
+
+        # an Aggregate that overrides __call__ does its own pass
+        for key, agg in list(aggs.items()):
+            if type(agg).__call__ is not Aggregate.__call__:
+                ret[key] = agg(self)
+                del aggs[key]
+
+        columns = self.manager._columns(self._version)
+
+        if columns is not None and aggs:
+            pks = self._evaluate()
+
+            for key, agg in aggs.items():
+                if agg.reduction is not None:
+                    value = columns.aggregate(agg.reduction, agg.field, pks)
+
+                    if value is not NotImplemented:
+                        ret[key] = value
+
+            aggs = collections.OrderedDict( (k, a) for k, a in aggs.items() if k not in ret )
+
+        if not aggs:
+            return ret
+
+        # one pass over the instances for all the aggregates
+        steps = [ (agg.step, operator.attrgetter(agg.field)) for agg in aggs.values() ]
+        states = [ agg.start() for agg in aggs.values() ]
 
-        for field, agg in kw.items():
-            ret[field] = agg(self)
+        for row in self._rows():
+            for i, (step, getter) in enumerate(steps):
+                states[i] = step(states[i], getter(row))
 
+        ret.update( (key, agg.finish(state)) for (key, agg), state in zip(aggs.items(), states) )
         return ret
 
     def annotate(self, **kw):
@@ -437,14 +1077,16 @@ class Query:
             # [[10, 3], [11, 4]]
         """
 
-        # make sure instances are a copy so we don't annotate the originals
-        self._instances = [copy.copy(obj) for obj in self._instances]
+        # make sure instances are a copy so we don't annotate the originals,
+        # our indexes no longer apply to our copies
+        self._source = { pk: copy.copy(obj) for pk, obj in zip(self._evaluate(), self._rows()) }
+        self._version = None
 
         for name, func in kw.items():
             if not callable(func):
                 func = lambda elem, val=func: val
 
-            for elem in self._instances:
+            for elem in self._rows():
                 setattr( elem, name, func(elem) )
 
         return self
@@ -472,7 +1114,7 @@ class Query:
         ret = []
 
         for field in fields:
-            distinct = {getattr(elem, field) for elem in self._instances} # set
+            distinct = {getattr(elem, field) for elem in self._rows()} # set
             ret.append( list(distinct) )
 
         return ret
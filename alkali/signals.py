@@ -7,6 +7,7 @@ field_update = signal('field_update', doc='called when a model field is set')
 
 pre_save    = signal('pre_save'   , doc='called before an Model object is saved')
 post_save   = signal('post_save'  , doc='called after an Model object is saved')
+bulk_save   = signal('bulk_save'  , doc='called once after a trusted load saved many Model objects, instead of pre_save/post_save per object')
 
 pre_delete  = signal('pre_delete' , doc='called before an Model object is deleted')
 post_delete = signal('post_delete', doc='called after an Model object is deleted')
@@ -0,0 +1,112 @@
+"""
+binary snapshots of the instances loaded from a storage
+
+parsing a big json or csv file, and casting every value in it, is most
+of the time it takes to load a model. a snapshot is a pickle of the raw
+field values of every instance, kept next to the storage file as
+*<filename>.<model name>.snap*. it is keyed by the storage's
+:func:`alkali.storage.Storage.fingerprint` (the size, mtime and content
+hash of the file) and by the model's fields, so it's only used while the
+file and the model are unchanged.
+
+::
+
+    db.load(snapshot=True) # the first load parses and writes the snapshots
+    db.load(snapshot=True) # later loads just unpickle them
+
+**note**: a snapshot is a pickle, don't load one that you didn't write
+"""
+
+import os
+import pickle
+
+import logging
+logger = logging.getLogger(__name__)
+
+# change when the layout of the snapshot file changes
+VERSION = 1
+
+
+class Snapshot:
+    """
+    the snapshot of one model read from one storage
+    """
+
+    def __init__(self, storage, model_class):
+        """
+        :param Storage storage: an instance
+        :param Model model_class: the model that is read from storage
+        """
+        self.model_class = model_class
+        fingerprint = getattr(storage, 'fingerprint', None)
+        self.key = fingerprint() if fingerprint else None
+        self.filename = None
+
+        if self.key is not None:
+            self.filename = "{}.{}.snap".format(storage.filename, model_class.__name__)
+
+    def __bool__(self):
+        """
+        False if the storage can't have a snapshot
+        """
+        return self.filename is not None
+
+    @property
+    def header(self):
+        """
+        **property**: what a snapshot has to match to be used
+        """
+        fields = tuple( (name, type(field).__name__)
+                        for name, field in self.model_class.Meta.fields.items() )
+
+        return (VERSION, self.model_class.__name__, fields, self.key)
+
+    def read(self):
+        """
+        :rtype: ``list`` of the raw field values of every instance, see
+            :func:`alkali.metamodel.MetaModel._add_restorer`. ``None`` if
+            there's no up to date snapshot
+        """
+        if not self or not os.path.exists(self.filename):
+            return None
+
+        try:
+            with open(self.filename, 'rb') as f:
+                if pickle.load(f) != self.header:
+                    logger.debug( "%s: snapshot is out of date", self.filename )
+                    return None
+
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning( "%s: can't read snapshot: %s", self.filename, e )
+
+        return None
+
+    def write(self, instances):
+        """
+        replace the snapshot, the fingerprint should be from before the
+        instances were read
+
+        :param instances: the model instances
+        """
+        if not self:
+            return
+
+        raw_row = self.model_class._raw_row
+        rows = [raw_row(obj) for obj in instances]
+        tmpname = self.filename + '.tmp'
+
+        try:
+            with open(tmpname, 'wb') as f:
+                pickle.dump(self.header, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(rows, f, pickle.HIGHEST_PROTOCOL)
+
+            os.replace(tmpname, self.filename)
+        except Exception as e:
+            logger.warning( "%s: can't write snapshot: %s", self.filename, e )
+
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            return
+
+        logger.debug( "%s: wrote snapshot of %d records", self.filename, len(rows) )
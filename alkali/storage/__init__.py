@@ -2,5 +2,8 @@ from alkali.peekorator import Peekorator
 from .storage import Storage
 from .file import FileStorage, FileAlreadyLocked
 from .json import JSONStorage
+from .jsonl import JSONLinesStorage
+from .journal import JournaledStorage
 from .csv import CSVStorage
 from .multi import MultiStorage
+from .sqlite import SQLiteStorage
@@ -1,6 +1,9 @@
+import io
 import csv
+import itertools
+from collections import OrderedDict
 
-from alkali.peekorator import Peekorator
+from alkali import fields
 from .file import FileStorage
 
 import logging
@@ -13,23 +16,183 @@ class CSVStorage(FileStorage):
 
     first line assumed to be column headers (aka: field names)
 
-    use `remap_fieldnames` to change column headers into model field names
+    use `remap_columns` to change column headers into model field names
+
+    the header is only looked at once, it's compiled into a function that
+    converts a row straight into typed field values. the file is streamed
+    a row at a time, see :func:`CSVStorage.read_chunks`.
+
+    a `remap_fieldnames` override is still called once per row, those
+    rows are cast when the instances are made instead of compiled
     """
     extension = 'csv'
 
+    # number of rows per list from read_chunks()
+    chunk_size = 10000
+
     def read(self, model_class):
+        construct = model_class._construct
+
+        for chunk in self.read_chunks(model_class):
+            for row in chunk:
+                yield construct((), row)
+
+    def read_chunks(self, model_class, size=None):
+        """
+        yield lists of up to ``size`` rows, each row a ``dict`` of field
+        name to its value. blank lines are skipped, the missing columns
+        of a short row are ``None``.
+
+        with a ``remap_fieldnames`` override each row is what it returns,
+        the values aren't converted
+
+        :param int size: rows per list, defaults to ``chunk_size``
+        :raises ValueError: if a row has more columns than the header
+        """
+        size = size or self.chunk_size
+
         self._fhandle.seek(0)
-        reader = csv.DictReader(self._fhandle)
+        reader = csv.reader(self._fhandle)
+
+        header = next(reader, None)
+
+        if not header:
+            return
+
+        if self._remaps_rows():
+            remap = self.remap_fieldnames
+            convert = lambda row: remap(model_class, dict(zip(header, row)))
+        else:
+            convert = self.compile(model_class, header)
+
+        width = len(header)
+
+        chunk = []
 
         for row in reader:
-            row = self.remap_fieldnames(model_class, row)
-            yield model_class(**row)
+            if len(row) != width:
+                if not row:
+                    continue
+
+                if len(row) > width:
+                    raise ValueError( "{}:{}: {} columns, the header has {}".format(
+                        self.filename, reader.line_num, len(row), width) )
+
+                row += [None] * (width - len(row))
+
+            chunk.append( convert(row) )
+
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    def compile(self, model_class, header):
+        """
+        generate the function that converts a row into field values
+
+        ``remap_columns`` is given the header as a ``dict`` of column
+        name to its position and returns field name to position. fields
+        are converted without the generic ``Field.cast``, an empty value
+        is ``None`` for all but string fields.
+
+        :param list header: the column names
+        :rtype: function taking a row ``list`` and returning a ``dict``
+        """
+        columns = OrderedDict( (name, i) for i, name in enumerate(header) )
+        columns = self.remap_columns(model_class, columns)
+
+        return compile_row(model_class, columns)
+
+    def split(self, model_class, n):
+        """
+        split the rows on line boundaries, see :func:`alkali.storage.FileStorage.split`.
+        each part is converted by ``compile()`` of a copy of us in the
+        worker process, so a subclass must be importable
+
+        a part never starts inside a quoted value, so values can have
+        newlines. a quote inside a value must be doubled, as ``csv.writer``
+        writes it, a part with a row that doesn't match the header raises
+        ``ValueError``. a file read with a ``remap_fieldnames`` override
+        isn't split.
+        """
+        if self._remaps_rows():
+            return None
+
+        self._fhandle.flush()
+        encoding = self._fhandle.encoding
+        quotechar = '"'.encode(encoding)
+
+        with open(self.filename, 'rb') as f:
+            line = f.readline()
+            start = f.tell()
+
+        # a newline in a quoted column name
+        if line.count(quotechar) % 2:
+            return None
+
+        header = next(csv.reader([line.decode(encoding)]), None)
+
+        if not header:
+            return None
+
+        ranges = self._line_ranges(n, start, quotechar)
+
+        if len(ranges) < 2:
+            return None
+
+        return [(parse_range, (self, self.filename, encoding, model_class, header, start, end))
+                for start, end in ranges]
+
+    def __getstate__(self):
+        """
+        we're pickled for the :func:`split` workers, without our file
+        """
+        state = self.__dict__.copy()
+        state['_fhandle'] = None
+        return state
+
+    def remap_columns(self, model_class, columns):
+        """
+        example of remap_columns that could be defined
+        in derived class or as a stand-alone function.
+
+        it is called once per file with the header, a ``dict`` of
+        column name to column position, and should return field name to
+        column position.
+
+        ::
+
+            def remap_columns(self, model_class, columns):
+                fields = model_class.Meta.fields.keys()
+
+                for k in list(columns.keys()):
+                    results_key = k.lower().replace(' ', '_')
+
+                    if results_key not in fields:
+                        if k == 'Some Wierd Name':
+                            results_key = 'good_name'
+                        else:
+                            raise RuntimeError( "unknown field: {}".format(k) )
+
+                    columns[results_key] = columns.pop(k)
+
+                return columns
+        """
+        return columns
 
     def remap_fieldnames(self, model_class, row):
         """
         example of remap_fieldnames that could be defined
         in derived class or as a stand-alone function.
 
+        it is called once per row with a ``dict`` of column name to
+        value and should return field name to value. an override can
+        change the values too, but the rows are then read one at a time
+        without the compiled conversion, see :func:`remap_columns`.
+
         warning: make sure your header row that contains field
         names has no spaces in it
 
@@ -53,9 +216,17 @@ class CSVStorage(FileStorage):
         """
         return row
 
+    def _remaps_rows(self):
+        """
+        helper function, True if ``remap_fieldnames`` was overridden in
+        a subclass or on this instance
+        """
+        remap = getattr(self.remap_fieldnames, '__func__', self.remap_fieldnames)
+        return remap is not CSVStorage.remap_fieldnames
+
     def write(self, model_class, iterator):
         """
-        warning: if ``remap_fieldnames`` changes names then saved file
+        warning: if ``remap_columns`` or ``remap_fieldnames`` changes names then saved file
         will have a different header line than original file
         """
         if iterator is None:
@@ -64,17 +235,84 @@ class CSVStorage(FileStorage):
         f = self._fhandle
         f.seek(0)
 
-        _peek = Peekorator(iter(iterator))
-        writer = None
+        iterator = iter(iterator)
+        first = next(iterator, None)
 
-        for e in _peek:
-            if _peek.is_first():
-                fieldnames = e.Meta.fields.keys()
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerow(e.dict)
-            else:
-                writer.writerow(e.dict)
+        if first is not None:
+            writer = csv.writer(f)
+            writer.writerow( model_class.Meta.fields.keys() )
+            writer.writerows( map(model_class._serialize_row, itertools.chain([first], iterator)) )
 
         f.truncate()
         return True
+
+
+def compile_row(model_class, columns):
+    """
+    generate the function that converts a csv row into field values, see
+    :func:`CSVStorage.compile`
+
+    :param columns: ``dict`` of field name to column position
+    :rtype: function taking a row ``list`` and returning a ``dict``
+    """
+    model_fields = model_class.Meta.fields
+    names = {}
+    items = []
+
+    for name, i in columns.items():
+        field = model_fields.get(name)
+
+        if isinstance(field, fields.ForeignKey):
+            field = field.pk_field
+
+        value = "row[{}]".format(i)
+
+        if field is None or isinstance(field, fields.StringField) \
+        or type(field) is fields.UUIDField:
+            pass
+        elif type(field) in (fields.IntField, fields.FloatField):
+            names['t%d' % i] = field.field_type
+            value = "t{0}({1}) if {1} else None".format(i, value)
+        elif isinstance(field, fields.DateTimeField):
+            names['l%d' % i] = field.loads
+            value = "l{0}({1}) if {1} else None".format(i, value)
+        else:
+            names['c%d' % i] = field.cast
+            value = "c{}({})".format(i, value)
+
+        items.append( "{!r}: {}".format(name, value) )
+
+    exec( "def convert(row):\n    return {{{}}}".format(", ".join(items)), names )
+    return names['convert']
+
+
+def parse_range(storage, filename, encoding, model_class, header, start, end):
+    """
+    convert the rows between two byte offsets, run in a worker process
+    by :func:`CSVStorage.split`
+
+    :param CSVStorage storage: its ``compile()`` converts the rows
+    :rtype: ``list`` of records
+    :raises ValueError: if a row doesn't have a column per header column
+    """
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode(encoding)
+
+    convert = storage.compile(model_class, header)
+    width = len(header)
+
+    reader = csv.reader(io.StringIO(data, newline=''))
+    rows = []
+
+    for row in reader:
+        if len(row) != width:
+            if not row:
+                continue
+
+            raise ValueError( "{}: line {} after offset {}: {} columns, the header has {}".format(
+                filename, reader.line_num, start, len(row), width) )
+
+        rows.append( convert(row) )
+
+    return rows
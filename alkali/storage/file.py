@@ -1,5 +1,6 @@
 import os
 import types
+import hashlib
 import fcntl
 from contextlib import contextmanager
 #from zope.interface import Interface, Attribute, implements
@@ -86,16 +87,121 @@ class FileStorage(Storage):
         # I don't think this can ever fail
         fcntl.flock(self._fhandle, fcntl.LOCK_UN)
 
+    # size of the blocks returned by read_blocks()
+    block_size = 64 * 1024
+
+    # smallest part of the file worth parsing in another process, see split()
+    split_size = 1024 * 1024
+
     def read(self, model_class):
         """
-        helper function that just reads a file
+        helper function that just reads a file, see :func:`read_blocks`
+        for reading it a piece at a time
         """
-        # THINK should this yield blocks of data?
-        # https://github.com/kashifrazzaqui/json-streamer
-        # https://pypi.org/project/ijson/
         self._fhandle.seek(0)
         return self._fhandle.read()
 
+    def read_blocks(self, size=None):
+        """
+        helper function that reads the file in blocks
+
+        :param int size: block size, defaults to ``block_size``
+        :rtype: generator of ``str``
+        """
+        size = size or self.block_size
+        f = self._fhandle
+        f.seek(0)
+
+        while True:
+            block = f.read(size)
+
+            if not block:
+                return
+
+            yield block
+
+    def split(self, model_class, n):
+        """
+        split the file into parts that can be parsed in parallel, see
+        :func:`alkali.manager.Manager.load`
+
+        :param int n: roughly how many parts
+        :rtype: ``list`` of ``(function, args)``, picklable tasks that
+            return a ``list`` of records for their part. ``None`` if the
+            file can't be split
+        """
+        return None
+
+    def _line_ranges(self, n, start=0, quotechar=None):
+        """
+        helper function that splits the file into byte ranges of whole
+        lines, at least ``split_size`` bytes each
+
+        :param int start: offset of the first line
+        :param bytes quotechar: don't split inside a quoted value, a range
+            only ends on a newline after an even number of quotes. (a
+            quote in a value has to be doubled, as ``csv.writer`` does)
+        :rtype: ``list`` of ``(start, end)`` byte offsets
+        """
+        self._fhandle.flush()
+
+        size = os.path.getsize(self.filename)
+        step = max( (size - start) // max(n, 1), self.split_size, 1 )
+        ranges = []
+
+        with open(self.filename, 'rb') as f:
+            while start < size:
+                end = start + step
+
+                if end < size:
+                    f.seek(end)
+                    f.readline()
+                    end = f.tell()
+
+                    if quotechar:
+                        odd = self._count(f, start, end, quotechar) % 2
+
+                        while odd and end < size:
+                            odd ^= f.readline().count(quotechar) % 2
+                            end = f.tell()
+                else:
+                    end = size
+
+                ranges.append( (start, end) )
+                start = end
+
+        return ranges
+
+    def _count(self, f, start, end, sub):
+        """
+        helper function that counts ``sub`` between two byte offsets of
+        f, a block at a time. leaves f at ``end``.
+        """
+        f.seek(start)
+        count = 0
+
+        while start < end:
+            block = f.read( min(end - start, self.block_size) )
+
+            if not block:
+                break
+
+            count += block.count(sub)
+            start += len(block)
+
+        return count
+
+    def fingerprint(self):
+        """
+        the size, modification time and content hash of our file, see
+        :func:`alkali.storage.Storage.fingerprint`
+        """
+        if not isinstance(self.filename, str):
+            return None
+
+        self._fhandle.flush()
+        return (file_fingerprint(self.filename),)
+
     def _write(self, iterator):
         """
         helper function that just writes a file if data is not None
@@ -114,3 +220,20 @@ class FileStorage(Storage):
 
     def write(self, model_class, iterator):
         return self._write(iterator)
+
+
+def file_fingerprint(filename, size=1024 * 1024):
+    """
+    :param int size: bytes hashed at a time
+    :rtype: ``tuple`` of the file's size, modification time in ns and
+        the blake2b hex digest of its contents
+    """
+    digest = hashlib.blake2b()
+
+    with open(filename, 'rb') as f:
+        stat = os.fstat(f.fileno())
+
+        for block in iter(lambda: f.read(size), b''):
+            digest.update(block)
+
+    return (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
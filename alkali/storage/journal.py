@@ -0,0 +1,355 @@
+import os
+import json
+import fcntl
+
+from .file import FileStorage, FileAlreadyLocked, file_fingerprint
+from .jsonl import JSONLinesStorage
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class JournaledStorage(JSONLinesStorage):
+    """
+    a json lines snapshot plus an append-only log of the changes made
+    since the snapshot was written
+
+    a manager that was loaded from or stored to this storage only gives
+    ``write_delta()`` its added, changed and deleted records, they're
+    appended one line each to *<filename>.log*. ``read()`` replays the
+    log over the snapshot. once the log grows past ``compact_size`` bytes
+    it's merged into a new snapshot and emptied, see
+    :func:`JournaledStorage.compact`. a full ``write()`` replaces the
+    snapshot and empties the log.
+
+    log lines are ``["put", <record>]`` or ``["del", [<pk values>]]``
+
+    no records are kept in memory, ``write_delta()`` is only accepted
+    once the file has been read or written through this storage
+    """
+    extension = 'jsonl'
+    delta = True
+
+    # compact the log once it's larger than this many bytes
+    compact_size = 1024 * 1024
+
+    def __init__(self, filename=None, *args, **kw ):
+        self._log = None
+        self._current = False
+        super().__init__(filename, *args, **kw)
+
+    @FileStorage.filename.setter
+    def filename(self, filename):
+        """
+        open and lock the snapshot and its log
+        """
+        FileStorage.filename.fset(self, filename)
+
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+        self._current = False
+
+        if self._fhandle is None:
+            return
+
+        logname = self.logname
+        self._log = open(logname, 'r+b' if os.path.exists(logname) else 'w+b')
+
+        try:
+            fcntl.flock(self._log, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            raise FileAlreadyLocked("can't lock: {}".format(logname))
+
+    @property
+    def logname(self):
+        """
+        **property**: the log filename, *<filename>.log*
+        """
+        if self.filename is None:
+            return None
+
+        return self.filename + '.log'
+
+    def unlock(self):
+        super().unlock()
+
+        if self._log:
+            fcntl.flock(self._log, fcntl.LOCK_UN)
+
+    def _key(self, model_class):
+        """
+        helper function that returns a function giving the primary key
+        of a serialized record
+        """
+        names = model_class.Meta.pk_fields.keys()
+        return lambda record: tuple( record[name] for name in names )
+
+    def _replay(self, model_class):
+        """
+        helper function that reads the log
+
+        :rtype: ``dict`` of the last change for every logged pk, a record
+            or ``None`` if it was deleted
+        """
+        key = self._key(model_class)
+        changes = {}
+
+        f = self._log
+        f.seek(0)
+        good = 0
+
+        for line in f:
+            try:
+                op, value = json.loads(line)
+            except ValueError:
+                if f.read(1): # not the end of the file
+                    raise ValueError( "{}: bad log entry at offset {}".format(self.logname, good) )
+
+                # a partly written last line, our change was never stored
+                logger.warning( "%s: dropping incomplete log entry", self.logname )
+                f.seek(good)
+                f.truncate()
+                break
+
+            if op == 'put':
+                changes[key(value)] = value
+            elif op == 'del':
+                changes[tuple(value)] = None
+            else:
+                raise ValueError( "{}: unknown log entry: {}".format(self.logname, op) )
+
+            good += len(line)
+
+        return changes
+
+    def _merged(self, model_class):
+        """
+        helper generator that yields the snapshot records with the log
+        applied, then the added records. the log is read first so the
+        snapshot is still streamed a line at a time
+        """
+        decode = json.JSONDecoder().decode
+        key = self._key(model_class)
+
+        changes = self._replay(model_class)
+
+        f = self._fhandle
+        f.seek(0)
+
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+
+            if not line:
+                continue
+
+            try:
+                record = decode(line)
+            except ValueError as e:
+                raise ValueError( "{}:{}: {}".format(self.filename, lineno, e) ) from e
+
+            pk = key(record)
+
+            # a changed record keeps its place
+            if pk in changes:
+                record = changes.pop(pk)
+
+                if record is None:
+                    continue
+
+            yield record
+
+        for record in changes.values():
+            if record is not None:
+                yield record
+
+    def read(self, model_class):
+        """
+        yield the snapshot records with the log applied
+        """
+        self._current = False
+        yield from self._merged(model_class)
+        self._current = True
+
+    def restored(self, model_class):
+        """
+        the manager restored what ``read()`` yields from a snapshot, take
+        its deltas again. (the snapshot's key covers the log, so there's
+        no partly written entry to drop)
+        """
+        self._current = True
+
+    def write(self, model_class, iterator):
+        """
+        replace the snapshot with the given records and empty the log
+        """
+        if iterator is None:
+            return False
+
+        f = self._fhandle
+        f.seek(0)
+
+        for data in self._lines(model_class, iterator):
+            f.write(data)
+
+        f.truncate()
+        f.flush()
+
+        self._truncate_log()
+        self._current = True
+        return True
+
+    def write_delta(self, model_class, upserts, deletes):
+        """
+        append the given changes to the log
+
+        :rtype: ``bool``, False if we haven't been read or written yet
+        """
+        if not self._current:
+            return False
+
+        encode = self._encode
+        serialize = model_class._serialize
+        key = self._key(model_class)
+
+        entries = [ '["put",' + encode(serialize(e)) + ']' for e in upserts ]
+        entries.extend( encode(["del", list(key(serialize(e)))]) for e in deletes )
+
+        self._append(entries)
+
+        if self._log.seek(0, 2) > self.compact_size:
+            self.compact(model_class)
+
+        return True
+
+    def _append(self, entries):
+        """
+        helper function that appends log entries
+        """
+        if not entries:
+            return
+
+        entries.append('')
+        f = self._log
+        end = f.seek(0, 2)
+
+        # don't join our first entry onto an unterminated last line
+        if end:
+            f.seek(end - 1)
+
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+
+        f.write( '\n'.join(entries).encode('utf-8') )
+        f.flush()
+
+        logger.debug( "%s: logged %d changes", self.logname, len(entries) - 1 )
+
+    def _truncate_log(self):
+        """
+        helper function that empties the log, only once the snapshot is
+        out since replaying the log again is harmless
+        """
+        self._log.seek(0)
+        self._log.truncate()
+        self._log.flush()
+
+    def compact(self, model_class):
+        """
+        merge the log into a new snapshot and empty the log. the merged
+        records are written to *<filename>.tmp*, they're never all in
+        memory, which replaces the snapshot once it's on disk. the log is
+        only emptied after that, replaying it over either snapshot gives
+        the same records.
+        """
+        encode = self._encode
+        filename = self.filename
+        tmpname = filename + '.tmp'
+        encoding = self._fhandle.encoding
+        n = 0
+
+        try:
+            with open(tmpname, 'w', encoding=encoding) as tmp:
+                lines = []
+
+                for record in self._merged(model_class):
+                    lines.append( encode(record) )
+                    n += 1
+
+                    if len(lines) >= self.batch_size:
+                        lines.append('')
+                        tmp.write('\n'.join(lines))
+                        lines = []
+
+                if lines:
+                    lines.append('')
+                    tmp.write('\n'.join(lines))
+
+                tmp.flush()
+                os.fsync(tmp.fileno())
+
+            os.replace(tmpname, filename)
+        except BaseException:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+
+        logger.debug( "%s: compacted %d records", filename, n )
+
+        # the rename has to be on disk before the log is emptied
+        fd = os.open( os.path.dirname(os.path.abspath(filename)), os.O_RDONLY )
+
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        # our handle is still the old snapshot
+        old = self._fhandle
+        self._fhandle = open(filename, 'r+', encoding=encoding)
+        self.lock()
+
+        fcntl.flock(old, fcntl.LOCK_UN)
+        old.close()
+
+        self._truncate_log()
+
+    def fingerprint(self):
+        """
+        fingerprint the snapshot and the log
+        """
+        snapshot = super().fingerprint()
+
+        if snapshot is None or self._log is None:
+            return None
+
+        self._log.flush()
+        return snapshot + (file_fingerprint(self.logname),)
+
+    def split(self, model_class, n):
+        """
+        the log has to be replayed over the snapshot, can't be split
+        """
+        return None
+
+    def append(self, model_class, iterator):
+        """
+        add records without rewriting the snapshot, they're logged like
+        ``write_delta()`` upserts. a record with the pk of an existing one
+        replaces it.
+
+        :param iterator: the model instances to add
+        """
+        if iterator is None:
+            return False
+
+        encode = self._encode
+        serialize = model_class._serialize
+
+        self._append( [ '["put",' + encode(serialize(e)) + ']' for e in iterator ] )
+
+        if self._log.seek(0, 2) > self.compact_size:
+            self.compact(model_class)
+
+        return True
@@ -1,8 +1,14 @@
+import re
 import json
 
 from alkali.peekorator import Peekorator
 from .file import FileStorage
 
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# characters that can continue a json number
+NUMBER = re.compile(r'[-+0-9.eE]*')
+
 class JSONStorage(FileStorage):
     """
     save models in json format
@@ -10,14 +16,96 @@ class JSONStorage(FileStorage):
     extension = 'json'
 
     def read(self, model_class):
-        data = super().read(model_class)
+        """
+        yield the elements of the json array one at a time, the file is
+        read in blocks so only the current block and element are in
+        memory. an empty file has no elements.
+
+        :raises ValueError: if the file isn't a json array
+        """
+        decode = json.JSONDecoder().raw_decode
+        match = WHITESPACE.match
+        blocks = self.read_blocks()
+        buf = ''
+        pos = 0
+        eof = False
+
+        def more():
+            nonlocal buf, pos, eof
+
+            block = next(blocks, None)
+
+            if block is None:
+                eof = True
+            else:
+                buf = buf[pos:] + block
+                pos = 0
+
+            return not eof
+
+        def skip():
+            # skip whitespace, returns the next character or '' at the end
+            nonlocal pos
+
+            while True:
+                pos = match(buf, pos).end()
+
+                if pos < len(buf) or not more():
+                    return buf[pos:pos + 1]
+
+        def close():
+            # only whitespace may follow the array
+            c = skip()
+
+            if c:
+                raise ValueError("{}: extra data after the array at {!r}".format(self.filename, c))
+
+        c = skip()
 
-        if not data:
+        if not c:
             return
 
-        for elem in json.loads(data):
+        if c != '[':
+            raise ValueError("{}: not a json array".format(self.filename))
+
+        pos += 1
+        c = skip()
+
+        if c == ']':
+            pos += 1
+            close()
+            return
+
+        while True:
+            try:
+                elem, end = decode(buf, pos)
+            except ValueError:
+                if more():
+                    continue
+                raise
+
+            # a number at the end of a block may be cut short, eg. '1.' or '1e'
+            if buf[pos] in '-0123456789' and NUMBER.match(buf, pos).end() == len(buf) and more():
+                continue
+
             yield elem
 
+            pos = match(buf, end).end()
+            c = buf[pos:pos + 1] or skip()
+            pos += 1
+
+            if c == ']':
+                close()
+                return
+
+            if c != ',':
+                raise ValueError("{}: expected ',' or ']' at {!r}".format(self.filename, c))
+
+            pos = match(buf, pos).end()
+
+            if pos == len(buf):
+                skip()
+
     def write(self, model_class, iterator):
 
         if iterator is None:
@@ -28,9 +116,11 @@ class JSONStorage(FileStorage):
 
         f.write('[\n')
 
+        serialize = model_class._serialize
+
         _peek = Peekorator(iter(iterator))
         for e in _peek:
-            data = json.dumps(e.dict, indent='  ')
+            data = json.dumps(serialize(e), indent='  ')
             f.write(data)
 
             if not _peek.is_last():
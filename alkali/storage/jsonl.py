@@ -0,0 +1,135 @@
+import json
+
+from .file import FileStorage
+from .storage import caster
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class JSONLinesStorage(FileStorage):
+    """
+    save models in json lines format, one compact json record per line
+
+    unlike :class:`alkali.storage.JSONStorage` a record can be appended
+    without rewriting the file and the file can be split on newlines
+    """
+    extension = 'jsonl'
+
+    # number of records joined into one write
+    batch_size = 1000
+
+    def __init__(self, filename=None, *args, **kw ):
+        super().__init__(filename, *args, **kw)
+        self._encode = json.JSONEncoder(separators=(',', ':')).encode
+
+    def read(self, model_class):
+        """
+        yield one record per line, blank lines are skipped
+
+        :raises ValueError: if a line isn't valid json
+        """
+        decode = json.JSONDecoder().decode
+        f = self._fhandle
+        f.seek(0)
+
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+
+            try:
+                yield decode(line)
+            except ValueError as e:
+                raise ValueError( "{}:{}: {}".format(self.filename, lineno, e) ) from e
+
+    def split(self, model_class, n):
+        """
+        split the file on line boundaries, see :func:`alkali.storage.FileStorage.split`
+        """
+        ranges = self._line_ranges(n)
+
+        if len(ranges) < 2:
+            return None
+
+        encoding = self._fhandle.encoding
+        return [(parse_range, (self.filename, encoding, model_class, start, end)) for start, end in ranges]
+
+    def _lines(self, model_class, iterator):
+        """
+        helper function that yields the text of ``batch_size`` records
+        at a time
+        """
+        encode = self._encode
+        serialize = model_class._serialize
+        lines = []
+
+        for e in iterator:
+            lines.append( encode(serialize(e)) )
+
+            if len(lines) >= self.batch_size:
+                lines.append('')
+                yield '\n'.join(lines)
+                lines = []
+
+        if lines:
+            lines.append('')
+            yield '\n'.join(lines)
+
+    def write(self, model_class, iterator):
+        if iterator is None:
+            return False
+
+        f = self._fhandle
+        f.seek(0)
+
+        for data in self._lines(model_class, iterator):
+            f.write(data)
+
+        f.truncate()
+        f.flush()
+
+        return True
+
+    def append(self, model_class, iterator):
+        """
+        add records to the end of the file, the existing records are
+        not read or rewritten
+
+        :param iterator: the model instances to add
+        """
+        if iterator is None:
+            return False
+
+        f = self._fhandle
+        f.seek(0, 2)
+
+        # don't join our first record onto an unterminated last line
+        if f.tell():
+            f.seek(f.tell() - 1)
+
+            if f.read(1) != '\n':
+                f.write('\n')
+
+        for data in self._lines(model_class, iterator):
+            f.write(data)
+
+        f.flush()
+
+        return True
+
+
+def parse_range(filename, encoding, model_class, start, end):
+    """
+    decode and cast the lines between two byte offsets, run in a worker
+    process by :func:`JSONLinesStorage.split`
+
+    :rtype: ``list`` of records
+    """
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    decode = json.JSONDecoder().decode
+    cast = caster(model_class)
+
+    return [cast(decode(line.decode(encoding))) for line in data.split(b'\n') if line.strip()]
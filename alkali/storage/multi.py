@@ -1,4 +1,5 @@
 import json
+import contextlib
 
 from alkali.storage import FileStorage
 
@@ -9,20 +10,29 @@ class MultiStorage(FileStorage):
     """
     like a regular JSONStorage but this file can hold multiple
     different tables/models
+
+    inside a :func:`MultiStorage.batch` the file is parsed once and
+    written once, no matter how many models are read or written.
+    :func:`alkali.database.Database.load` and
+    :func:`alkali.database.Database.store` use a batch.
     """
 
     def __init__(self, models, filename):
         self.models = models
+
+        # the parsed file during a batch and if a model was written
+        self._batch = 0
+        self._data = None
+        self._changed = False
+
         super().__init__(filename)
 
     def _model_name(self, model_class):
         return model_class.__name__.lower()
 
-    def read(self, model_class):
+    def _parse(self):
         """
-        read the entire file but only emit objects for the given model_class
-
-        not the most effecient but by far the simplest
+        helper function that reads every model's section from the file
         """
         self._fhandle.seek(0)
 
@@ -34,47 +44,92 @@ class MultiStorage(FileStorage):
             logger.exception(e)
             data = {}
 
+        return data or {}
+
+    def _sections(self):
+        """
+        helper function that returns the parsed file, only parsed once
+        per batch
+        """
+        if not self._batch:
+            return self._parse()
+
+        if self._data is None:
+            self._data = self._parse()
+
+        return self._data
+
+    def _dump(self, data):
+        # TODO needs to do this safely, do we loose data on an encode error?
+        self._fhandle.seek(0)
+        json.dump(data, self._fhandle, indent='  ')
+        self._fhandle.truncate()
+        self._fhandle.flush()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        parse the file on the first read or write and keep the sections
+        of every model, the file is written once at the end of the batch
+        if any model was written, even if the batch raises since those
+        managers are no longer dirty. batches can be nested.
+        """
+        self._batch += 1
+
+        try:
+            yield self
+        finally:
+            self._batch -= 1
+
+            if not self._batch:
+                data, changed = self._data, self._changed
+                self._data = None
+                self._changed = False
+
+                if changed:
+                    self._dump(data)
+
+    def read(self, model_class):
+        """
+        emit the objects for the given model_class
+
+        outside a batch the entire file is read for each model
+        """
+        data = self._sections()
+
         if not data:
             return None
 
         try:
-            for value in data[self._model_name(model_class)]:
-                yield value
+            section = data[self._model_name(model_class)]
         except KeyError: # pragma: nocover
             logger.warning("model '%s' not in datafile: %s",
                            self._model_name(model_class),
                            self.filename
                            )
+            return None
+
+        for value in section:
+            yield value
 
     def write(self, model_class, iterator):
         """
-        probably not the best way to do this but we load the file
-        and then write it back out with the one updated key/value pair
+        replace the given model_class's section. outside a batch the
+        file is read and written back out with the one updated section
         """
         if iterator is None:
             return False
 
-        self._fhandle.seek(0)
-
-        try:
-            data = json.load(self._fhandle)
-        except json.decoder.JSONDecodeError:
-            data = {} # first time
-        except Exception as e: # pragma: nocover
-            logger.exception(e)
-            data = {}
+        data = self._sections()
+        serialize = model_class._serialize
 
         data[self._model_name(model_class)] = [
-            value.dict for value in iterator
+            serialize(value) for value in iterator
         ]
 
-        # import pprint
-        # pprint.pprint(data)
-
-        # TODO needs to do this safely, do we loose data on an encode error?
-        self._fhandle.seek(0)
-        json.dump(data, self._fhandle, indent='  ')
-        self._fhandle.truncate()
-        self._fhandle.flush()
+        if self._batch:
+            self._changed = True
+        else:
+            self._dump(data)
 
         return True
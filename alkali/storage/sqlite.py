@@ -0,0 +1,397 @@
+import copy
+import json
+import sqlite3
+import datetime as dt
+
+from alkali import fields
+from .storage import Storage
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(Storage):
+    """
+    save models in a sqlite database, one table per model
+
+    the table is named after the model and has a column per field, it's
+    created (and any new fields added) the first time a model is read or
+    written. fields declared with ``indexed=True`` get an sql index.
+
+    ::
+
+        storage = SQLiteStorage('data.sqlite')
+        MyModel.objects.load( storage.filter(status='active', score__gt=3) )
+
+    ``filter()`` pushes the lookups down to sql so only the matching rows
+    are read, see :func:`SQLiteStorage.filter`. after a model is read
+    through a view its ``write()`` here (eg. ``Database.store()``) only
+    replaces the rows matching the view, the rows that weren't read are
+    kept. reading the whole table again ends that.
+
+    ``DateTimeField`` values are stored as utc isoformat text so they
+    compare in sql, they are loaded back in utc. ``SetField`` values are
+    stored as a json list.
+    """
+    extension = 'sqlite'
+    delta = True
+
+    # sql column type for each field type
+    column_types = {
+            fields.IntField:      'INTEGER',
+            fields.BoolField:     'INTEGER',
+            fields.FloatField:    'REAL',
+            fields.StringField:   'TEXT',
+            fields.UUIDField:     'TEXT',
+            fields.DateTimeField: 'TEXT',
+            fields.SetField:      'TEXT',
+            }
+
+    # lookups that can be pushed down to sql
+    comparisons = {
+            'eq': '=',
+            'gt': '>',
+            'ge': '>=',
+            'lt': '<',
+            'le': '<=',
+            }
+
+    def __init__(self, filename=None, *args, **kw ):
+        self._conn = None
+        self._lookups = {}
+        self._tables = set()
+        self._partial = {}
+        self.filename = filename # property
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @filename.setter
+    def filename(self, filename):
+        """
+        when setting the filename, immediately connect to the database
+        """
+        self._conn = None
+
+        self._filename = filename
+        self._tables = set()
+
+        # table: lookups of the view it was last read through, shared
+        # with our views
+        self._partial = {}
+
+        if filename is not None:
+            self._conn = sqlite3.connect(filename, check_same_thread=False)
+
+    def filter(self, **lookups):
+        """
+        a view of this storage that only reads the rows matching all of
+        ``lookups``, they are the :func:`alkali.query.Query.filter`
+        lookups ``eq``, ``ne``, ``gt``, ``ge``, ``lt``, ``le``, ``range``,
+        ``in`` and ``isnull`` on model fields (or ``pk``)
+
+        ``write()`` on the view only replaces the matching rows so a
+        manager loaded from a view can be stored back to it
+
+        :rtype: :class:`SQLiteStorage`
+        """
+        view = copy.copy(self)
+        view._lookups = dict(self._lookups, **lookups)
+        return view
+
+    def _table(self, model_class):
+        """
+        helper function that creates or updates the table for model_class
+
+        :rtype: ``str``, the quoted table name
+        """
+        table = quote( model_class.__name__.lower() )
+
+        if table in self._tables:
+            return table
+
+        meta = model_class.Meta
+        columns = {row[1] for row in self._conn.execute( "PRAGMA table_info({})".format(table) )}
+
+        with self._conn:
+            if not columns:
+                defs = ["{} {}".format(quote(name), self._column_type(field))
+                        for name, field in meta.fields.items()]
+                defs.append( "PRIMARY KEY ({})".format(", ".join(quote(name) for name in meta.pk_fields.keys())) )
+
+                self._conn.execute( "CREATE TABLE {} ({})".format(table, ", ".join(defs)) )
+            else:
+                for name, field in meta.fields.items():
+                    if name not in columns:
+                        self._conn.execute( "ALTER TABLE {} ADD COLUMN {} {}".format(
+                            table, quote(name), self._column_type(field)) )
+
+            for name, field in meta.fields.items():
+                if field.indexed:
+                    index = quote( "{}_{}".format(model_class.__name__.lower(), name) )
+                    self._conn.execute( "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+                        index, table, quote(name)) )
+
+        self._tables.add(table)
+        return table
+
+    def _column_type(self, field):
+        if isinstance(field, fields.ForeignKey):
+            field = field.pk_field
+
+        return self.column_types.get(type(field), '')
+
+    def _where(self, model_class, lookups=None):
+        """
+        helper function that compiles our lookups
+
+        :param dict lookups: compile these instead
+
+        :rtype: ``tuple`` of the sql ``WHERE`` clause (possibly empty) and
+            its parameters
+        :raises ValueError: if a lookup can't be done in sql
+        """
+        meta = model_class.Meta
+        clauses = []
+        params = []
+
+        if lookups is None:
+            lookups = self._lookups
+
+        for lookup, value in lookups.items():
+            name, _, oper = lookup.partition('__')
+            oper = oper or 'eq'
+
+            if name == 'pk':
+                if len(meta.pk_fields) != 1:
+                    raise ValueError("pk lookup on a compound primary key")
+
+                name = meta.pk_fields.keys()[0]
+
+            field = meta.fields.get(name)
+
+            if field is None:
+                raise ValueError( "{}: not a field: {}".format(model_class.__name__, name) )
+
+            column = quote(name)
+            convert = to_sql(field)
+
+            if oper == 'isnull':
+                clauses.append( "{} IS {}NULL".format(column, "" if value else "NOT ") )
+            elif oper in ('eq', 'ne') and value is None:
+                clauses.append( "{} IS {}NULL".format(column, "" if oper == 'eq' else "NOT ") )
+            elif oper == 'ne':
+                clauses.append( "({0} != ? OR {0} IS NULL)".format(column) )
+                params.append( convert(value) )
+            elif oper in self.comparisons:
+                clauses.append( "{} {} ?".format(column, self.comparisons[oper]) )
+                params.append( convert(value) )
+            elif oper == 'range':
+                lower, upper = value
+                clauses.append( "{} BETWEEN ? AND ?".format(column) )
+                params.extend( [convert(lower), convert(upper)] )
+            elif oper == 'in':
+                if isinstance(value, str):
+                    raise ValueError("substring 'in' lookups can't be done in sql")
+
+                value = list(value)
+                values = [convert(v) for v in value if v is not None]
+                clause = "{} IN ({})".format(column, ", ".join("?" * len(values)))
+
+                if len(values) < len(value):
+                    clause = "({} OR {} IS NULL)".format(clause, column)
+
+                clauses.append(clause)
+                params.extend(values)
+            else:
+                raise ValueError( "lookup can't be done in sql: {}".format(lookup) )
+
+        if not clauses:
+            return "", []
+
+        return " WHERE " + " AND ".join(clauses), params
+
+    def read(self, model_class):
+        """
+        yield a ``dict`` of field values for every (matching) row, rows
+        are fetched from sql as they're needed
+        """
+        if self._conn is None:
+            return
+
+        table = self._table(model_class)
+        where, params = self._where(model_class)
+
+        if self._lookups:
+            self._partial[table] = dict(self._lookups)
+        else:
+            self._partial.pop(table, None)
+
+        names = list(model_class.Meta.fields.keys())
+        converters = [(i, from_sql(field)) for i, field in enumerate(model_class.Meta.fields.values())]
+        converters = [(i, convert) for i, convert in converters if convert is not None]
+
+        sql = "SELECT {} FROM {}{}".format(", ".join(quote(name) for name in names), table, where)
+
+        for row in self._conn.execute(sql, params):
+            if converters:
+                row = list(row)
+
+                for i, convert in converters:
+                    if row[i] is not None:
+                        row[i] = convert(row[i])
+
+            yield dict(zip(names, row))
+
+    def _rows(self, model_class, iterator):
+        """
+        helper generator that yields the sql values of model instances
+        """
+        getters = []
+
+        for field in model_class.Meta.fields.values():
+            convert = to_sql(field, check=False)
+            raw = field.raw
+
+            if convert is None:
+                getters.append(raw)
+            else:
+                getters.append( lambda obj, raw=raw, convert=convert: convert(raw(obj)) )
+
+        for obj in iterator:
+            yield tuple( get(obj) for get in getters )
+
+    def _upsert(self, model_class, table):
+        names = list(model_class.Meta.fields.keys())
+
+        return "INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(
+                table,
+                ", ".join(quote(name) for name in names),
+                ", ".join("?" * len(names)),
+                )
+
+    def write(self, model_class, iterator):
+        """
+        replace all the (matching) rows with the model instances
+
+        without lookups of our own, the lookups of the view the model was
+        last read through are used so its unread rows aren't deleted
+        """
+        if iterator is None or self._conn is None:
+            return False
+
+        table = self._table(model_class)
+        lookups = self._lookups
+
+        if not lookups and table in self._partial:
+            lookups = self._partial[table]
+            logger.debug( "%s: only replacing the rows matching the last read: %s", table, lookups )
+
+        where, params = self._where(model_class, lookups)
+
+        with self._conn:
+            self._conn.execute( "DELETE FROM {}{}".format(table, where), params )
+            self._conn.executemany( self._upsert(model_class, table), self._rows(model_class, iterator) )
+
+        return True
+
+    def write_delta(self, model_class, upserts, deletes):
+        """
+        upsert and delete just the changed rows
+        """
+        if self._conn is None:
+            return False
+
+        table = self._table(model_class)
+        pk_fields = model_class.Meta.pk_fields
+
+        delete = "DELETE FROM {} WHERE {}".format(
+                table,
+                " AND ".join("{} = ?".format(quote(name)) for name in pk_fields.keys())
+                )
+
+        pk_rows = self._pk_rows(model_class)
+
+        with self._conn:
+            self._conn.executemany( self._upsert(model_class, table), self._rows(model_class, upserts) )
+            self._conn.executemany( delete, pk_rows(deletes) )
+
+        return True
+
+    def _pk_rows(self, model_class):
+        """
+        helper function that returns a generator of the sql pk values of
+        model instances
+        """
+        getters = [(field.raw, to_sql(field, check=False) or (lambda value: value))
+                   for field in model_class.Meta.pk_fields.values()]
+
+        def pk_rows(iterator):
+            for obj in iterator:
+                yield tuple( convert(raw(obj)) for raw, convert in getters )
+
+        return pk_rows
+
+
+def quote(name):
+    """
+    quote an sql identifier
+    """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def to_sql(field, check=True):
+    """
+    :param Field field:
+    :param bool check: also convert query values, a ``ForeignKey`` then
+        takes a model instance
+    :rtype: function converting a raw field value to its sql value,
+        ``None`` if it's stored as is (only when not ``check``)
+    """
+    convert = None
+
+    if isinstance(field, fields.ForeignKey):
+        foreign_model = field.foreign_model
+        pk = to_sql(field.pk_field, check=False)
+
+        if check:
+            def convert(value):
+                if isinstance(value, foreign_model):
+                    value = value.pk
+                return pk(value) if pk and value is not None else value
+
+            return convert
+
+        return pk
+
+    if isinstance(field, fields.DateTimeField):
+        def convert(value):
+            if value is None:
+                return None
+
+            if check:
+                value = field.cast(value)
+
+            return value.astimezone(dt.timezone.utc).isoformat(timespec='microseconds')
+
+    elif isinstance(field, fields.SetField):
+        def convert(value):
+            return None if value is None else json.dumps(list(value))
+
+    if convert is None and check:
+        return lambda value: value
+
+    return convert
+
+
+def from_sql(field):
+    """
+    :param Field field:
+    :rtype: function converting an sql value to one the field can cast,
+        ``None`` if it can cast the sql value
+    """
+    if isinstance(field, fields.SetField):
+        return json.loads
+
+    return None
@@ -1,7 +1,44 @@
+import contextlib
+
+from alkali.fields import Field
+from alkali.metamodel import IMMUTABLE_TYPES
+
+
+def caster(model_class):
+    """
+    used by storages that parse in a worker process, so the work of
+    casting happens there too
+
+    :rtype: function that casts the values of a record ``dict`` to their
+        field types, in place
+    """
+    casts = [(name, field.cast) for name, field in model_class.Meta.fields.items()
+             if type(field).cast is not Field.cast or field.field_type not in IMMUTABLE_TYPES]
+
+    def cast(record):
+        for name, cast in casts:
+            value = record.get(name)
+
+            if value is not None:
+                record[name] = cast(value)
+
+        return record
+
+    return cast
+
+
 class Storage:
     """
     helper base class for the Storage object hierarchy
+
+    :ivar trusted:
+        the data was written by alkali (or is otherwise known good), see
+        :func:`alkali.manager.Manager.load`. set on the class or instance.
+    :ivar delta:
+        the storage implements :func:`Storage.write_delta`
     """
+    trusted = False
+    delta = False
 
     def __init__(self, *args, **kw ):
         pass
@@ -15,3 +52,48 @@ class Storage:
 
     def write(self, model_class, iterator):
         raise NotImplementedError()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        group the reads or writes of several models, see
+        :func:`alkali.database.Database.load`. a storage holding several
+        models can then do its work once for all of them.
+
+        the default does nothing
+        """
+        yield self
+
+    def write_delta(self, model_class, upserts, deletes):
+        """
+        save only what changed since the manager was last loaded from or
+        stored to this storage, called instead of ``write()`` when
+        ``delta`` is True
+
+        :param upserts: the inserted and updated instances, in no order
+        :param deletes: the deleted instances
+        :rtype: ``bool``, False if the storage can't apply a delta and
+            needs a full ``write()``
+        """
+        return False
+
+    def restored(self, model_class):
+        """
+        called instead of ``read()`` when the manager restored the records
+        from a snapshot of the storage's current contents, see
+        :mod:`alkali.snapshot`. the manager then stores its changes as if
+        it had read them.
+
+        the default does nothing
+        """
+        pass
+
+    def fingerprint(self):
+        """
+        identify the current contents of the storage, a snapshot of what
+        was read is reused while this doesn't change, see :mod:`alkali.snapshot`
+
+        :rtype: a picklable value, ``None`` (the default) if the storage
+            can't be fingerprinted
+        """
+        return None
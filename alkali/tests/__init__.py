@@ -50,3 +50,34 @@ class AutoModel2(Model):
     modified = fields.DateTimeField(auto_now=True)
     f1       = fields.StringField()
     f2       = fields.StringField()
+
+
+class IndexedModel(Model):
+    id      = fields.IntField(primary_key=True)
+    status  = fields.StringField(indexed=True)
+    score   = fields.IntField(indexed=True)
+    foreign = fields.ForeignKey(MyModel, indexed=True)
+    value   = fields.FloatField(indexed=True)
+
+
+class VectorModel(Model):
+    class Meta:
+        ordering = ['id', 'count', 'value', 'flag', 'date']
+        vectorize = True
+
+    id    = fields.IntField(primary_key=True)
+    count = fields.IntField()
+    value = fields.FloatField()
+    flag  = fields.BoolField()
+    date  = fields.DateTimeField()
+
+
+class CompactModel(Model):
+    class Meta:
+        ordering = ['id', 'name', 'score', 'foreign']
+        compact = True
+
+    id      = fields.IntField(primary_key=True)
+    name    = fields.StringField()
+    score   = fields.IntField(indexed=True)
+    foreign = fields.ForeignKey(MyModel)
@@ -0,0 +1,136 @@
+import unittest
+
+import datetime as dt
+
+from alkali.query import Query, Sum, Count, Max, Min, Avg
+from alkali import columns, tznow
+
+from . import MyModel, VectorModel
+
+@unittest.skipUnless( columns.available(), "requires numpy" )
+class TestColumns( unittest.TestCase ):
+
+    def setUp(self):
+        self.now = tznow().replace(microsecond=0)
+
+        for i in range(10):
+            VectorModel(id=i, count=i * 10, value=i / 4, flag=i % 2,
+                    date=self.now + dt.timedelta(hours=i)).save()
+
+    def tearDown(self):
+        VectorModel.objects.clear()
+        MyModel.objects.clear()
+
+    def ids(self, q):
+        return [e.id for e in q]
+
+    def test_1(self):
+        "column store is rebuilt when the manager changes"
+        manager = VectorModel.objects
+        self.assertFalse( MyModel.Meta.vectorize )
+        self.assertIsNone( MyModel.objects._columns(MyModel.objects._version) )
+
+        store = manager._columns(manager._version)
+        self.assertEqual( 10, len(store) )
+        self.assertIs( store, manager._columns(manager._version) )
+        self.assertEqual( list(range(0, 100, 10)), store.column('count').values.tolist() )
+        self.assertIsNone( store.column('nope') )
+
+        q = Query(manager)
+        VectorModel(id=10, count=100).save()
+        self.assertIsNone( manager._columns(q._version) ) # out of date snapshot
+
+        store2 = manager._columns(manager._version)
+        self.assertIsNot( store, store2 )
+        self.assertEqual( 11, len(store2) )
+
+        # snapshot still gives the right answer
+        self.assertEqual( [9], self.ids(q.filter(count__gt=80)) )
+        self.assertEqual( [9, 10], self.ids(VectorModel.objects.filter(count__gt=80)) )
+
+    def test_filter(self):
+        "vectorized filters give the same answers as scanning"
+        q = VectorModel.objects.filter(count__ge=30, value__lt=2)
+        self.assertEqual( [3, 4, 5, 6, 7], self.ids(q) )
+
+        q = VectorModel.objects.filter(flag=True, count__range=(20, 70))
+        self.assertEqual( [3, 5, 7], self.ids(q) )
+
+        q = VectorModel.objects.filter(count__in=[10, 40, 41], count__ne=40)
+        self.assertEqual( [1], self.ids(q) )
+
+        q = VectorModel.objects.filter(date__gt=self.now + dt.timedelta(hours=7))
+        self.assertEqual( [8, 9], self.ids(q) )
+
+        # other timezones compare the same
+        tz = dt.timezone(dt.timedelta(hours=5))
+        q = VectorModel.objects.filter(date=(self.now + dt.timedelta(hours=2)).astimezone(tz))
+        self.assertEqual( [2], self.ids(q) )
+
+        # keeps the query's order, mixed with scans
+        q = VectorModel.objects.order_by('-id').filter(count__lt=40, id__in=[0, 2, 3])
+        self.assertEqual( [3, 2, 0], self.ids(q) )
+
+        # floats and any iterable
+        q = VectorModel.objects.filter(count__gt=1.5, count__in=range(100))
+        self.assertEqual( 9, len(q) )
+
+        with self.assertRaises( TypeError ):
+            len( VectorModel.objects.filter(count__gt='a') )
+
+    def test_nulls(self):
+        "None is stored to the side"
+        VectorModel(id=10).save()
+
+        self.assertEqual( [10], self.ids(VectorModel.objects.filter(count__isnull=True)) )
+        self.assertEqual( 10, len(VectorModel.objects.filter(value__isnull=False)) )
+        self.assertEqual( [0], self.ids(VectorModel.objects.filter(count=0)) )
+        self.assertEqual( 10, len(VectorModel.objects.filter(count__ne=0)) )
+
+        # None isn't orderable, same as without numpy
+        with self.assertRaises( TypeError ):
+            len( VectorModel.objects.filter(count__gt=1) )
+
+        # not vectorized
+        self.assertEqual( 450, Sum('count')(VectorModel.objects.filter(count__isnull=False)) )
+
+    def test_filter_subset(self):
+        "a narrowed candidate set only compares its own positions"
+        VectorModel(id=10).save()
+        store = VectorModel.objects._columns(VectorModel.objects._version)
+
+        mask = store.column('count').compare('ge', 30, store.positions([8, 3, 1]))
+        self.assertEqual( [True, True, False], mask.tolist() )
+
+        pks, rest = store.filter([10, 7, 2], [('count', 'isnull', False), ('id', 'eq', 7)])
+        self.assertEqual( [7], pks )
+        self.assertEqual( [], rest )
+
+        pks, rest = store.filter([10, 2], [('count', 'ne', 20), ('nope', 'eq', 1)])
+        self.assertEqual( [10], pks )
+        self.assertEqual( [('nope', 'eq', 1)], rest )
+
+    def test_aggregate(self):
+        "vectorized aggregates give the same answers as streaming"
+        q = VectorModel.objects.filter(count__gt=20)
+        d = q.aggregate(Sum('count'), Min('value'), Max('date'), Avg('count'), Count('id'))
+
+        self.assertEqual( {'count__sum': 420, 'value__min': 0.75, 'date__max': self.now + dt.timedelta(hours=9),
+            'count__avg': 60.0, 'id__count': 7}, d )
+        self.assertIs( type(d['count__sum']), int )
+        self.assertAlmostEqual( 5.0, Sum('value')(VectorModel.objects.filter(flag=False)) )
+        self.assertEqual( 5, Sum('flag')(VectorModel.objects.all()) )
+
+        # subset in a different order
+        q = VectorModel.objects.order_by('-value').filter(id__in=[5, 1, 8])
+        self.assertEqual( {'count__min': 10, 'count__max': 80}, q.aggregate(Min('count'), Max('count')) )
+
+        # empty and not vectorized
+        q = VectorModel.objects.filter(count__gt=1000)
+        self.assertEqual( {'count__sum': 0}, q.aggregate(Sum('count')) )
+
+        with self.assertRaises( ValueError ):
+            q.aggregate(Min('date'))
+
+        with self.assertRaises( TypeError ):
+            Sum('date')(VectorModel.objects.all())
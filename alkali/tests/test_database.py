@@ -1,15 +1,19 @@
 import os
+import sys
+import json
 import unittest
 import tempfile
 import inspect
+import subprocess
 
 from alkali.database import Database
 from alkali.model import Model
 from alkali.storage import JSONStorage, Storage, MultiStorage
 from alkali import fields
 from alkali import tznow
+from alkali import signals
 
-from . import MyModel, AutoModel1, AutoModel2
+from . import MyModel, MyDepModel, AutoModel1, AutoModel2
 
 curr_dir = os.path.dirname( os.path.abspath( __file__ ) )
 
@@ -31,6 +35,8 @@ class TestDatabase( unittest.TestCase ):
 
         AutoModel1.objects.clear()
         AutoModel2.objects.clear()
+        MyDepModel.objects.clear()
+        MyModel.objects.clear()
 
     def test_1(self):
         "verify instantiation"
@@ -253,3 +259,183 @@ class TestDatabase( unittest.TestCase ):
 
         self.assertEqual("some text 1", AutoModel1.objects.get(f1="some text 1").f1)
         self.assertEqual("some text 1", AutoModel2.objects.get(f1="some text 1").f1)
+
+    def test_storage_batch(self):
+        "a shared MultiStorage is parsed and written once per load/store"
+        tfile = tempfile.NamedTemporaryFile(mode="w")
+        storage = MultiStorage([AutoModel1, AutoModel2], tfile.name)
+
+        calls = []
+        parse, dump = storage._parse, storage._dump
+        storage._parse = lambda: calls.append('parse') or parse()
+        storage._dump = lambda data: calls.append('dump') or dump(data)
+
+        db = Database( models=[AutoModel1, AutoModel2], storage=storage )
+
+        AutoModel1(f1="some text 1").save()
+        AutoModel2(f1="some text 2").save()
+
+        db.store()
+        self.assertEqual( ['parse', 'dump'], calls )
+
+        del calls[:]
+        db.load()
+        self.assertEqual( ['parse'], calls )
+        self.assertEqual( "some text 2", AutoModel2.objects.get(f1="some text 2").f1 )
+
+        # only one model dirty, the other's section is kept
+        del calls[:]
+        AutoModel2(f1="some text 3").save()
+        db.store()
+        self.assertEqual( ['parse', 'dump'], calls )
+
+        del calls[:]
+        db.store()
+        self.assertEqual( [], calls )
+
+        db.load()
+        self.assertEqual( 1, len(AutoModel1.objects) )
+        self.assertEqual( 2, len(AutoModel2.objects) )
+
+        # what was stored is written even if the batch fails
+        AutoModel1(f1="some text 4").save()
+
+        with self.assertRaises( ZeroDivisionError ):
+            with storage.batch():
+                AutoModel1.objects.store(storage)
+                1 / 0
+
+        db.load()
+        self.assertEqual( 2, len(AutoModel1.objects) )
+
+    def test_schedule(self):
+        "models wait for their foreign models and for a shared storage"
+        tdir = tempfile.TemporaryDirectory()
+
+        db = Database( models=[MyDepModel, AutoModel1, MyModel], root_dir=tdir.name )
+        schedule = db._schedule(foreign=True)
+
+        self.assertEqual( [AutoModel1, MyModel, MyDepModel], list(schedule.keys()) )
+        self.assertEqual( {MyModel}, schedule[MyDepModel] )
+        self.assertEqual( set(), schedule[AutoModel1] )
+        self.assertEqual( set(), db._schedule(foreign=False)[MyDepModel] )
+
+        storage = MultiStorage([AutoModel1, AutoModel2], os.path.join(tdir.name, 'multi.json'))
+        db = Database( models=[AutoModel1, AutoModel2], storage=storage )
+        self.assertEqual( {AutoModel1}, db._schedule(foreign=False)[AutoModel2] )
+
+    def test_serial(self):
+        "by default models load and store in the calling thread"
+        import threading
+
+        tdir = tempfile.TemporaryDirectory()
+        db = Database( models=[MyModel, AutoModel1], root_dir=tdir.name )
+        self.assertEqual( 1, db._workers )
+
+        threads = set()
+        receiver = lambda sender, **kw: threads.add( threading.current_thread() )
+        signals.pre_store.connect(receiver)
+        signals.pre_load.connect(receiver)
+
+        try:
+            MyModel(int_type=1).save()
+            AutoModel1(f1="some text").save()
+            db.store()
+            db.load()
+        finally:
+            signals.pre_store.disconnect(receiver)
+            signals.pre_load.disconnect(receiver)
+
+        self.assertEqual( {threading.current_thread()}, threads )
+
+    def test_parallel(self):
+        "models load in parallel, after the models they reference"
+        import threading
+
+        tdir = tempfile.TemporaryDirectory()
+        db = Database( models=[MyDepModel, MyModel, AutoModel1], root_dir=tdir.name, workers=4 )
+
+        m = MyModel(int_type=1).save()
+        MyDepModel(pk1=1, foreign=m).save()
+        AutoModel1(f1="some text").save()
+        db.store()
+
+        for model in db.models:
+            model.objects.clear()
+
+        # independent models read at the same time
+        barrier = threading.Barrier(2, timeout=5)
+        threads = set()
+
+        def read(storage, read):
+            def wrapper(model_class):
+                threads.add( threading.current_thread().name )
+                if model_class in (MyModel, AutoModel1):
+                    barrier.wait()
+                return read(model_class)
+            return wrapper
+
+        for model in db.models:
+            storage = db.get_storage(model)
+            storage.read = read(storage, storage.read)
+
+        db.load()
+
+        self.assertEqual( 1, len(AutoModel1.objects) )
+        self.assertEqual( m, MyDepModel.objects.get(1).foreign )
+        self.assertTrue( len(threads) > 1 )
+
+        for model in db.models:
+            del db.get_storage(model).read
+
+        # errors are raised
+        db.get_storage(AutoModel1).read = lambda model_class: 1 / 0
+
+        with self.assertRaises( ZeroDivisionError ):
+            db.load()
+
+        del db.get_storage(AutoModel1).read
+
+        # one at a time
+        db._workers = 1
+        db.load()
+        self.assertEqual( m, MyDepModel.objects.get(1).foreign )
+
+    def test_read_only(self):
+        "read-only database makes its managers read-only"
+        tdir = tempfile.TemporaryDirectory()
+        db = Database( models=[AutoModel1], root_dir=tdir.name, read_only=True )
+
+        try:
+            AutoModel1(f1="some text").save()
+            self.assertTrue( AutoModel1.objects.read_only )
+            self.assertTrue( AutoModel1.objects.get(f1="some text").frozen )
+            self.assertFalse( AutoModel2.objects.read_only )
+        finally:
+            AutoModel1.objects.read_only = False
+
+    def test_save_on_exit_interpreter(self):
+        "save_on_exit stores when the database is collected at interpreter exit"
+        tdir = tempfile.TemporaryDirectory()
+
+        script = "\n".join([
+            "from alkali import Database",
+            "from alkali.tests import MyModel, AutoModel1",
+            "db = Database(models=[MyModel, AutoModel1], root_dir={!r}, save_on_exit=True)".format(tdir.name),
+            "MyModel(int_type=1, str_type='a').save()",
+            "AutoModel1(f1='b').save()",
+            ])
+
+        root = os.path.dirname( os.path.dirname(curr_dir) )
+        env = dict(os.environ, PYTHONPATH=root)
+        proc = subprocess.run( [sys.executable, '-c', script], env=env, stderr=subprocess.PIPE )
+
+        self.assertEqual( 0, proc.returncode )
+        self.assertNotIn( b'Traceback', proc.stderr )
+        self.assertNotIn( b'Exception ignored', proc.stderr )
+
+        with open( os.path.join(tdir.name, 'MyModel.json') ) as f:
+            self.assertEqual( 'a', json.load(f)[0]['str_type'] )
+
+        with open( os.path.join(tdir.name, 'AutoModel1.json') ) as f:
+            self.assertEqual( 'b', json.load(f)[0]['f1'] )
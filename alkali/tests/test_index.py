@@ -0,0 +1,270 @@
+import unittest
+
+import datetime as dt
+
+from alkali.index import HashIndex, SortedIndex, PrimaryKeyIndex
+from alkali.query import Query
+from alkali import fields, tznow
+
+from . import MyModel, MyMulti, IndexedModel, Entry
+
+class TestIndex( unittest.TestCase ):
+
+    def tearDown(self):
+        IndexedModel.objects.clear()
+        MyModel.objects.clear()
+        Entry.objects.clear()
+
+    def test_1(self):
+        "verify class/instance implementation"
+        index = IndexedModel.objects.indexes['foreign']
+        self.assertTrue( isinstance(index, HashIndex) )
+        self.assertTrue( repr(index) )
+        self.assertEqual( 0, len(index) )
+
+        index = IndexedModel.objects.indexes['status']
+        self.assertTrue( isinstance(index, SortedIndex) )
+        self.assertTrue( isinstance(IndexedModel.objects._pk_index, PrimaryKeyIndex) )
+        self.assertTrue( isinstance(MyMulti.objects._pk_index, PrimaryKeyIndex) )
+
+        self.assertEqual( ['status', 'score', 'foreign', 'value'], list(IndexedModel.objects.indexes.keys()) )
+        self.assertEqual( {}, MyModel.objects.indexes )
+
+    def test_2(self):
+        "SetFields can't be indexed"
+        with self.assertRaises( AssertionError ):
+            fields.SetField(indexed=True)
+
+    def test_save_delete(self):
+        "manager keeps index up to date"
+        index = IndexedModel.objects.indexes['status']
+
+        m = IndexedModel(id=1, status='new').save()
+        IndexedModel(id=2, status='new').save()
+        self.assertEqual( {1, 2}, index.lookup('new') )
+
+        m.status = 'done'
+        m.save()
+        self.assertEqual( {2}, index.lookup('new') )
+        self.assertEqual( {1}, index.lookup('done') )
+
+        IndexedModel.objects.delete(m)
+        self.assertEqual( set(), index.lookup('done') )
+        self.assertEqual( ['new'], list(index.values) )
+
+        IndexedModel.objects.clear()
+        self.assertEqual( 0, len(index) )
+
+    def test_foreign(self):
+        "foreign keys are indexed on the foreign pk"
+        m1 = MyModel(int_type=1).save()
+        m2 = MyModel(int_type=2).save()
+
+        IndexedModel(id=1, foreign=m1).save()
+        IndexedModel(id=2, foreign=m2).save()
+        IndexedModel(id=3).save()
+
+        index = IndexedModel.objects.indexes['foreign']
+        self.assertEqual( {1}, index.lookup(m1) )
+        self.assertEqual( set(), index.lookup(1) ) # not a MyModel instance
+        self.assertEqual( {3}, index.lookup(None) )
+
+        self.assertEqual( 1, len(m2.indexedmodel_set.all()) )
+
+    def test_query(self):
+        "index lookups give the same answer as scanning"
+        for i in range(10):
+            IndexedModel(id=i, status='s%d' % (i % 3), score=i % 2 or None).save()
+
+        q = IndexedModel.objects.filter(status='s1')
+        self.assertEqual( [1, 4, 7], [e.id for e in q] )
+
+        q = IndexedModel.objects.filter(status__in=['s1', 's2'])
+        self.assertEqual( [1, 2, 4, 5, 7, 8], [e.id for e in q] )
+
+        q = IndexedModel.objects.filter(score__isnull=True)
+        self.assertEqual( [0, 2, 4, 6, 8], [e.id for e in q] )
+
+        q = IndexedModel.objects.filter(score__isnull=False)
+        self.assertEqual( [1, 3, 5, 7, 9], [e.id for e in q] )
+
+        q = IndexedModel.objects.filter(id__gt=4).filter(status='s1')
+        self.assertEqual( [7], [e.id for e in q] )
+
+        q = IndexedModel.objects.filter(status__in='s1') # substring
+        self.assertEqual( 3, len(q) )
+
+        q = IndexedModel.objects.filter(pk__in=[1, 3, 99])
+        self.assertEqual( [1, 3], [e.id for e in q] )
+
+    def test_load(self):
+        "indexes are built once at the end of a load"
+        import tempfile
+        from alkali.storage import JSONStorage
+
+        tfile = tempfile.NamedTemporaryFile()
+        storage = JSONStorage(tfile.name)
+
+        m = MyModel(int_type=1).save()
+
+        for i in [3, 1, 2]:
+            IndexedModel(id=i, status='s%d' % (i % 2), score=i, foreign=m).save()
+
+        storage.write( IndexedModel, IndexedModel.objects.all() )
+        IndexedModel.objects.clear()
+        IndexedModel.objects.load(storage)
+
+        self.assertEqual( [1, 2, 3], IndexedModel.objects.pks )
+        self.assertEqual( [2, 3], IndexedModel.objects.indexes['score'].range(('gt', 1)) )
+        self.assertEqual( {1, 3}, IndexedModel.objects.indexes['status'].lookup('s1') )
+
+    def test_query_snapshot(self):
+        "index is not used once the manager changes under a query"
+        IndexedModel(id=1, status='new').save()
+
+        q = Query(IndexedModel.objects)
+        IndexedModel(id=2, status='new').save()
+
+        self.assertEqual( [1], [e.id for e in q.filter(status='new')] )
+
+    def test_sorted(self):
+        "sorted index keeps values and pks in value order"
+        index = SortedIndex(IndexedModel.score__field)
+
+        for pk, value in [(1, 5), (2, 3), (3, None), (4, 5), (5, 1)]:
+            index.add(pk, value)
+
+        self.assertEqual( 5, len(index) )
+        self.assertEqual( [1, 3, 5], index.values )
+        self.assertEqual( [5, 2, 1, 4], index.range() )
+        self.assertEqual( {1, 4}, index.lookup(5) )
+        self.assertEqual( {3}, index.lookup(None) )
+
+        self.assertEqual( [2], index.range(('gt', 1), ('lt', 5)) )
+        self.assertEqual( [5, 2], index.range(('lt', 5)) )
+        self.assertEqual( [2, 1, 4], index.range(('range', (2, 5))) )
+        self.assertEqual( [], index.range(('gt', 5)) )
+        self.assertEqual( [], index.range(('gt', 3), ('lt', 2)) )
+
+        index.remove(1, 5)
+        index.remove(3, None)
+        self.assertEqual( [5, 2, 4], index.range() )
+        self.assertEqual( 3, len(index) )
+
+        with self.assertRaises( ValueError ):
+            index.bounds('eq', 1)
+
+    def test_sorted_equal(self):
+        "equal values are kept in pk order, add and remove are a bisect"
+        index = SortedIndex(IndexedModel.status__field)
+        index.build( (pk, 'ab'[pk % 2]) for pk in range(10) )
+
+        self.assertEqual( [0, 2, 4, 6, 8, 1, 3, 5, 7, 9], index.range() )
+        self.assertEqual( {1, 3, 5, 7, 9}, index.lookup('b') )
+
+        index.remove(4, 'a')
+        index.remove(4, 'a') # not there
+        index.add(10, 'a')
+        index.add(-1, 'a')
+        self.assertEqual( [-1, 0, 2, 6, 8, 10], index.range(('lt', 'b')) )
+        self.assertEqual( {-1, 0, 2, 6, 8, 10}, index.lookup('a') )
+        self.assertEqual( 11, len(index) )
+
+    def test_sorted_pending(self):
+        "changes since the last range lookup are sorted in, a few or many"
+        for n in [10, 500]:
+            index = SortedIndex(IndexedModel.score__field)
+            index.build( (pk, pk % 7) for pk in range(500) )
+
+            for pk in range(0, n, 3):
+                index.remove(pk, pk % 7)
+                index.add(pk, pk % 5)
+            index.add(2000, 3)
+            index.remove(2000, 3)
+
+            fresh = SortedIndex(IndexedModel.score__field)
+            fresh.build( (pk, pk % 5 if pk % 3 == 0 and pk < n else pk % 7) for pk in range(500) )
+
+            self.assertEqual( len(fresh), len(index) )
+            self.assertEqual( fresh.range(), index.range() )
+            self.assertEqual( fresh.range(('ge', 4)), index.range(('ge', 4)) )
+            self.assertEqual( fresh.values, index.values )
+
+    def test_nan(self):
+        "NaN is kept out of the sorted values, it never matches"
+        nan = float('nan')
+
+        for i, value in enumerate([1.0, nan, 2.0, 3.0, nan, None]):
+            IndexedModel(id=i, value=value).save()
+
+        index = IndexedModel.objects.indexes['value']
+        self.assertEqual( [1.0, 2.0, 3.0], index.values )
+        self.assertEqual( 6, len(index) )
+
+        def ids(**kw):
+            return [e.id for e in IndexedModel.objects.filter(**kw)]
+
+        self.assertEqual( [3], ids(value=3.0) )
+        self.assertEqual( [], ids(value=nan) )
+        self.assertEqual( [0, 3], ids(value__in=[1.0, 3.0, nan]) )
+        self.assertEqual( [2, 3], ids(value__gt=1.0) )
+        self.assertEqual( [0, 2], ids(value__range=(1.0, 2.5)) )
+        self.assertEqual( [], ids(value__ge=nan) )
+        self.assertEqual( [5], ids(value__isnull=True) )
+
+        IndexedModel.objects.delete( IndexedModel.objects.get(1) )
+        self.assertEqual( 5, len(index) )
+
+        index.build( [(1, nan), (2, 0.5), (3, None)] )
+        self.assertEqual( [2], index.range() )
+        self.assertEqual( set(), index.lookup(nan) )
+
+    def test_query_range(self):
+        "range lookups give the same answer as scanning"
+        for i in range(10):
+            IndexedModel(id=i, score=10 - i, status='s%d' % i).save()
+        IndexedModel(id=10).save() # None is never in a range
+
+        q = IndexedModel.objects.filter(score__ge=3, score__lt=6)
+        self.assertEqual( [5, 6, 7], [e.id for e in q] )
+
+        q = IndexedModel.objects.filter(score__range=(3, 6))
+        self.assertEqual( [4, 5, 6, 7], [e.id for e in q] )
+
+        q = IndexedModel.objects.filter(status__gt='s7')
+        self.assertEqual( [8, 9], [e.id for e in q] )
+
+        q = IndexedModel.objects.filter(id__le=2)
+        self.assertEqual( [0, 1, 2], [e.id for e in q] )
+
+        q = IndexedModel.objects.filter(pk__gt=8)
+        self.assertEqual( [9, 10], [e.id for e in q] )
+
+        q = IndexedModel.objects.filter(id__gt=1).filter(score__le=2)
+        self.assertEqual( [8, 9], [e.id for e in q] )
+
+        # scan path for non-indexed fields
+        for i in range(5):
+            MyModel(int_type=i, str_type='s%d' % i).save()
+
+        q = MyModel.objects.filter(str_type__range=('s1', 's3'))
+        self.assertEqual( [1, 2, 3], [e.int_type for e in q] )
+
+        # un-comparable values still raise
+        with self.assertRaises( TypeError ):
+            len( IndexedModel.objects.filter(score__gt='a') )
+
+    def test_query_pk_range(self):
+        "primary key range on a DateTimeField"
+        start = tznow()
+
+        for i in range(10):
+            Entry(date=start + dt.timedelta(days=i)).save()
+
+        q = Entry.objects.filter(date__ge=start + dt.timedelta(days=2), date__lt=start + dt.timedelta(days=5))
+        self.assertEqual( 3, len(q) )
+        self.assertEqual( start + dt.timedelta(days=2), q[0].date )
+
+        Entry.objects.delete(q[0])
+        q = Entry.objects.filter(date__ge=start + dt.timedelta(days=2), date__lt=start + dt.timedelta(days=5))
+        self.assertEqual( 2, len(q) )
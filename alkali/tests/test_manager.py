@@ -160,6 +160,20 @@ class TestManager( unittest.TestCase ):
 
         self.assertEqual( [1,2,3], man.pks )
 
+    def test_7a(self):
+        "manager keeps pks in order"
+        man = MyModel.objects
+
+        for i in [5, 1, 4, 2, 3]:
+            MyModel(int_type=i).save()
+
+        man.delete( MyModel(int_type=4) )
+        MyModel(int_type=1).save() # already exists
+
+        self.assertEqual( [1,2,3,5], man.pks )
+        self.assertEqual( [1,2,3,5], [e.pk for e in man.instances] )
+        self.assertEqual( [5,3,2,1], [e.pk for e in man._ordered(reverse=True)] )
+
     def test_8(self):
         "test dirty"
 
@@ -276,3 +290,228 @@ class TestManager( unittest.TestCase ):
         self.assertEqual(1, MyModel.objects.get(int_type=1).int_type)
 
         self.assertEqual(1, MyModel.objects.count)
+
+    def test_read_only(self):
+        "read-only manager hands out its frozen instances"
+        MyModel(int_type=1).save()
+        MyModel(int_type=2).save()
+
+        try:
+            MyModel.objects.read_only = True
+            self.assertTrue( MyModel.objects.read_only )
+
+            m = MyModel.objects.get(1)
+            self.assertIs( m, MyModel.objects.get(pk=1) )
+            self.assertTrue( m.frozen )
+            self.assertIs( m, MyModel.objects.instances[0] )
+            self.assertIs( m, MyModel.objects.filter(int_type=1)[0] )
+
+            with self.assertRaises( RuntimeError ):
+                m.str_type = 'foo'
+
+            # foreign keys are views too
+            d = MyDepModel(pk1=1, foreign=m)
+            self.assertIs( m, d.foreign )
+        finally:
+            MyModel.objects.read_only = False
+
+        self.assertFalse( MyModel.objects.get(1).frozen )
+
+    def test_save_writable(self):
+        "stored instances are only frozen when handed out as views"
+        from alkali import signals
+
+        def receiver(sender, instance):
+            instance.str_type = 'from receiver'
+
+        with signals.post_save.connected_to(receiver, sender=MyModel):
+            MyModel(int_type=1).save()
+
+        self.assertEqual( 'from receiver', MyModel.objects.get(1).str_type )
+
+        m = MyModel(int_type=2)
+        MyModel.objects.save(m, copy_instance=False)
+        self.assertFalse( m.frozen )
+        m.str_type = 'mine'
+
+        self.assertTrue( MyModel.objects.frozen()[1].frozen )
+        MyModel(int_type=2, str_type='again').save()
+        self.assertFalse( MyModel.objects._instances[2].frozen )
+
+    def test_load_trusted(self):
+        "trusted load skips per instance save, one bulk signal"
+        import gc
+        from alkali import signals
+        from . import IndexedModel
+
+        tfile = tempfile.NamedTemporaryFile()
+        storage = JSONStorage(tfile.name)
+
+        f = MyModel(int_type=1).save()
+        for i in [3, 1, 2]:
+            IndexedModel(id=i, status='s%d' % (i % 2), score=i, foreign=f).save()
+
+        IndexedModel.objects.store(storage)
+
+        saved = []
+        bulk = []
+
+        def on_bulk(sender, instances):
+            bulk.append( [e.pk for e in instances] )
+            self.assertFalse( gc.isenabled() )
+
+        try:
+            with signals.post_save.connected_to(lambda sender, instance: saved.append(instance)), \
+                signals.bulk_save.connected_to(on_bulk):
+                IndexedModel.objects.load(storage, trusted=True, pause_gc=True)
+
+            self.assertTrue( gc.isenabled() )
+            self.assertEqual( [], saved )
+            self.assertEqual( [[1, 2, 3]], bulk )
+
+            self.assertEqual( [1, 2, 3], IndexedModel.objects.pks )
+            self.assertFalse( IndexedModel.objects.dirty )
+            self.assertEqual( [1, 3], [e.pk for e in IndexedModel.objects.filter(status='s1')] )
+            self.assertEqual( [3], [e.pk for e in IndexedModel.objects.filter(score__gt=2)] )
+            self.assertEqual( f, IndexedModel.objects.get(2).foreign )
+            self.assertFalse( IndexedModel.objects._instances[2].frozen )
+
+            # storage can say it's trusted
+            storage.trusted = True
+
+            with signals.bulk_save.connected_to(lambda sender, instances: bulk.append(len(instances))):
+                IndexedModel.objects.load(storage)
+
+            self.assertEqual( [[1, 2, 3], 3], bulk )
+
+            # duplicate pks still raise
+            tfile.seek(0)
+            tfile.write(b'[{"id": 1}, {"id": 1}]')
+            tfile.truncate()
+            tfile.flush()
+
+            with self.assertRaises( KeyError ):
+                IndexedModel.objects.load(storage)
+        finally:
+            IndexedModel.objects.clear()
+
+    def test_load_trusted_cast(self):
+        "trusted records are only cast where the value isn't of the field type"
+        from . import CompactModel
+
+        class Flags(Model):
+            id    = fields.IntField(primary_key=True)
+            on    = fields.BoolField()
+            tags  = fields.SetField()
+            when  = fields.DateTimeField()
+
+        now = tznow()
+
+        class Records:
+            _name = 'Records'
+            trusted = True
+
+            def read(self, model_class):
+                yield {'id': 1, 'on': 1, 'tags': ['a'], 'when': now.isoformat()}
+                yield {'id': 2, 'on': False, 'tags': {'b'}, 'when': now}
+                yield {'id': 3}
+
+        Flags.objects.load( Records() )
+
+        one, two, three = Flags.objects.get(1), Flags.objects.get(2), Flags.objects.get(3)
+        self.assertIs( True, one.on )
+        self.assertEqual( {'a'}, one.tags )
+        self.assertEqual( now, one.when )
+        self.assertIs( now, two.when )
+        self.assertEqual( {'b'}, two.tags )
+        self.assertEqual( 1, one.__dict__['_memo_pk'] )
+        self.assertFalse( one._dirty )
+        self.assertEqual( (3, None, None, None), Flags._raw_row(three) )
+
+        # compact instances, foreign keys store the pk
+        f = MyModel(int_type=2).save()
+        c = CompactModel._restore_dict( {'id': '4', 'name': 'x', 'score': 5, 'foreign': f} )
+        self.assertEqual( (4, 'x', 5, 2), CompactModel._raw_row(c) )
+        self.assertEqual( 4, c.pk )
+
+    def test_load_trusted_one2one(self):
+        "bulk_save still creates OneToOneField instances"
+        class Parent(Model):
+            id = fields.IntField(primary_key=True)
+
+        class Child(Model):
+            parent = fields.OneToOneField(Parent, primary_key=True)
+
+        tfile = tempfile.NamedTemporaryFile()
+        storage = JSONStorage(tfile.name)
+        storage.trusted = True
+
+        Parent(id=1).save()
+        Parent(id=2).save()
+        Parent.objects.store(storage)
+        Child.objects.clear()
+
+        Parent.objects.load(storage)
+        self.assertEqual( 2, len(Child.objects) )
+        self.assertEqual( Parent.objects.get(2), Child.objects.get(2).parent )
+
+    def test_changes(self):
+        "manager tracks the pks changed since the last load/store"
+        from alkali.storage import JournaledStorage
+
+        man = MyModel.objects
+        tdir = tempfile.TemporaryDirectory()
+        storage = JournaledStorage( os.path.join(tdir.name, 'MyModel.jsonl') )
+        man.store(storage, force=True) # forget earlier tests
+
+        for i in range(4):
+            MyModel(int_type=i).save()
+
+        self.assertEqual( {0, 1, 2, 3}, man.changes['inserted'] )
+
+        man.store(storage)
+        self.assertEqual( {'inserted': set(), 'updated': set(), 'deleted': set()}, man.changes )
+
+        MyModel(int_type=1, str_type="updated").save()
+        MyModel(int_type=4).save()
+        man.delete( MyModel(int_type=4) ) # inserted then deleted
+        man.delete( man.get(2) )
+        man.delete( man.get(3) )
+        MyModel(int_type=3).save() # deleted then saved
+
+        self.assertEqual( {'inserted': set(), 'updated': {1, 3}, 'deleted': {2}}, man.changes )
+
+        # only the changes are given to the storage
+        written = []
+        write_delta = storage.write_delta
+        storage.write_delta = lambda model, upserts, deletes: \
+                written.append( (sorted(e.pk for e in upserts), [e.pk for e in deletes]) ) \
+                or write_delta(model, upserts, deletes)
+
+        man.store(storage)
+        self.assertEqual( [([1, 3], [2])], written )
+        self.assertEqual( set(), man.changes['updated'] )
+
+        man.load(storage)
+        self.assertEqual( [0, 1, 3], man.pks )
+        self.assertEqual( "updated", man.get(1).str_type )
+
+        # forced and other storages get a full write
+        MyModel(int_type=5).save()
+        man.store(storage, force=True)
+        self.assertEqual( 1, len(written) )
+
+        man.clear()
+        self.assertEqual( {0, 1, 3, 5}, man.changes['deleted'] )
+
+        tfile = tempfile.NamedTemporaryFile()
+        MyModel(int_type=9).save()
+        man.store( JSONStorage(tfile.name) )
+        self.assertEqual( set(), man.changes['inserted'] )
+
+        MyModel(int_type=10).save()
+        man.store(storage)
+        self.assertEqual( 1, len(written) )
+
+        man.load(storage)
+        self.assertEqual( [9, 10], man.pks )
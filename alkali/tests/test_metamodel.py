@@ -55,3 +55,56 @@ class TestMetaModel( unittest.TestCase ):
 
         self.assertEqual( 3, len(MyModel.Meta.fields) )
         self.assertEqual( 'int_type', list(MyModel.Meta.pk_fields.keys())[0] )
+
+    def test_constructor(self):
+        "generated constructor casts, defaults and skips like the loop did"
+        from alkali import signals
+        from . import AutoModel1, CompactModel
+
+        self.assertTrue( callable(MyModel._construct) )
+
+        m = MyModel(int_type='3', str_type=4, dt_type='2017-01-01T00:00:00+00:00')
+        self.assertEqual( 3, m.int_type )
+        self.assertEqual( '4', m.str_type )
+        self.assertEqual( dt.datetime(2017, 1, 1, tzinfo=dt.timezone.utc), m.dt_type )
+        self.assertFalse( m.dirty )
+
+        m = MyModel(pk=5, foo='bar')
+        self.assertEqual( (5, None, None), (m.int_type, m.str_type, m.dt_type) )
+        self.assertEqual( 'bar', m.foo )
+
+        with self.assertRaises( ValueError ):
+            MyModel(int_type='a')
+
+        # auto fields
+        a = AutoModel1()
+        b = AutoModel1(auto=100)
+        c = AutoModel1()
+        self.assertEqual( 100, b.auto )
+        self.assertEqual( a.auto + 2, c.auto ) # explicit values still count
+        self.assertTrue( isinstance(a.creation, dt.datetime) )
+
+        # SetFields are copied
+        class SetModel( Model ):
+            id   = fields.IntField(primary_key=True)
+            tags = fields.SetField()
+
+        tags = {'a'}
+        self.assertIsNot( tags, SetModel(id=1, tags=tags).tags )
+
+        # own __init__ is still called
+        class InitModel( Model ):
+            id = fields.IntField(primary_key=True)
+
+            def __init__(self, *args, **kw):
+                self.extra = kw.pop('extra', None)
+                Model.__init__(self, *args, **kw)
+
+        self.assertEqual( 'x', InitModel(id=1, extra='x').extra )
+
+        created = []
+        with signals.creation.connected_to(lambda sender, instance: created.append(instance)):
+            m = CompactModel(id=1)
+
+        self.assertEqual( [m], created )
+        self.assertFalse( m.frozen )
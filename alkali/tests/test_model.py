@@ -5,12 +5,13 @@ from zope.interface.verify import verifyObject, verifyClass
 from alkali.model import Model
 from alkali import fields
 from alkali import tznow
-from . import EmptyModel, MyModel, MyMulti
+from . import EmptyModel, MyModel, MyMulti, CompactModel
 
 class TestModel( unittest.TestCase ):
 
     def tearDown(self):
         MyModel.objects.clear()
+        CompactModel.objects.clear()
 
     def test_1(self):
         "verify class/instance implementation"
@@ -225,3 +226,83 @@ class TestModel( unittest.TestCase ):
     def test_doesnotexist(self):
         self.assertEqual( MyModel.ObjectDoesNotExist, MyMulti.ObjectDoesNotExist )
         self.assertNotEqual( MyModel.DoesNotExist, MyMulti.DoesNotExist )
+
+    def test_compact(self):
+        "Meta.compact models keep their fields in slots"
+        import copy
+        import tempfile
+        from alkali.storage import JSONStorage
+
+        self.assertTrue( CompactModel.Meta.compact )
+        self.assertFalse( MyModel.Meta.compact )
+        self.assertEqual( ('id', 'name', 'score', 'foreign', '_dirty', '_frozen', '_memo_pk'), CompactModel.__slots__ )
+        self.assertIsInstance( CompactModel.name, fields.StringField )
+
+        f = MyModel(int_type=1).save()
+        m = CompactModel(id='1', name='foo', foreign=f)
+        self.assertFalse( hasattr(m, '__dict__') )
+        self.assertEqual( 1, m.id )
+        self.assertEqual( 1, m.pk )
+        self.assertEqual( f, m.foreign )
+        self.assertEqual( 1, m.foreign__field.raw(m) )
+        self.assertFalse( m.dirty )
+
+        m.score = '3'
+        self.assertEqual( 3, m.score )
+        self.assertTrue( m.dirty )
+
+        with self.assertRaises( AttributeError ):
+            m.foo = 'bar'
+
+        m.save()
+        self.assertFalse( CompactModel.objects._instances[1].frozen )
+        self.assertTrue( CompactModel.objects.frozen()[0].frozen )
+
+        c = CompactModel.objects.get(1)
+        self.assertFalse( c.frozen )
+        self.assertEqual( ('foo', 3), (c.name, c.score) )
+        c.name = 'bar'
+        self.assertEqual( 'foo', copy.copy(CompactModel.objects._instances[1]).name )
+
+        c.save()
+        CompactModel(id=2, name='baz', score=1, foreign=f).save()
+        self.assertEqual( [2], [e.pk for e in CompactModel.objects.filter(score__lt=3)] )
+        self.assertEqual( ['bar', 'baz'], CompactModel.objects.values_list('name', flat=True) )
+
+        tfile = tempfile.NamedTemporaryFile()
+        storage = JSONStorage(tfile.name)
+        CompactModel.objects.store(storage, force=True)
+        CompactModel.objects.load(storage)
+        self.assertEqual( 2, len(CompactModel.objects) )
+        self.assertEqual( 'baz', CompactModel.objects.get(score=1).name )
+
+    def test_compact_pickle(self):
+        "Meta.compact models pickle and deepcopy, copies are writable"
+        import copy
+        import pickle
+
+        f = MyModel(int_type=1).save()
+        CompactModel(id=1, name='foo', score=3, foreign=f).save()
+
+        for model in [CompactModel, MyModel]:
+            view = model.objects.frozen()[0]
+            self.assertTrue( view.frozen )
+
+            for c in [pickle.loads(pickle.dumps(view)), copy.deepcopy(view)]:
+                self.assertIsNot( view, c )
+                self.assertFalse( c.frozen )
+                self.assertEqual( view.pk, c.pk )
+                self.assertFalse( c.dirty )
+
+        m = CompactModel.objects.get(1)
+        m.score = 4
+
+        for c in [pickle.loads(pickle.dumps(m)), copy.deepcopy(m)]:
+            self.assertEqual( ('foo', 4, f), (c.name, c.score, c.foreign) )
+            self.assertTrue( c.dirty )
+            c.name = 'bar'
+            self.assertEqual( 'foo', m.name )
+
+        # unset slots stay unset
+        m = CompactModel.__new__(CompactModel)
+        self.assertFalse( hasattr(copy.deepcopy(m), '_dirty') )
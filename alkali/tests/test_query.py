@@ -1,14 +1,16 @@
 import unittest
+import json
 
 from alkali.query import Query
 from alkali import tznow, fromts
 
-from . import MyModel, MyMulti
+from . import MyModel, MyMulti, CompactModel
 
 class TestQuery( unittest.TestCase ):
 
     def tearDown(self):
         MyModel.objects.clear()
+        CompactModel.objects.clear()
 
     def test_1(self):
         "verify class/instance implementation"
@@ -41,6 +43,42 @@ class TestQuery( unittest.TestCase ):
         self.assertEqual( 0, q.count )
         self.assertEqual( 1, len(man) )
 
+    def test_5a(self):
+        "make sure an unevaluated query is a snapshot of the manager"
+        man = MyModel.objects
+        MyModel(int_type=1, str_type='string').save()
+
+        q1 = Query(man)
+        q2 = Query(man).filter(str_type='string')
+
+        m = MyModel(int_type=2, str_type='string').save()
+        man.delete( MyModel(int_type=1) )
+
+        self.assertEqual( [1], [e.int_type for e in q1] )
+        self.assertEqual( [1], [e.int_type for e in q2] )
+        self.assertEqual( [2], [e.int_type for e in Query(man)] )
+
+    def test_5b(self):
+        "make sure queries are lazy"
+        for i in range(3):
+            MyModel(int_type=i, str_type='string').save()
+
+        man = MyModel.objects
+        instances = man._instances
+
+        q = man.filter(int_type__gt=0).filter(str_type='string').order_by('-int_type')
+        self.assertIsNone( q._pks )
+        self.assertEqual( 2, len(q._filters) )
+
+        self.assertEqual( 2, q.count )
+        self.assertEqual( [2, 1], q._pks )
+        self.assertEqual( [], q._filters )
+
+        # no outstanding queries, manager doesn't copy its instances
+        del q
+        MyModel(int_type=4).save()
+        self.assertTrue( instances is man._instances )
+
     def test_6(self):
         "make sure query length changes as we filter"
         for i in range(3):
@@ -82,6 +120,7 @@ class TestQuery( unittest.TestCase ):
         self.assertEqual( man._instances[1].pk, q[0].pk )
         self.assertNotEqual( id(man._instances[1]), id(q[0]) )
         self.assertNotEqual( id(man._instances[1]), id(list(q)[0]) )
+        self.assertNotEqual( id(man._instances[1]), id(q[:1][0]) )
 
     def test_15(self):
         "make sure query objects are not 'updated' when manager objects changes"
@@ -234,6 +273,76 @@ class TestQuery( unittest.TestCase ):
 
         self.assertEqual( instances, list(MyModel.objects.all().order_by('pk')) )
 
+    def test_35a(self):
+        "test order_by multiple fields, first field is the primary sort"
+        now = tznow()
+        for i, s in enumerate(['b', 'a', 'b', 'a']):
+            MyModel(int_type=i, str_type=s, dt_type=now).save()
+
+        q = MyModel.objects.order_by('str_type', 'int_type')
+        self.assertEqual( [1, 3, 0, 2], [e.pk for e in q] )
+
+        q = MyModel.objects.order_by('str_type', '-int_type')
+        self.assertEqual( [3, 1, 2, 0], [e.pk for e in q] )
+
+        q = MyModel.objects.order_by('-str_type', 'int_type')
+        self.assertEqual( [0, 2, 1, 3], [e.pk for e in q] )
+
+        q = MyModel.objects.order_by('-str_type', '-int_type')
+        self.assertEqual( [2, 0, 3, 1], [e.pk for e in q] )
+
+        # stable, ties keep pk order
+        q = MyModel.objects.order_by('-dt_type', 'str_type')
+        self.assertEqual( [1, 3, 0, 2], [e.pk for e in q] )
+
+        self.assertEqual( [3, 2, 1, 0], [e.pk for e in MyModel.objects.order_by('-pk')] )
+
+    def test_35b(self):
+        "test order_by with several runs of directions, slots and properties"
+        m = MyModel(int_type=1).save()
+        for i in range(12):
+            CompactModel(id=i, name='ab'[i % 2], score=i % 3, foreign=m).save()
+
+        expected = sorted(range(12), key=lambda i: (i % 2, -(i % 3), -i))
+
+        q = CompactModel.objects.order_by('name', '-score', '-pk')
+        self.assertEqual( expected, [e.id for e in q] )
+
+        q = CompactModel.objects.order_by('name', '-score', '-pk')
+        self.assertEqual( expected[:2], [e.id for e in q[:2]] )
+
+        q = CompactModel.objects.order_by('-score', '-name')
+        self.assertEqual( [5, 11, 2, 8, 1, 7, 4, 10], [e.id for e in q[:8]] )
+
+        q = CompactModel.objects.order_by('-score', '-name')
+        self.assertEqual( [5, 11], [e.id for e in q[:2]] )
+
+    def test_36(self):
+        "test reverse"
+        for i in [2, 0, 1]:
+            MyModel(int_type=i, str_type='string %d' % (i % 2)).save()
+
+        self.assertEqual( [2, 1, 0], [e.pk for e in MyModel.objects.all().reverse()] )
+        self.assertEqual( [0, 1, 2], [e.pk for e in MyModel.objects.reverse().reverse()] )
+
+        q = MyModel.objects.order_by('str_type').reverse()
+        self.assertEqual( [1, 2, 0], [e.pk for e in q] )
+
+        q = MyModel.objects.filter(int_type__gt=0).reverse()
+        self.assertEqual( [2, 1], [e.pk for e in q] )
+
+    def test_37(self):
+        "compound primary keys are in tuple order"
+        MyMulti.objects.clear()
+
+        for pk1, pk2 in [(2, 1), (1, 2), (1, 1)]:
+            MyMulti(pk1=pk1, pk2=pk2).save()
+
+        self.assertEqual( [(1, 1), (1, 2), (2, 1)], [e.pk for e in MyMulti.objects.all()] )
+        self.assertEqual( [(1, 2), (2, 1)], [e.pk for e in MyMulti.objects.filter(pk__gt=(1, 1))] )
+
+        MyMulti.objects.clear()
+
     def test_40(self):
         "test limit, equivalent to slicing"
 
@@ -260,6 +369,31 @@ class TestQuery( unittest.TestCase ):
         self.assertEqual( instances[:2], MyModel.objects.all().limit(2) )
         self.assertEqual( instances[-2:], MyModel.objects.all().limit(-2) )
 
+    def test_41(self):
+        "test top-k ordering with limit, first and slicing"
+        for i in range(40):
+            MyModel(int_type=i, str_type='%02d' % (i % 7)).save()
+
+        expected = [e.pk for e in MyModel.objects.order_by('-str_type', 'int_type')]
+
+        q = MyModel.objects.order_by('-str_type', 'int_type')
+        self.assertEqual( expected[:3], [e.pk for e in q.limit(3)] )
+        self.assertEqual( 1, len(q._orderings) ) # still pending
+        self.assertEqual( expected[:5], [e.pk for e in q[:5]] )
+        self.assertEqual( expected[2:4], [e.pk for e in q[2:4]] )
+        self.assertEqual( expected[4], q[4].pk )
+        self.assertEqual( expected, [e.pk for e in q] )
+
+        q = MyModel.objects.filter(int_type__gt=10).order_by('-int_type')
+        self.assertEqual( 39, q.first().pk )
+        self.assertEqual( [39, 38], [e.pk for e in q.limit(2)] )
+
+        q = MyModel.objects.order_by('-pk')
+        self.assertEqual( [39, 38], [e.pk for e in q[:2]] )
+
+        q = MyModel.objects.order_by('-int_type').order_by('str_type')
+        self.assertEqual( [35, 28], [e.pk for e in q[:2]] )
+
     def test_values(self):
         """
         test .values(), return dict instead of objects
@@ -439,3 +573,177 @@ class TestQuery( unittest.TestCase ):
 
         g2 = groups['string 2'].all().order_by('int_type').values_list('int_type', flat=True)
         self.assertEqual(set(expected['string 2']), set(g2))
+
+    def test_groupby_2(self):
+        "group_by only groups the current query, keeping its order"
+        for i in range(6):
+            MyModel(int_type=i, str_type='string %d' % (i % 2)).save()
+
+        groups = MyModel.objects.filter(int_type__gt=1).order_by('-int_type').group_by('str_type')
+
+        self.assertEqual( [5, 3], [e.pk for e in groups['string 1']] )
+        self.assertEqual( [4, 2], [e.pk for e in groups['string 0']] )
+
+        # groups are queries too
+        self.assertEqual( [4], [e.pk for e in groups['string 0'].filter(int_type__gt=2)] )
+        self.assertEqual( 2, groups['string 1'].count )
+
+    def test_values_annotate(self):
+        "values().annotate() groups and aggregates in one pass"
+        from alkali.query import Sum, Count, Max, Min, ValuesQuery
+
+        for i in range(6):
+            MyModel(int_type=i, str_type='string %d' % (i % 2)).save()
+
+        v = MyModel.objects.filter(int_type__gt=0).values('str_type')
+        self.assertTrue( isinstance(v, ValuesQuery) )
+        self.assertEqual( 5, len(v) )
+        self.assertEqual( {'str_type': 'string 1'}, v[0] )
+
+        results = v.annotate(total=Sum('int_type'), n=Count('int_type'), hi=Max('int_type'), lo=Min('int_type'))
+        self.assertEqual( [
+            {'str_type': 'string 1', 'total': 9, 'n': 3, 'hi': 5, 'lo': 1},
+            {'str_type': 'string 0', 'total': 6, 'n': 2, 'hi': 4, 'lo': 2},
+            ], results )
+
+        results = MyModel.objects.values('str_type', 'dt_type').annotate(n=Count('int_type'))
+        self.assertEqual( ['str_type', 'dt_type', 'n'], list(results[0].keys()) )
+        self.assertEqual( [3, 3], [r['n'] for r in results] )
+
+        with self.assertRaises( AssertionError ):
+            MyModel.objects.values('str_type').annotate(n=1)
+
+        # a list, built when values() is called
+        v = MyModel.objects.values('int_type', 'str_type')
+        self.assertIsInstance( v, list )
+        self.assertEqual( json.dumps([{'int_type': 0}]), json.dumps(MyModel.objects.filter(pk=0).values('int_type')) )
+        self.assertEqual( 7, len(v + [{}]) )
+        self.assertFalse( v == 3 )
+
+        groups = MyModel.objects.values('str_type')
+        MyModel.objects.delete( MyModel.objects.get(0) )
+        m = MyModel.objects.get(1)
+        m.str_type = 'changed'
+        m.save()
+
+        self.assertEqual( list(range(6)), [r['int_type'] for r in v] )
+        self.assertEqual( 'string 1', v[1]['str_type'] )
+
+        results = groups.annotate(n=Count('int_type'))
+        self.assertEqual( [('string 0', 3), ('string 1', 3)], [(r['str_type'], r['n']) for r in results] )
+
+    def test_agg_call(self):
+        "an Aggregate that only implements __call__"
+        from alkali.query import Aggregate, Sum
+
+        class Median(Aggregate):
+            def __call__(self, query):
+                values = sorted( query.values_list(self.field, flat=True) )
+                return values[len(values) // 2]
+
+        for i in range(3):
+            MyModel(int_type=i, str_type='s').save()
+
+        self.assertEqual( {'int_type__median': 1}, MyModel.objects.aggregate(Median('int_type')) )
+        self.assertEqual( {'int_type__median': 1, 'total': 3},
+                MyModel.objects.aggregate(Median('int_type'), total=Sum('int_type')) )
+        self.assertEqual( {'m': 2}, MyModel.objects.filter(int_type__gt=0).aggregate(m=Median('int_type')) )
+
+        with self.assertRaises( AssertionError ):
+            MyModel.objects.values('str_type').annotate(m=Median('int_type'))
+
+        # overriding __call__ of an aggregate that has step()
+        class SumPlusOne(Sum):
+            def __call__(self, query):
+                return sum( query.values_list(self.field, flat=True) ) + 1
+
+        self.assertEqual( {'s': 4, 'total': 3},
+                MyModel.objects.aggregate(s=SumPlusOne('int_type'), total=Sum('int_type')) )
+
+        # the base class has neither
+        with self.assertRaises( NotImplementedError ):
+            Aggregate('int_type')(MyModel.objects.all())
+
+    def test_agg_2(self):
+        "aggregates share a single pass, new aggregates"
+        from alkali.query import Sum, Count, Max, Min, Avg, Variance, StdDev, CountDistinct
+
+        for i, v in enumerate([2, 4, 4, 4, 5, 5, 7, 9]):
+            MyModel(int_type=v * 10 + i, str_type='s%d' % v).save()
+
+        q = MyModel.objects.all()
+        d = q.aggregate(Count('int_type'), CountDistinct('str_type'), Min('int_type'), Max('int_type'))
+        self.assertDictEqual( {'int_type__count': 8, 'str_type__countdistinct': 5,
+            'int_type__min': 20, 'int_type__max': 97}, d )
+
+        d = q.aggregate(avg=Avg('int_type'), total=Sum('int_type'))
+        self.assertEqual( 428, d['total'] )
+        self.assertAlmostEqual( 428 / 8, Avg('int_type')(q) )
+
+        # population and sample variance of 2 4 4 4 5 5 7 9
+        vals = [int(s[1:]) for s in q.values_list('str_type', flat=True)]
+        self.assertEqual( [2, 4, 4, 4, 5, 5, 7, 9], vals )
+
+        MyMulti.objects.clear()
+        for i, v in enumerate(vals):
+            MyMulti(pk1=i, pk2=v).save()
+
+        q = MyMulti.objects.all()
+        self.assertAlmostEqual( 4.0, Variance('pk2')(q) )
+        self.assertAlmostEqual( 2.0, StdDev('pk2')(q) )
+        self.assertAlmostEqual( 32 / 7, Variance('pk2', sample=True)(q) )
+
+        # empty queries
+        q = MyModel.objects.filter(int_type__gt=1000)
+        d = q.aggregate(Sum('int_type'), Avg('int_type'), StdDev('int_type'), CountDistinct('int_type'))
+        self.assertDictEqual( {'int_type__sum': 0, 'int_type__avg': None,
+            'int_type__stddev': None, 'int_type__countdistinct': 0}, d )
+
+        # like max() and min() of an empty list
+        with self.assertRaises( ValueError ):
+            q.aggregate(Max('int_type'))
+
+        with self.assertRaises( ValueError ):
+            Min('int_type')(q)
+
+        with self.assertRaises( AssertionError ):
+            q.aggregate(foo=1)
+
+    def test_read_only(self):
+        "read-only queries return the stored instances, frozen"
+        import copy
+
+        for i in range(3):
+            MyModel(int_type=i, str_type='string').save()
+
+        q = MyModel.objects.frozen().filter(int_type__gt=0)
+        m = q[0]
+        self.assertIs( m, MyModel.objects._instances[1] )
+        self.assertTrue( m.frozen )
+        self.assertEqual( [1, 2], [e.pk for e in q] )
+        self.assertIs( MyModel.objects._instances[2], q.limit(-1)[0] )
+
+        with self.assertRaises( RuntimeError ):
+            m.str_type = 'foo'
+
+        with self.assertRaises( RuntimeError ):
+            m.foo = 'bar'
+
+        with self.assertRaises( RuntimeError ):
+            m.save()
+
+        # grouped queries stay read-only
+        groups = MyModel.objects.frozen().group_by('str_type')
+        self.assertIs( MyModel.objects._instances[0], groups['string'][0] )
+
+        # a copy is writable
+        m = copy.copy(m)
+        self.assertFalse( m.frozen )
+        m.str_type = 'foo'
+        m.save()
+        self.assertEqual( 'string', q[0].str_type ) # snapshot
+
+        # normal queries still copy
+        m = MyModel.objects.filter(int_type=1)[0]
+        self.assertFalse( m.frozen )
+        self.assertIsNot( m, MyModel.objects._instances[1] )
@@ -0,0 +1,264 @@
+import os
+import unittest
+import tempfile
+import pickle
+
+from alkali import Database, tznow
+from alkali.storage import Storage, JSONStorage, CSVStorage, JournaledStorage, MultiStorage
+from alkali.snapshot import Snapshot
+
+from . import EmptyModel, MyModel, MyMulti, MyDepModel, CompactModel, AutoModel1, AutoModel2
+
+
+class TestSnapshot( unittest.TestCase ):
+
+    def setUp(self):
+        self.tdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        MyModel.objects.clear()
+        MyMulti.objects.clear()
+        MyDepModel.objects.clear()
+        CompactModel.objects.clear()
+        AutoModel1.objects.clear()
+        AutoModel2.objects.clear()
+        self.tdir.cleanup()
+
+    def filename(self, name):
+        return os.path.join(self.tdir.name, name)
+
+    def test_restore(self):
+        "_raw_row and _restore round trip the field values"
+        now = tznow()
+
+        m = MyModel(int_type=1, str_type='a', dt_type=now)
+        self.assertEqual( (1, 'a', now), MyModel._raw_row(m) )
+
+        r = MyModel._restore( MyModel._raw_row(m) )
+        self.assertEqual( m.dict, r.dict )
+        self.assertEqual( 1, r.__dict__['_memo_pk'] )
+        self.assertFalse( r._dirty )
+
+        m = MyMulti(pk1=1, pk2=2, other='x')
+        r = MyMulti._restore( MyMulti._raw_row(m) )
+        self.assertEqual( (1, 2), r.__dict__['_memo_pk'] )
+        self.assertEqual( m.dict, r.dict )
+
+        m = MyModel(int_type=2)
+        m.save()
+        c = CompactModel(id=3, name='b', score=4, foreign=m)
+        r = CompactModel._restore( CompactModel._raw_row(c) )
+        self.assertEqual( (3, 'b', 4, 2), CompactModel._raw_row(r) )
+        self.assertEqual( 3, r.pk )
+        self.assertEqual( m, r.foreign )
+
+        self.assertEqual( (), EmptyModel._raw_row(EmptyModel()) )
+        self.assertIsInstance( EmptyModel._restore(()), EmptyModel )
+
+    def test_load(self):
+        "load from the snapshot while the file is unchanged"
+        storage = JSONStorage( self.filename('MyModel.json') )
+        snapname = self.filename('MyModel.json.MyModel.snap')
+
+        now = tznow()
+        for i in range(5):
+            MyModel(int_type=i, str_type=str(i), dt_type=now).save()
+
+        expected = [e.dict for e in MyModel.objects.all()]
+        MyModel.objects.store(storage)
+
+        MyModel.objects.load(storage)
+        self.assertFalse( os.path.exists(snapname) )
+
+        MyModel.objects.load(storage, snapshot=True)
+        self.assertTrue( os.path.exists(snapname) )
+        self.assertEqual( expected, [e.dict for e in MyModel.objects.all()] )
+
+        def read(model_class):
+            raise AssertionError("storage was read")
+
+        storage.read = read
+
+        for trusted in (False, True):
+            MyModel.objects.load(storage, trusted=trusted, snapshot=True)
+            self.assertEqual( expected, [e.dict for e in MyModel.objects.all()] )
+            self.assertFalse( MyModel.objects.dirty )
+
+        # changing the file makes the snapshot out of date
+        del storage.read
+        m = MyModel.objects.get(1)
+        m.str_type = 'changed'
+        m.save()
+        MyModel.objects.store(storage)
+
+        MyModel.objects.load(storage, snapshot=True)
+        self.assertEqual( 'changed', MyModel.objects.get(1).str_type )
+
+        storage.read = read
+        MyModel.objects.load(storage, snapshot=True)
+        self.assertEqual( 'changed', MyModel.objects.get(1).str_type )
+
+    def test_key(self):
+        "the snapshot is keyed by the file and the model's fields"
+        storage = CSVStorage( self.filename('MyModel.csv') )
+        MyModel(int_type=1, str_type='a').save()
+        MyModel.objects.store(storage)
+
+        snap = Snapshot(storage, MyModel)
+        self.assertTrue( snap )
+        self.assertIsNone( snap.read() )
+
+        snap.write( MyModel.objects.instances )
+        self.assertEqual( [(1, 'a', None)], snap.read() )
+
+        size, mtime, digest = snap.key[0]
+        self.assertEqual( os.path.getsize(storage.filename), size )
+
+        # same size, different contents
+        with open(storage.filename, 'r+') as f:
+            data = f.read()
+            f.seek(0)
+            f.write( data.replace(',a,', ',b,') )
+
+        self.assertNotEqual( snap.key, Snapshot(storage, MyModel).key )
+        self.assertIsNone( Snapshot(storage, MyModel).read() )
+
+        snap = Snapshot(storage, MyModel)
+        header = snap.header
+        self.assertEqual( ('int_type', 'IntField'), header[2][0] )
+
+        # storages that can't be fingerprinted don't get a snapshot
+        self.assertFalse( Snapshot(Storage(), MyModel) )
+        self.assertIsNone( Snapshot(Storage(), MyModel).read() )
+        Snapshot(Storage(), MyModel).write([])
+
+    def test_corrupt(self):
+        "a bad snapshot is ignored and replaced"
+        storage = JSONStorage( self.filename('MyModel.json') )
+        snapname = self.filename('MyModel.json.MyModel.snap')
+
+        MyModel(int_type=1, str_type='a').save()
+        MyModel.objects.store(storage)
+
+        with open(snapname, 'wb') as f:
+            pickle.dump(Snapshot(storage, MyModel).header, f)
+            f.write(b'garbage')
+
+        with self.assertLogs('alkali.snapshot', 'WARNING'):
+            MyModel.objects.load(storage, snapshot=True)
+
+        self.assertEqual( 'a', MyModel.objects.get(1).str_type )
+        self.assertEqual( [(1, 'a', None)], Snapshot(storage, MyModel).read() )
+
+        # a failed write is only logged
+        snap = Snapshot(storage, MyModel)
+        snap.filename = self.filename('missing/MyModel.snap')
+
+        with self.assertLogs('alkali.snapshot', 'WARNING'):
+            snap.write( MyModel.objects.instances )
+
+    def test_journal(self):
+        "the log is part of a JournaledStorage fingerprint"
+        storage = JournaledStorage( self.filename('MyModel.jsonl') )
+
+        MyModel(int_type=1, str_type='a').save()
+        MyModel.objects.store(storage)
+
+        MyModel.objects.load(storage, snapshot=True)
+        key = Snapshot(storage, MyModel).key
+        self.assertEqual( 2, len(key) )
+
+        m = MyModel.objects.get(1)
+        m.str_type = 'b'
+        m.save()
+        MyModel.objects.store(storage)
+        self.assertNotEqual( key, Snapshot(storage, MyModel).key )
+
+        MyModel.objects.load(storage, snapshot=True)
+        self.assertEqual( 'b', MyModel.objects.get(1).str_type )
+
+        MyModel.objects.load(storage, snapshot=True)
+        self.assertEqual( 'b', MyModel.objects.get(1).str_type )
+        storage.unlock()
+
+    def test_journal_delta(self):
+        "a JournaledStorage restored from a snapshot still stores deltas"
+        filename = self.filename('MyModel.jsonl')
+        storage = JournaledStorage( filename )
+
+        for i in range(3):
+            MyModel(int_type=i, str_type='a').save()
+
+        MyModel.objects.store(storage)
+        MyModel.objects.load(storage, snapshot=True) # writes the snapshot
+        storage.filename = None
+
+        # a warm start never reads the storage
+        storage = JournaledStorage( filename )
+        storage.read = None
+        MyModel.objects.load(storage, snapshot=True)
+        del storage.read
+
+        with open(filename) as f:
+            before = f.read()
+
+        m = MyModel.objects.get(1)
+        m.str_type = 'b'
+        m.save()
+        MyModel.objects.store(storage)
+
+        with open(filename) as f:
+            self.assertEqual( before, f.read() )
+
+        self.assertEqual( 1, len(open(storage.logname).readlines()) )
+        storage.filename = None
+
+        MyModel.objects.load( JournaledStorage(filename) )
+        self.assertEqual( ['a', 'b', 'a'], [e.str_type for e in MyModel.objects.all()] )
+
+    def test_database(self):
+        "Database.load(snapshot=True), foreign keys are still validated"
+        db = Database( models=[MyModel, MyDepModel], root_dir=self.tdir.name, workers=1 )
+
+        m = MyModel(int_type=1, str_type='a')
+        m.save()
+        MyDepModel(pk1=1, foreign=m).save()
+
+        m2 = MyModel(int_type=2)
+        m2.save()
+        MyDepModel(pk1=2, foreign=m2).save()
+
+        # MyDepModel 2 loses its foreign instance
+        db.store()
+        db.get_storage(MyModel).write(MyModel, [m])
+
+        db.load(snapshot=True)
+        self.assertEqual( [1], [e.pk for e in MyDepModel.objects.all()] )
+        self.assertFalse( os.path.exists(self.filename('MyDepModel.json.MyDepModel.snap')) )
+        self.assertTrue( os.path.exists(self.filename('MyModel.json.MyModel.snap')) )
+
+        db.store()
+        db.load(snapshot=True)
+        self.assertTrue( os.path.exists(self.filename('MyDepModel.json.MyDepModel.snap')) )
+
+        db.load(snapshot=True)
+        self.assertEqual( m, MyDepModel.objects.get(1).foreign )
+
+    def test_multi(self):
+        "each model of a MultiStorage gets its own snapshot"
+        storage = MultiStorage([AutoModel1, AutoModel2], self.filename('multi.json'))
+
+        AutoModel1(f1='one').save()
+        AutoModel2(f1='two').save()
+        AutoModel1.objects.store(storage)
+        AutoModel2.objects.store(storage)
+
+        for model in (AutoModel1, AutoModel2):
+            model.objects.load(storage, snapshot=True)
+
+        for model in (AutoModel1, AutoModel2):
+            self.assertTrue( os.path.exists(self.filename('multi.json.{}.snap'.format(model.__name__))) )
+            model.objects.load(storage, snapshot=True)
+
+        self.assertEqual( ['one'], [e.f1 for e in AutoModel1.objects.all()] )
+        self.assertEqual( ['two'], [e.f1 for e in AutoModel2.objects.all()] )
@@ -1,14 +1,36 @@
 import os
+import copy
 import unittest
 import tempfile
 import csv
 import json
+import mock
 
 from alkali import Model, fields
 from alkali.storage import FileStorage, JSONStorage, CSVStorage, MultiStorage
-from alkali.storage import FileAlreadyLocked, Storage
+from alkali.storage import FileAlreadyLocked, Storage, JSONLinesStorage, JournaledStorage
+from alkali.storage import SQLiteStorage
 from alkali import tznow
-from . import MyModel, MyDepModel, AutoModel1, AutoModel2
+from . import MyModel, MyDepModel, AutoModel1, AutoModel2, CompactModel
+from . import MyMulti, IndexedModel, VectorModel
+
+
+class ScaledCSVStorage(CSVStorage):
+    """
+    a subclass with its own compile(), it has to be importable for split()
+    """
+    scale = 10
+
+    def compile(self, model_class, header):
+        convert = super().compile(model_class, header)
+        scale = self.scale
+
+        def scaled(row):
+            record = convert(row)
+            record['count'] *= scale
+            return record
+
+        return scaled
 
 
 class TestStorage( unittest.TestCase ):
@@ -16,6 +38,10 @@ class TestStorage( unittest.TestCase ):
     def tearDown(self):
         MyModel.objects.clear()
         MyDepModel.objects.clear()
+        CompactModel.objects.clear()
+        MyMulti.objects.clear()
+        IndexedModel.objects.clear()
+        VectorModel.objects.clear()
         AutoModel1.objects.clear()
         AutoModel2.objects.clear()
 
@@ -90,6 +116,371 @@ class TestStorage( unittest.TestCase ):
         loaded = [e for e in storage.read(MyModel)]
         self.assertEqual( 0, len(loaded) )
 
+    def test_3c(self):
+        "json is read in blocks"
+        entries = [{'int_type': i, 'str_type': "s, ]" * i, 'dt_type': None} for i in range(20)]
+        entries += [12345, [], {}]
+
+        for text in [json.dumps(entries), json.dumps(entries, indent='  '), ' [ ] ', '\n']:
+            for size in [1, 3, 64, 10000]:
+                tfile = tempfile.NamedTemporaryFile(mode='w+')
+                tfile.write(text)
+                tfile.flush()
+
+                storage = JSONStorage( tfile.name )
+                storage.block_size = size
+
+                loaded = [e for e in storage.read(MyModel)]
+                self.assertEqual( json.loads(text) if text.strip() else [], loaded )
+
+    def test_3d(self):
+        "invalid json arrays raise"
+        for text in ['{}', '[1,]', '[1 2]', '[{"a": 1}', '[1, ', '[1]]', '[1] garbage', '[] 1', '[1.x]']:
+            tfile = tempfile.NamedTemporaryFile(mode='w+')
+            tfile.write(text)
+            tfile.flush()
+
+            storage = JSONStorage( tfile.name )
+
+            for size in [2, 3, 4096]:
+                storage.block_size = size
+
+                with self.assertRaises( ValueError ):
+                    [e for e in storage.read(MyModel)]
+
+        # numbers cut at a block boundary after '.', 'e', a sign or a digit
+        text = '[1.5, -2.25e3 ,1e-2,12345, 0.5E+1, -7]  \n'
+        tfile = tempfile.NamedTemporaryFile(mode='w+')
+        tfile.write(text)
+        tfile.flush()
+
+        storage = JSONStorage( tfile.name )
+
+        for size in range(1, len(text) + 1):
+            storage.block_size = size
+            self.assertEqual( json.loads(text), [e for e in storage.read(MyModel)] )
+
+    def test_jsonl(self):
+        "test JSONLinesStorage"
+        tfile = tempfile.NamedTemporaryFile()
+        storage = JSONLinesStorage( tfile.name )
+        storage.batch_size = 2
+
+        self.assertEqual( 'jsonl', storage.extension )
+        self.assertFalse( storage.write(MyModel, None) )
+        self.assertEqual( [], [e for e in storage.read(MyModel)] )
+
+        now = tznow()
+        entries = [MyModel(int_type=i, str_type="s\n%d" % i, dt_type=now) for i in range(5)]
+
+        self.assertTrue( storage.write(MyModel, entries) )
+
+        with open(tfile.name) as f:
+            lines = f.read().split('\n')
+
+        self.assertEqual( 6, len(lines) ) # trailing newline
+        self.assertEqual( entries[0].dict, json.loads(lines[0]) )
+
+        loaded = [e for e in storage.read(MyModel)]
+        self.assertEqual( [e.dict for e in entries], loaded )
+
+        # file shrinks
+        self.assertTrue( storage.write(MyModel, entries[:1]) )
+        self.assertEqual( 1, len([e for e in storage.read(MyModel)]) )
+
+        self.assertTrue( storage.append(MyModel, entries[1:3]) )
+        self.assertEqual( [e.dict for e in entries[:3]], [e for e in storage.read(MyModel)] )
+
+        # unterminated last line
+        with open(tfile.name, 'a') as f:
+            f.write('{"int_type": 9}')
+
+        storage.append(MyModel, entries[3:4])
+        self.assertEqual( [0, 1, 2, 9, 3], [e['int_type'] for e in storage.read(MyModel)] )
+
+        MyModel.objects.load(storage)
+        self.assertEqual( 5, len(MyModel.objects) )
+
+        with open(tfile.name, 'a') as f:
+            f.write('\n\n{bad\n')
+
+        with self.assertRaises( ValueError ):
+            [e for e in storage.read(MyModel)]
+
+    def test_journal(self):
+        "test JournaledStorage"
+        tdir = tempfile.TemporaryDirectory()
+        filename = os.path.join(tdir.name, 'MyModel.jsonl')
+
+        storage = JournaledStorage( filename )
+        self.assertEqual( filename + '.log', storage.logname )
+        self.assertFalse( storage.write(MyModel, None) )
+        self.assertFalse( storage.write_delta(MyModel, [], []) ) # not read yet
+
+        storage.compact(MyModel) # nothing to compact
+        self.assertEqual( 0, os.path.getsize(filename) )
+
+        for i in range(5):
+            MyModel(int_type=i, str_type="s%d" % i).save()
+
+        # first write is a snapshot
+        MyModel.objects.store(storage)
+        self.assertEqual( 5, len(open(filename).readlines()) )
+        self.assertEqual( 0, os.path.getsize(storage.logname) )
+
+        # then only the changes are logged
+        m = copy.copy( MyModel.objects.get(1) )
+        m.str_type = "changed"
+        m.save()
+        MyModel.objects.delete( MyModel.objects.get(2) )
+        MyModel(int_type=9).save()
+
+        MyModel.objects.store(storage)
+        self.assertEqual( 5, len(open(filename).readlines()) )
+        self.assertEqual( 3, len(open(storage.logname).readlines()) )
+
+        expected = [(0, "s0"), (1, "changed"), (3, "s3"), (4, "s4"), (9, None)]
+
+        # the log is merged into the snapshot
+        storage.compact(MyModel)
+        self.assertEqual( 0, os.path.getsize(storage.logname) )
+        self.assertEqual( expected, [(e['int_type'], e['str_type']) for e in storage.read(MyModel)] )
+
+        MyModel.objects.delete( MyModel.objects.get(0) )
+        MyModel.objects.store(storage)
+        self.assertEqual( 1, len(open(storage.logname).readlines()) )
+
+        # a forced store is a new snapshot
+        MyModel(int_type=0, str_type="s0").save()
+        MyModel.objects.store(storage, force=True)
+        self.assertEqual( 5, len(open(filename).readlines()) )
+        self.assertEqual( 0, os.path.getsize(storage.logname) )
+
+        MyModel.objects.get(4).save() # unchanged, logged anyway
+        MyModel.objects.store(storage)
+        self.assertEqual( 1, len(open(storage.logname).readlines()) )
+
+        storage.filename = None
+        self.assertIsNone( storage.logname )
+        storage = JournaledStorage( filename )
+
+        with self.assertRaises( FileAlreadyLocked ):
+            JournaledStorage( filename )
+
+        MyModel.objects.load(storage)
+        self.assertEqual( expected, [(e.int_type, e.str_type) for e in MyModel.objects.all()] )
+
+        # a partly written last entry is dropped
+        with open(storage.logname, 'a') as f:
+            f.write('["put",{"int_type":')
+
+        MyModel.objects.load(storage)
+        self.assertEqual( expected, [(e.int_type, e.str_type) for e in MyModel.objects.all()] )
+        self.assertEqual( 1, len(open(storage.logname).readlines()) )
+
+        # the log is compacted once it's too big
+        storage.compact_size = 200
+        MyModel(int_type=10, str_type="x" * 200).save()
+        MyModel.objects.store(storage)
+
+        self.assertEqual( 0, os.path.getsize(storage.logname) )
+        self.assertEqual( 6, len(open(filename).readlines()) )
+
+        storage.filename = None
+        MyModel.objects.load( JournaledStorage(filename) )
+        self.assertEqual( 6, len(MyModel.objects) )
+
+    def test_journal_compact(self):
+        "compact replaces the snapshot only once it's written, append logs"
+        tdir = tempfile.TemporaryDirectory()
+        filename = os.path.join(tdir.name, 'MyModel.jsonl')
+        storage = JournaledStorage( filename )
+
+        for i in range(3):
+            MyModel(int_type=i, str_type="s%d" % i).save()
+
+        MyModel.objects.store(storage)
+        snapshot = open(filename).read()
+
+        # append goes to the log
+        self.assertFalse( storage.append(MyModel, None) )
+        self.assertTrue( storage.append(MyModel, [MyModel(int_type=5), MyModel(int_type=1, str_type="x")]) )
+        self.assertEqual( snapshot, open(filename).read() )
+        self.assertEqual( 2, len(open(storage.logname).readlines()) )
+
+        expected = [(0, "s0"), (1, "x"), (2, "s2"), (5, None)]
+        self.assertEqual( expected, [(e['int_type'], e['str_type']) for e in storage.read(MyModel)] )
+
+        # a failed compact leaves the snapshot and the log alone
+        merged = storage._merged
+
+        def broken(model_class):
+            yield next(merged(model_class))
+            raise IOError("disk full")
+
+        storage._merged = broken
+
+        with self.assertRaises( IOError ):
+            storage.compact(MyModel)
+
+        del storage._merged
+        self.assertEqual( snapshot, open(filename).read() )
+        self.assertEqual( 2, len(open(storage.logname).readlines()) )
+        self.assertFalse( os.path.exists(filename + '.tmp') )
+
+        storage.compact(MyModel)
+        self.assertFalse( os.path.exists(filename + '.tmp') )
+        self.assertEqual( 0, os.path.getsize(storage.logname) )
+        self.assertEqual( 4, len(open(filename).readlines()) )
+        self.assertEqual( filename, storage.filename )
+
+        # the new snapshot is ours
+        with self.assertRaises( FileAlreadyLocked ):
+            JournaledStorage( filename )
+
+        self.assertEqual( expected, [(e['int_type'], e['str_type']) for e in storage.read(MyModel)] )
+
+        storage.compact_size = 10
+        storage.append(MyModel, [MyModel(int_type=6)])
+        self.assertEqual( 0, os.path.getsize(storage.logname) )
+        self.assertEqual( 5, len(open(filename).readlines()) )
+
+    def test_journal_corrupt(self):
+        "a bad log entry that isn't the last one raises"
+        tdir = tempfile.TemporaryDirectory()
+        filename = os.path.join(tdir.name, 'MyModel.jsonl')
+
+        with open(filename + '.log', 'w') as f:
+            f.write('["put",{"int_type":1}]\n{bad\n["del",[1]]\n')
+
+        with self.assertRaises( ValueError ):
+            MyModel.objects.load( JournaledStorage(filename) )
+
+    def test_sqlite(self):
+        "test SQLiteStorage"
+        import sqlite3
+        import datetime as dt
+
+        tdir = tempfile.TemporaryDirectory()
+        filename = os.path.join(tdir.name, 'db.sqlite')
+        storage = SQLiteStorage( filename )
+
+        self.assertEqual( 'sqlite', storage.extension )
+        self.assertFalse( storage.write(MyModel, None) )
+        self.assertEqual( [], [e for e in storage.read(MyModel)] )
+
+        now = tznow()
+        for i in range(5):
+            VectorModel(id=i, count=i * 10, value=i / 2, flag=bool(i % 2),
+                    date=now + dt.timedelta(days=i)).save()
+        VectorModel(id=5).save()
+
+        expected = [e.dict for e in VectorModel.objects.all()]
+
+        VectorModel.objects.store(storage, force=True)
+        VectorModel.objects.load(storage)
+        self.assertEqual( expected, [e.dict for e in VectorModel.objects.all()] )
+        self.assertIs( True, VectorModel.objects.get(1).flag )
+
+        for i in range(3):
+            MyMulti(pk1=i, pk2=-i, other="o%d" % i).save()
+
+        MyMulti.objects.store(storage)
+        MyMulti.objects.load(storage)
+        self.assertEqual( [(0, 0), (1, -1), (2, -2)], MyMulti.objects.pks )
+
+        # indexed fields get an sql index
+        conn = sqlite3.connect(filename)
+        tables = {name for name, in conn.execute("SELECT name FROM sqlite_master")}
+        self.assertTrue( {'vectormodel', 'mymulti'} <= tables )
+
+        m = MyModel(int_type=1).save()
+        IndexedModel(id=1, status='a', score=1, foreign=m).save()
+        IndexedModel.objects.store(storage)
+
+        tables = {name for name, in conn.execute("SELECT name FROM sqlite_master")}
+        self.assertTrue( 'indexedmodel_status' in tables )
+
+        # new fields get a column
+        conn.execute('DROP TABLE "vectormodel"')
+        conn.execute('CREATE TABLE "vectormodel" ("id" INTEGER PRIMARY KEY, "count" INTEGER)')
+        conn.execute('INSERT INTO "vectormodel" VALUES (1, 2)')
+        conn.commit()
+
+        VectorModel.objects.load( SQLiteStorage(filename) )
+        self.assertEqual( 2, VectorModel.objects.get(1).count )
+        self.assertEqual( None, VectorModel.objects.get(1).date )
+
+    def test_sqlite_filter(self):
+        "SQLiteStorage pushes lookups down to sql"
+        import datetime as dt
+
+        tdir = tempfile.TemporaryDirectory()
+        storage = SQLiteStorage( os.path.join(tdir.name, 'db.sqlite') )
+
+        now = tznow()
+        for i in range(10):
+            VectorModel(id=i, count=i % 3, value=i / 2, date=now + dt.timedelta(days=i)).save()
+        VectorModel(id=10).save()
+
+        VectorModel.objects.store(storage, force=True)
+
+        def pks(**lookups):
+            VectorModel.objects.load( storage.filter(**lookups) )
+            return VectorModel.objects.pks
+
+        self.assertEqual( [1, 4, 7], pks(count=1) )
+        self.assertEqual( [1, 4, 7], pks(count__eq=1) )
+        self.assertEqual( [0, 1, 3, 4, 6, 7, 9, 10], pks(count__ne=2) )
+        self.assertEqual( [8, 9], pks(value__gt=3.5) )
+        self.assertEqual( [7, 8, 9], pks(value__ge=3.5) )
+        self.assertEqual( [0, 1], pks(pk__lt=2) )
+        self.assertEqual( [0, 1, 2], pks(id__le=2) )
+        self.assertEqual( [2, 3, 4], pks(date__range=(now + dt.timedelta(days=2), now + dt.timedelta(days=4))) )
+        self.assertEqual( [8, 9], pks(date__gt=now + dt.timedelta(days=7, hours=1)) )
+        self.assertEqual( [1, 2, 10], pks(id__in=[1, 2, 10, 99]) )
+        self.assertEqual( [0, 3, 6, 9, 10], pks(count__in=(0, None)) )
+        self.assertEqual( [10], pks(count__isnull=True) )
+        self.assertEqual( [10], pks(count=None) )
+        self.assertEqual( 10, len(pks(date__isnull=False)) )
+        self.assertEqual( [4, 7], pks(count=1, id__gt=2) )
+
+        VectorModel.objects.load( storage.filter(count=1).filter(id__gt=5) )
+        self.assertEqual( [7], VectorModel.objects.pks )
+
+        for lookup in [{'count__rin': 1}, {'nope': 1}, {'id__in': '1'}]:
+            with self.assertRaises( ValueError ):
+                pks(**lookup)
+
+        # a view only replaces its own rows
+        view = storage.filter(count=1)
+        VectorModel.objects.load(view)
+        VectorModel.objects.delete( VectorModel.objects.get(4) )
+        VectorModel(id=20, count=1).save()
+
+        VectorModel.objects.store(view)
+        self.assertEqual( [1, 7, 20], pks(count=1) )
+
+        VectorModel.objects.store(view, force=True)
+        self.assertEqual( [1, 7, 20], pks(count=1) )
+        self.assertEqual( 11, len(pks()) )
+
+        # so does the base storage after a partial load
+        m = VectorModel.objects.get(7)
+        m.value = 99.5
+        m.save()
+
+        VectorModel.objects.store(storage)
+        self.assertEqual( 11, len(pks()) )
+        self.assertEqual( [7], pks(value=99.5) )
+
+        VectorModel.objects.load(storage)
+        self.assertEqual( 11, len(VectorModel.objects) )
+
+        VectorModel.objects.delete( VectorModel.objects.get(20) )
+        VectorModel.objects.store(storage, force=True)
+        self.assertEqual( 10, len(pks()) )
+
     def test_4(self):
         "make sure we're setting extension"
         self.assertEqual( 'json', JSONStorage.extension )
@@ -122,6 +513,31 @@ class TestStorage( unittest.TestCase ):
         storage = JSONStorage( tfile.name )
         storage.write(MyDepModel, [d])
 
+    def test_serialize(self):
+        "generated serializers match the field dumps"
+        now = tznow()
+        m = MyModel(int_type=1, str_type="str", dt_type=now).save()
+        d = MyDepModel(pk1=10, foreign=m)
+        c = CompactModel(id=1, name="c", foreign=m)
+
+        self.assertEqual( {'int_type': 1, 'str_type': "str", 'dt_type': now.isoformat()},
+                MyModel._serialize(m) )
+        self.assertEqual( (1, "str", now.isoformat()), MyModel._serialize_row(m) )
+
+        self.assertEqual( {'pk1': 10, 'foreign': 1}, MyDepModel._serialize(d) )
+        self.assertEqual( (1, "c", None, 1), CompactModel._serialize_row(c) )
+
+        for instance in [m, d, c]:
+            self.assertEqual( list(instance.dict.values()), list(instance._serialize_row(instance)) )
+            self.assertEqual( list(instance.Meta.fields.keys()), list(instance.dict.keys()) )
+
+        # foreign instance isn't looked up
+        MyModel.objects.clear()
+        self.assertEqual( {'pk1': 10, 'foreign': 1}, d.dict )
+
+        with self.assertRaises( RuntimeError ):
+            MyDepModel(pk1=11).dict
+
     def test_15(self):
         "test CSVStorage"
 
@@ -197,6 +613,176 @@ class TestStorage( unittest.TestCase ):
         self.assertEqual('a string, with comma', m.str_type)
         self.assertEqual(now, m.dt_type)
 
+    def test_csv_remap(self):
+        "remap_columns renames once per file, remap_fieldnames overrides get every row"
+        tfile = tempfile.NamedTemporaryFile()
+
+        with open(tfile.name, 'w') as f:
+            f.write('Int Type,Str Type\n1,a\n2\n')
+
+        class Columns(CSVStorage):
+            def remap_columns(self, model_class, columns):
+                return { k.lower().replace(' ', '_'): v for k, v in columns.items() }
+
+        storage = Columns( tfile.name )
+        self.assertFalse( storage._remaps_rows() )
+        self.assertEqual( [(1, 'a'), (2, None)], [(e.int_type, e.str_type) for e in storage.read(MyModel)] )
+        storage.filename = None
+
+        class Rows(CSVStorage):
+            def remap_fieldnames(self, model_class, row):
+                return { k.lower().replace(' ', '_'): v and v.upper() for k, v in row.items() }
+
+        storage = Rows( tfile.name )
+        storage.split_size = 1
+        self.assertTrue( storage._remaps_rows() )
+        self.assertIsNone( storage.split(MyModel, 4) )
+        self.assertEqual( [[{'int_type': '1', 'str_type': 'A'}, {'int_type': '2', 'str_type': None}]],
+                list(storage.read_chunks(MyModel)) )
+        self.assertEqual( [(1, 'A'), (2, None)], [(e.int_type, e.str_type) for e in storage.read(MyModel)] )
+
+        # uncast values are checked when the instance is made
+        with open(tfile.name, 'a') as f:
+            f.write('x,b\n')
+
+        with self.assertRaises( ValueError ):
+            list( storage.read(MyModel) )
+
+    def test_csv_typed(self):
+        "CSVStorage converts columns to the field types"
+        tfile = tempfile.NamedTemporaryFile()
+        storage = CSVStorage( tfile.name )
+
+        now = tznow()
+        VectorModel(id=1, count=2, value=0.5, flag=False, date=now).save()
+        VectorModel(id=2, flag=True).save()
+        VectorModel(id=3).save()
+
+        expected = [e.dict for e in VectorModel.objects.all()]
+
+        VectorModel.objects.store(storage, force=True)
+        VectorModel.objects.load(storage)
+        self.assertEqual( expected, [e.dict for e in VectorModel.objects.all()] )
+
+        self.assertIs( False, VectorModel.objects.get(1).flag )
+        self.assertIsNone( VectorModel.objects.get(2).count )
+        self.assertIsNone( VectorModel.objects.get(3).flag )
+
+        with open(tfile.name, 'w') as f:
+            f.write('id,value,count,extra\n1,1.5,3,x\n\n2,\n4,,,y\n')
+
+        storage.chunk_size = 2
+        chunks = [chunk for chunk in storage.read_chunks(VectorModel)]
+        self.assertEqual( [2, 1], [len(chunk) for chunk in chunks] )
+        self.assertEqual( {'id': 1, 'value': 1.5, 'count': 3, 'extra': 'x'}, chunks[0][0] )
+        # short rows are padded with None, empty numbers are None too
+        self.assertEqual( {'id': 2, 'value': None, 'count': None, 'extra': None}, chunks[0][1] )
+        self.assertEqual( {'id': 4, 'value': None, 'count': None, 'extra': 'y'}, chunks[1][0] )
+
+        with open(tfile.name, 'a') as f:
+            f.write('5,,,y,z\n')
+
+        with self.assertRaisesRegex( ValueError, ':6: 5 columns' ):
+            list( storage.read_chunks(VectorModel) )
+
+        storage.write(VectorModel, [])
+        self.assertEqual( 0, os.path.getsize(tfile.name) )
+        self.assertEqual( [], [e for e in storage.read_chunks(VectorModel)] )
+
+    def test_split(self):
+        "JSONLinesStorage and CSVStorage are parsed in worker processes"
+        cpus = mock.patch('alkali.manager.os.cpu_count', return_value=4)
+        cpus.start()
+        self.addCleanup(cpus.stop)
+
+        now = tznow()
+
+        for i in range(50):
+            VectorModel(id=i, count=i * 2, value=i / 4, flag=bool(i % 2), date=now).save()
+
+        expected = [e.dict for e in VectorModel.objects.all()]
+
+        for cls in (JSONLinesStorage, CSVStorage):
+            tfile = tempfile.NamedTemporaryFile()
+            storage = cls( tfile.name )
+            storage.split_size = 64
+
+            VectorModel.objects.store(storage, force=True)
+
+            tasks = storage.split(VectorModel, 4)
+            self.assertTrue( 2 <= len(tasks) <= 4 )
+
+            starts = [args[-2] for func, args in tasks]
+            ends = [args[-1] for func, args in tasks]
+            self.assertEqual( starts[1:], ends[:-1] )
+            self.assertEqual( os.path.getsize(tfile.name), ends[-1] )
+
+            VectorModel.objects.load(storage, processes=2)
+            self.assertEqual( expected, [e.dict for e in VectorModel.objects.all()] )
+
+            # one cpu, parsed here
+            with mock.patch('alkali.manager.os.cpu_count', return_value=1), \
+                mock.patch.object(storage, 'split') as split:
+                VectorModel.objects.load(storage, processes=2)
+
+            self.assertFalse( split.called )
+            self.assertEqual( expected, [e.dict for e in VectorModel.objects.all()] )
+
+            # one range, not worth a process
+            storage.split_size = 1024 * 1024
+            self.assertIsNone( storage.split(VectorModel, 4) )
+
+        with open(tfile.name, 'a') as f:
+            f.write('1,,,,\n')
+
+        storage.split_size = 64
+        with self.assertRaises(KeyError):
+            VectorModel.objects.load(storage, processes=2)
+
+        tdir = tempfile.TemporaryDirectory()
+        storage = JournaledStorage( os.path.join(tdir.name, 'VectorModel.jsonl') )
+        storage.split_size = 64
+        VectorModel.objects.store(storage, force=True)
+        self.assertIsNone( storage.split(VectorModel, 4) )
+        storage.unlock()
+
+        # the workers use our compile()
+        tfile = tempfile.NamedTemporaryFile()
+        storage = ScaledCSVStorage( tfile.name )
+        storage.scale = 3
+        storage.split_size = 64
+        VectorModel.objects.store(storage, force=True)
+
+        VectorModel.objects.load(storage)
+        expected = [e.dict for e in VectorModel.objects.all()]
+        self.assertEqual( 6, VectorModel.objects.get(1).count )
+
+        VectorModel.objects.load(storage, processes=2)
+        self.assertEqual( expected, [e.dict for e in VectorModel.objects.all()] )
+
+        # parts never start inside a quoted value
+        with open(tfile.name, 'w') as f:
+            f.write('id,count\n1,2\n2,"3\n\n4"\n3,4\n')
+
+        storage.split_size = 1
+        ranges = [args[-2:] for func, args in storage.split(VectorModel, 4)]
+        self.assertEqual( [(9, 22), (22, 26)], ranges )
+
+        # a newline in a string written by us
+        tfile = tempfile.NamedTemporaryFile()
+        storage = CSVStorage( tfile.name )
+        storage.split_size = 1
+
+        for i in range(6):
+            MyModel(int_type=i, str_type='a "b",\nc' * i).save()
+
+        expected = [e.dict for e in MyModel.objects.all()]
+        MyModel.objects.store(storage, force=True)
+
+        self.assertTrue( len(storage.split(MyModel, 4)) > 1 )
+        MyModel.objects.load(storage, processes=2)
+        self.assertEqual( expected, [e.dict for e in MyModel.objects.all()] )
+
     def test_locking(self):
 
         tfile = tempfile.NamedTemporaryFile()
@@ -1,4 +1,6 @@
 import datetime as dt
+import gc
+from contextlib import contextmanager
 from dateutil.tz import tzlocal
 
 def tznow( tzinfo = None ):
@@ -18,3 +20,20 @@ def tzadd( dtstamp, tzinfo=None ):
 
 def fromts( ts ):
     return tzadd( dt.datetime.fromtimestamp(ts) )
+
+@contextmanager
+def gc_paused():
+    """
+    context manager that turns off the cyclic garbage collector, it is
+    triggered by allocations so creating many objects (eg. loading models)
+    runs it over and over for nothing. nests, only the outermost call
+    turns it back on.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()